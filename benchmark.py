@@ -0,0 +1,195 @@
+#! /usr/bin/python3
+
+'''
+benchmark.py
+
+Benchmarks the Q_1..Q_10 queries of queries.py without reloading the database for every query.
+
+dbexport.sql is restored once into a template database. Each benchmark run clones that template with
+CREATE DATABASE ... TEMPLATE, which copies the data files instead of replaying the dump, then runs every
+query a few times to warm the cache followed by N measured runs of EXPLAIN (ANALYZE, BUFFERS). The
+results are written as JSON with stable key order, so two runs can be compared with diff or --baseline.
+'''
+
+import argparse
+import ast
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+import psycopg
+from psycopg import sql
+
+# queries.py holds the connection settings. Its queries are read from the source rather than by calling
+# Q_n, which would restore the whole database for every query.
+import queries
+from queries import db_host, db_password, db_port, db_username, root_database_name
+
+QUERIES_PATH = os.path.join(queries.dir_path, 'queries.py')
+DUMP_PATH = os.path.join(queries.dir_path, 'dbexport.sql')
+
+TEMPLATE_DATABASE = 'query_template'
+BENCHMARK_DATABASE = 'query_benchmark'
+
+def connect(dbname, **kwargs):
+    return psycopg.connect(dbname=dbname, user=db_username, password=db_password, host=db_host, port=db_port, **kwargs)
+
+def read_queries(path=QUERIES_PATH):
+    '''
+    Read the SQL of each Q_n method in queries.py.
+
+    return: dict of 'Q_n' -> query text, in question order
+    '''
+    with open(path, 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read(), filename=path)
+
+    found = {}
+    for node in tree.body:
+        if not (isinstance(node, ast.FunctionDef) and node.name.startswith('Q_')):
+            continue
+        for statement in ast.walk(node):
+            if (isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant)
+                    and any(isinstance(target, ast.Name) and target.id == 'query' for target in statement.targets)):
+                # The last assignment is the query the method times.
+                found[node.name] = statement.value.value.strip()
+
+    return dict(sorted(found.items(), key=lambda item: int(item[0].split('_')[1])))
+
+def database_exists(conn, name):
+    return conn.execute('SELECT 1 FROM pg_database WHERE datname = %s;', (name,)).fetchone() is not None
+
+def create_template(conn, template, dump_path=DUMP_PATH):
+    '''
+    (Re)create the template database from dbexport.sql and gather planner statistics on it, so every clone
+    starts with the same data and the same statistics.
+    '''
+    conn.execute(sql.SQL('DROP DATABASE IF EXISTS {};').format(sql.Identifier(template)))
+    conn.execute(sql.SQL('CREATE DATABASE {};').format(sql.Identifier(template)))
+
+    start = time.perf_counter()
+    command = ['psql', '-h', db_host, '-p', str(db_port), '-U', db_username, '-d', template, '-q', '-f', dump_path]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env={**os.environ, 'PGPASSWORD': db_password})
+
+    with connect(template, autocommit=True) as template_conn:
+        template_conn.execute('VACUUM ANALYZE;')
+    sys.stderr.write(f'Restored {dump_path} into {template} in {time.perf_counter() - start:.1f}s\n')
+
+def clone_database(conn, template, name):
+    '''Replace database name with a fresh copy of template.'''
+    start = time.perf_counter()
+    conn.execute(sql.SQL('DROP DATABASE IF EXISTS {};').format(sql.Identifier(name)))
+    conn.execute(sql.SQL('CREATE DATABASE {} TEMPLATE {};').format(sql.Identifier(name), sql.Identifier(template)))
+    sys.stderr.write(f'Cloned {template} into {name} in {time.perf_counter() - start:.1f}s\n')
+
+def explain(cur, query):
+    '''
+    Run a query under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON).
+
+    return: the top-level plan document (with 'Plan', 'Planning Time' and 'Execution Time')
+    '''
+    cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}')
+    document = cur.fetchone()[0]
+    # Older psycopg versions hand back the json column as text.
+    if isinstance(document, str):
+        document = json.loads(document)
+    return document[0]
+
+def percentile(values, fraction):
+    '''Nearest-rank percentile of a non-empty list.'''
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def summarize(values):
+    return {
+        'min': round(min(values), 3),
+        'median': round(statistics.median(values), 3),
+        'p95': round(percentile(values, 0.95), 3),
+    }
+
+def benchmark_query(conn, query, runs, warmup):
+    '''
+    Time one query: warmup runs are discarded, then runs measured runs are summarised.
+
+    return: dict with execution and planning time summaries (ms) and the buffer counts of the last run
+    '''
+    execution, planning = [], []
+    with conn.cursor() as cur:
+        for i in range(warmup + runs):
+            document = explain(cur, query)
+            conn.rollback()
+            if i < warmup:
+                continue
+            execution.append(document['Execution Time'])
+            planning.append(document['Planning Time'])
+
+    plan = document['Plan']
+    return {
+        'execution_ms': summarize(execution),
+        'planning_ms': summarize(planning),
+        'rows': plan.get('Actual Rows'),
+        'shared_hit_blocks': plan.get('Shared Hit Blocks'),
+        'shared_read_blocks': plan.get('Shared Read Blocks'),
+    }
+
+def compare(results, baseline_path):
+    '''Print the change in median execution time of each query against an earlier results file.'''
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)['queries']
+
+    for name, result in results['queries'].items():
+        if name not in baseline or 'error' in result or 'error' in baseline[name]:
+            continue
+        before = baseline[name]['execution_ms']['median']
+        after = result['execution_ms']['median']
+        change = (after - before) / before * 100 if before else 0
+        print(f'{name}: {before:.3f} ms -> {after:.3f} ms ({change:+.1f}%)')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', default = 10, type = int, help = 'Measured runs per query')
+    parser.add_argument('--warmup', default = 2, type = int, help = 'Runs per query discarded before measuring')
+    parser.add_argument('--query', action = 'append', help = 'Only benchmark these queries, e.g. --query Q_1 --query Q_4')
+    parser.add_argument('--template', default = TEMPLATE_DATABASE, help = 'Database dbexport.sql is restored into once')
+    parser.add_argument('--database', default = BENCHMARK_DATABASE, help = 'Database cloned from the template and queried')
+    parser.add_argument('--reload', action = 'store_true', help = 'Restore dbexport.sql into the template again')
+    parser.add_argument('--no-clone', action = 'store_true', help = 'Query --database as it is, without cloning the template')
+    parser.add_argument('--output', default = os.path.join(queries.dir_path, 'benchmark_results.json'))
+    parser.add_argument('--baseline', help = 'Earlier results file to compare median execution times against')
+    args = parser.parse_args()
+
+    selected = read_queries()
+    if args.query:
+        selected = {name: selected[name] for name in args.query}
+
+    if not args.no_clone:
+        with connect(root_database_name, autocommit=True) as admin:
+            if args.reload or not database_exists(admin, args.template):
+                create_template(admin, args.template)
+            clone_database(admin, args.template, args.database)
+
+    results = {'database': args.database, 'runs': args.runs, 'warmup': args.warmup, 'queries': {}}
+    with connect(args.database) as conn:
+        results['server_version'] = conn.execute('SHOW server_version;').fetchone()[0]
+        conn.rollback()
+
+        for name, query in selected.items():
+            try:
+                results['queries'][name] = benchmark_query(conn, query, args.runs, args.warmup)
+            except psycopg.DatabaseError as error:
+                conn.rollback()
+                results['queries'][name] = {'error': str(error).strip()}
+                sys.stderr.write(f'{name}: {error}\n')
+                continue
+
+            execution = results['queries'][name]['execution_ms']
+            print(f"{name}: min {execution['min']:.3f} ms, median {execution['median']:.3f} ms, p95 {execution['p95']:.3f} ms")
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+    if args.baseline:
+        compare(results, args.baseline)
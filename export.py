@@ -0,0 +1,168 @@
+#! /usr/bin/python3
+
+'''
+export.py
+
+Streams the result of a query to a CSV, JSONL or Parquet file without holding the result in memory.
+
+CSV goes through COPY (query) TO STDOUT, written to the file block by block as the server sends it.
+JSONL and Parquet read the result through a named (server-side) cursor, fetch_size rows at a time.
+CSV and JSONL can be gzipped; Parquet files use their own column compression instead.
+'''
+
+import argparse
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+import gzip
+import json
+import os
+import sys
+import time
+import psycopg
+from benchmark import read_queries
+from queries import db_host, db_password, db_port, db_username, query_database_name
+
+# pyarrow is only needed for Parquet output.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FETCH_SIZE = 10000
+
+# Values pyarrow and json can take as they are. NUMERIC values become floats, since a decimal type inferred
+# from the first rows might not fit later ones, and anything else (UUIDs, points, ...) is written as text.
+PLAIN_TYPES = (bool, int, float, str, date, datetime, dt_time)
+
+def connect(dbname=query_database_name):
+    return psycopg.connect(dbname=dbname, user=db_username, password=db_password, host=db_host, port=db_port)
+
+def open_output(path, compress):
+    '''Open an output file for writing bytes, gzipped if compress.'''
+    return gzip.open(path, 'wb') if compress else open(path, 'wb')
+
+def plain(value):
+    '''A column value as something json and pyarrow accept, see PLAIN_TYPES.'''
+    if value is None or isinstance(value, PLAIN_TYPES):
+        return value
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+def stream_rows(conn, query, params=None, fetch_size=FETCH_SIZE):
+    '''
+    Yield the column names, then every row of a query, through a named server-side cursor that fetches
+    fetch_size rows per round trip.
+    '''
+    with conn.cursor(name='export_cursor') as cur:
+        cur.itersize = fetch_size
+        cur.execute(query, params)
+        yield [column.name for column in cur.description]
+        yield from cur
+
+def export_csv(conn, query, path, compress=False):
+    '''
+    Write a query's result with a header row using COPY (query) TO STDOUT. The query can't take parameters.
+
+    return: the number of bytes written (before compression)
+    '''
+    size = 0
+    with open_output(path, compress) as file, conn.cursor() as cur:
+        with cur.copy(f'COPY ({query.rstrip().rstrip(";")}) TO STDOUT (FORMAT CSV, HEADER)') as copy:
+            for block in copy:
+                file.write(block)
+                size += len(block)
+    return size
+
+def export_jsonl(conn, query, path, params=None, compress=False, fetch_size=FETCH_SIZE):
+    '''
+    Write one JSON object per row.
+
+    return: the number of rows written
+    '''
+    rows = stream_rows(conn, query, params, fetch_size)
+    names = next(rows)
+    count = 0
+    with open_output(path, compress) as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(names, map(plain, row))), default=str).encode('utf-8') + b'\n')
+            count += 1
+    return count
+
+def export_parquet(conn, query, path, params=None, fetch_size=FETCH_SIZE, compression='zstd'):
+    '''
+    Write the result as a Parquet file with one row group per fetch_size rows. The schema is inferred from
+    the first batch; columns that are NULL in all of it are written as strings.
+
+    return: the number of rows written
+    '''
+    if pa is None:
+        raise ImportError('Parquet output needs pyarrow (pip install pyarrow)')
+
+    rows = stream_rows(conn, query, params, fetch_size)
+    names = next(rows)
+    writer, schema, count = None, None, 0
+
+    def write(batch):
+        nonlocal writer, schema
+        columns = [[plain(value) for value in column] for column in zip(*batch)] if batch else [[] for _ in names]
+        if schema is None:
+            arrays = [pa.array(column) for column in columns]
+            schema = pa.schema([(name, pa.string() if array.type == pa.null() else array.type) for name, array in zip(names, arrays)])
+            writer = pq.ParquetWriter(path, schema, compression=compression)
+        # A column written as strings because it started out NULL may hold other values later.
+        columns = [[None if value is None else str(value) for value in column] if field.type == pa.string() else column for column, field in zip(columns, schema)]
+        writer.write_table(pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) == fetch_size:
+                write(batch)
+                count += len(batch)
+                batch = []
+        if batch or writer is None:
+            write(batch)
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def export(conn, query, path, output_format='csv', compress=False, fetch_size=FETCH_SIZE):
+    '''Export a query's result in the given format ("csv", "jsonl" or "parquet"). The transaction is rolled back afterwards.'''
+    try:
+        if output_format == 'csv':
+            return export_csv(conn, query, path, compress)
+        elif output_format == 'jsonl':
+            return export_jsonl(conn, query, path, compress=compress, fetch_size=fetch_size)
+        elif output_format == 'parquet':
+            return export_parquet(conn, query, path, fetch_size=fetch_size, compression='gzip' if compress else 'zstd')
+        else:
+            raise ValueError(f'Unknown output format {output_format}')
+    finally:
+        conn.rollback()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required = True)
+    source.add_argument('--query', help = 'One of the queries.py questions, e.g. Q_1')
+    source.add_argument('--sql', help = 'Any SELECT statement')
+    parser.add_argument('--format', default = 'csv', choices = ['csv', 'jsonl', 'parquet'])
+    parser.add_argument('--gzip', action = 'store_true', help = 'gzip CSV and JSONL output; Parquet uses gzip column compression instead of zstd')
+    parser.add_argument('--fetch-size', default = FETCH_SIZE, type = int, help = 'Rows fetched per round trip for JSONL and Parquet')
+    parser.add_argument('--database', default = query_database_name)
+    parser.add_argument('--output', help = 'Output file, by default named after the query')
+    args = parser.parse_args()
+
+    query = read_queries()[args.query] if args.query else args.sql
+    output = args.output
+    if output is None:
+        extension = args.format + ('.gz' if args.gzip and args.format != 'parquet' else '')
+        output = os.path.join(os.getcwd(), f'{args.query or "export"}.{extension}')
+
+    start = time.perf_counter()
+    with connect(args.database) as conn:
+        result = export(conn, query, output, args.format, args.gzip, args.fetch_size)
+    unit = 'bytes' if args.format == 'csv' else 'rows'
+    sys.stderr.write(f'Wrote {result} {unit} to {output} in {time.perf_counter() - start:.2f}s\n')
@@ -0,0 +1,56 @@
+#! /usr/bin/python3
+
+from collections import namedtuple
+import struct
+import psycopg
+from psycopg import postgres
+from psycopg.adapt import Dumper
+from psycopg.pq import Format
+
+# StatsBomb locations are stored in Postgres as POINT, which psycopg does not adapt out of the box.
+Point = namedtuple('Point', ['x', 'y'])
+
+class PointDumper(Dumper):
+    '''Text dumper for Point, used by the per-row INSERT path.'''
+    oid = postgres.types['point'].oid
+
+    def dump(self, obj):
+        return f'({obj.x},{obj.y})'.encode()
+
+class PointBinaryDumper(Dumper):
+    '''Binary dumper for Point, used by binary COPY (two big-endian float8 values).'''
+    format = Format.BINARY
+    oid = postgres.types['point'].oid
+
+    def dump(self, obj):
+        return struct.pack('!dd', obj.x, obj.y)
+
+psycopg.adapters.register_dumper(Point, PointBinaryDumper)
+psycopg.adapters.register_dumper(Point, PointDumper)
+
+class Polygon(tuple):
+    '''A POLYGON value: a tuple of (x, y) vertices.'''
+
+class PolygonDumper(Dumper):
+    '''Text dumper for Polygon, used by the per-row INSERT path.'''
+    oid = postgres.types['polygon'].oid
+
+    def dump(self, obj):
+        return ('(' + ','.join(f'({x},{y})' for x, y in obj) + ')').encode()
+
+class PolygonBinaryDumper(Dumper):
+    '''Binary dumper for Polygon, used by binary COPY (the vertex count, then two float8 values per vertex).'''
+    format = Format.BINARY
+    oid = postgres.types['polygon'].oid
+
+    def dump(self, obj):
+        return struct.pack(f'!i{2 * len(obj)}d', len(obj), *(c for vertex in obj for c in vertex))
+
+psycopg.adapters.register_dumper(Polygon, PolygonBinaryDumper)
+psycopg.adapters.register_dumper(Polygon, PolygonDumper)
+
+def to_point(location):
+    '''Convert a StatsBomb [x, y] or [x, y, z] location into a Point, ignoring the height. Returns None if missing.'''
+    if location is None or len(location) < 2:
+        return None
+    return Point(location[0], location[1])
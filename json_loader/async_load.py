@@ -0,0 +1,193 @@
+#! /usr/bin/python3
+
+import asyncio
+from collections import namedtuple
+import logging
+import os
+import time
+from psycopg.conninfo import make_conninfo
+import load_data
+from batching import BatchWriter
+from config import DATABASE_CONFIG
+from dimension_cache import dimensions
+from manifest import check_file, file_fingerprint, record_file_statement
+from partitions import partitions
+from progress import ProgressReporter
+from rollups import match_statements
+
+# The pool is only needed for the asyncio loading mode.
+try:
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    AsyncConnectionPool = None
+
+logger = logging.getLogger(__name__)
+
+# A parsed file, ready to be written in one transaction: statements run before the rows (deleting the
+# previous load, updating load_manifest), the (table, columns, types, rows) to write, and statements run after them.
+PreparedFile = namedtuple('PreparedFile', 'dataset_type file_path before tables after')
+
+# Put on the queue once per writer when there are no files left.
+DONE = None
+
+def conninfo():
+    '''Connection string for the settings in config.DATABASE_CONFIG, with the values quoted as needed.'''
+    return make_conninfo(**DATABASE_CONFIG)
+
+def prepare_file(dataset_type, file_path, conn, full):
+    '''
+    Parse a file and write the dimension rows it refers to. Runs in a thread, on the producer's own connection.
+
+    The teams, players, lookup rows, ... are committed here, before the file is queued, so a writer never
+    inserts a row whose dimension rows aren't visible yet.
+    return: a PreparedFile, or None if load_manifest shows the file is unchanged
+    '''
+    with conn.cursor() as cur:
+        fingerprint, recorded = check_file(cur, file_path)
+        if fingerprint is None and not full:
+            conn.commit()  # check_file may have refreshed the mtime of an unchanged file
+            return None
+        if fingerprint is None:
+            fingerprint = file_fingerprint(file_path)
+
+        if dataset_type == 'events':
+            match_id, tables = load_data.parse_events(file_path)
+        elif dataset_type == 'lineups':
+            match_id, tables, _ = load_data.parse_lineups(file_path)
+        elif dataset_type == 'three-sixty':
+            match_id, tables = load_data.parse_three_sixty(file_path)
+        else:
+            raise ValueError(f'Unknown dataset type {dataset_type}')
+
+        writer = BatchWriter(conn)
+        dimensions.flush(writer)
+        writer.flush()
+        if dataset_type != 'three-sixty':
+            tables = load_data.partition_rows(cur, match_id, tables)
+    conn.commit()
+
+    # A file without a manifest entry has no rows of an earlier load to delete.
+    before = load_data.delete_file_statements(dataset_type, file_path) if recorded else []
+    before.append(record_file_statement(dataset_type, file_path, fingerprint))
+    after = match_statements(match_id, 1) if dataset_type == 'events' and load_data.refresh_rollups else []
+    # The rows are consumed by another task, so generators are turned into lists while still in this thread.
+    tables = [(table, columns, types, list(rows)) for table, columns, types, rows in tables]
+    return PreparedFile(dataset_type, file_path, before, tables, after)
+
+async def copy_rows(cur, table, columns, types, rows):
+    '''Async counterpart of load_data.copy_rows. return: the number of rows written'''
+    async with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types(types)
+        for row in rows:
+            await copy.write_row(row)
+    return len(rows)
+
+async def write_file(conn, prepared, mode):
+    '''
+    Write a prepared file in a single transaction.
+
+    mode: str - "copy" writes each table with a binary COPY, "insert" sends the rows with executemany
+    return: the number of rows written
+    '''
+    row_count = 0
+    async with conn.transaction():
+        async with conn.cursor() as cur:
+            for sql, params in prepared.before:
+                await cur.execute(sql, params)
+
+            for table, columns, types, rows in prepared.tables:
+                if mode == 'copy':
+                    row_count += await copy_rows(cur, table, columns, types, rows)
+                else:
+                    # executemany sends the rows in pipeline mode, one round trip per batch rather than per row.
+                    await cur.executemany(load_data.insert_statement(table, columns), rows)
+                    row_count += len(rows)
+
+            for sql, params in prepared.after:
+                await cur.execute(sql, params)
+    return row_count
+
+async def produce(dataset_types, conn, queue, progress, full):
+    '''Parse every file in order, off the event loop, and queue it for the writers. Waits while the queue is full.'''
+    for dataset_type in dataset_types:
+        for file_path in load_data.get_file_paths(dataset_type):
+            try:
+                prepared = await asyncio.to_thread(prepare_file, dataset_type, file_path, conn, full)
+            except Exception as error:
+                conn.rollback()
+                # Rows the cache was told about may have been rolled back with the file.
+                dimensions.preload(conn)
+                logger.error(f'Failed to parse {file_path}: {error}')
+                progress[dataset_type].update(file_path, failed=True)
+                continue
+
+            if prepared is None:
+                progress[dataset_type].update(file_path)
+            else:
+                await queue.put(prepared)
+
+        # Three-sixty rows reference events, and events reference the lineups' players, so a dataset type is
+        # finished before the next one starts.
+        await queue.join()
+
+async def write(pool, queue, progress, mode):
+    '''Writer task: take prepared files off the queue and write each on a pooled connection until DONE.'''
+    while True:
+        prepared = await queue.get()
+        if prepared is DONE:
+            queue.task_done()
+            return
+
+        start = time.perf_counter()
+        try:
+            async with pool.connection() as conn:
+                rows = await write_file(conn, prepared, mode)
+        except Exception as error:
+            logger.error(f'Failed to load {prepared.file_path}: {error}')
+            progress[prepared.dataset_type].update(prepared.file_path, failed=True)
+        else:
+            elapsed = time.perf_counter() - start
+            logger.info(f"[async {mode}] {os.path.basename(prepared.file_path)}: {rows} rows written in {elapsed:.2f}s")
+            progress[prepared.dataset_type].update(prepared.file_path, rows)
+        finally:
+            queue.task_done()
+
+async def load_async(dataset_types, conn, writers, queue_size, mode, full, event_type_id, rollups):
+    '''
+    Load the files of the given dataset types with asyncio: one producer parses the files while up to
+    `writers` write transactions run concurrently, each on a connection of an AsyncConnectionPool.
+
+    dataset_types: list of str - Any of "events", "lineups", "three-sixty", loaded in this order
+    conn: connection the producer uses to check load_manifest and write dimension rows
+    writers: int - Number of concurrent write transactions (and pooled connections)
+    queue_size: int - Parsed files held in memory waiting for a writer; the producer waits when the queue is full
+    event_type_id: int - The lineup pseudo-event type
+    rollups: bool - Update the season rollups with every events file
+    '''
+    if AsyncConnectionPool is None:
+        raise ImportError('The asyncio loader needs psycopg_pool (pip install psycopg-pool)')
+
+    # The loader functions run in this module's copy of load_data, which main() hasn't set up.
+    load_data.pseudo_event_type_id = event_type_id
+    load_data.refresh_rollups = rollups
+
+    # Season partitions are created up front, so writers only ever insert into existing partitions.
+    if partitions.enabled:
+        partitions.create_all(conn)
+
+    progress = {dataset_type: ProgressReporter(dataset_type, load_data.get_file_paths(dataset_type)) for dataset_type in dataset_types}
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    async with AsyncConnectionPool(conninfo(), min_size=writers, max_size=writers, open=False) as pool:
+        tasks = [asyncio.create_task(write(pool, queue, progress, mode)) for _ in range(writers)]
+        try:
+            await produce(dataset_types, conn, queue, progress, full)
+            for _ in tasks:
+                await queue.put(DONE)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    for reporter in progress.values():
+        reporter.finish()
@@ -0,0 +1,52 @@
+#! /usr/bin/python3
+
+import logging
+from config import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+class BatchWriter:
+    '''
+    Buffers parameter tuples for INSERT/upsert statements and sends them with executemany in pipeline mode.
+
+    Rows are flushed in the order they were added, with consecutive rows for the same statement grouped into
+    one executemany call, so a dimension row added before the fact row referencing it is always written first.
+    A flush happens every batch_size rows and on flush(); it runs in the caller's transaction.
+    '''
+    batch_size = BATCH_SIZE
+
+    def __init__(self, conn, batch_size=None):
+        self.conn = conn
+        if batch_size is not None:
+            self.batch_size = batch_size
+        self.queue = []
+        self.pending = 0
+        # Statements that would each have been a round trip if executed one at a time, and the round trips used instead.
+        self.statements = 0
+        self.round_trips = 0
+
+    def add(self, sql, params):
+        '''Queue one row for a statement, flushing if the batch is full.'''
+        if self.queue and self.queue[-1][0] == sql:
+            self.queue[-1][1].append(params)
+        else:
+            self.queue.append((sql, [params]))
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''Send every queued row in a single pipeline.'''
+        if not self.pending:
+            return
+        with self.conn.pipeline(), self.conn.cursor() as cur:
+            for sql, rows in self.queue:
+                cur.executemany(sql, rows)
+        self.statements += self.pending
+        self.round_trips += 1
+        self.queue = []
+        self.pending = 0
+
+    def log_stats(self, label):
+        '''Log how many round trips batching saved.'''
+        logger.info(f'{label}: {self.statements} statements sent in {self.round_trips} round trips instead of {self.statements}')
@@ -0,0 +1,156 @@
+#! /usr/bin/python3
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import re
+import time
+import psycopg
+from config import DATABASE_CONFIG, INDEXES_PATH
+
+logger = logging.getLogger(__name__)
+
+def read_index_statements(path=INDEXES_PATH):
+    '''
+    Read the curated secondary indexes.
+
+    return: list of (index name, CREATE INDEX statement)
+    '''
+    statements = []
+    with open(path, 'r') as file:
+        for line in file:
+            match = re.match(r'\s*CREATE INDEX (?:IF NOT EXISTS )?(\w+)', line, re.IGNORECASE)
+            if match:
+                statements.append((match.group(1), line.strip()))
+    return statements
+
+def create_indexes(conn):
+    '''
+    Create any of the curated secondary indexes that don't exist yet, e.g. on a database set up from ddl.sql
+    alone. Loads without --bulk run this first, so reloads and queries always have the indexes.
+
+    return: the number of indexes created
+    '''
+    with conn.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema();")
+        existing = {row[0] for row in cur}
+        missing = [(name, sql) for name, sql in read_index_statements() if name not in existing]
+        for name, sql in missing:
+            cur.execute(sql)
+    conn.commit()
+    if missing:
+        logger.info(f"Created {len(missing)} missing indexes: {', '.join(name for name, _ in missing)}")
+    return len(missing)
+
+def prepare_bulk_load(conn):
+    '''
+    Drop every foreign key and the curated secondary indexes before a full load.
+
+    Foreign keys that partitions inherit from their parent table are dropped along with the parent's.
+
+    The foreign key definitions are saved in deferred_constraint first, in the same transaction, so they
+    can be restored even if the load is interrupted. Primary keys and UNIQUE constraints are kept, as the
+    loaders' ON CONFLICT clauses depend on them.
+    '''
+    with conn.cursor() as cur:
+        cur.execute('''
+        SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid)
+        FROM pg_constraint c
+        JOIN pg_namespace n ON n.oid = c.connamespace
+        WHERE c.contype = 'f' AND n.nspname = current_schema() AND c.conparentid = 0;
+        ''')
+        foreign_keys = cur.fetchall()
+
+        for table, name, definition in foreign_keys:
+            cur.execute('''
+            INSERT INTO deferred_constraint (table_name, constraint_name, definition) VALUES (%s, %s, %s)
+            ON CONFLICT DO NOTHING;
+            ''', (table, name, definition))
+            cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name};')
+
+        indexes = read_index_statements()
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX IF EXISTS {name};')
+    conn.commit()
+    logger.info(f'Bulk load: dropped {len(foreign_keys)} foreign keys and {len(indexes)} indexes')
+
+def run_parallel(statements, workers):
+    '''
+    Run (label, [sql, ...]) jobs concurrently, each on its own autocommit connection.
+
+    return: list of (label, error message or None)
+    '''
+    def run(job):
+        label, sqls = job
+        try:
+            with psycopg.connect(**DATABASE_CONFIG, autocommit=True) as conn:
+                for sql in sqls:
+                    conn.execute(sql)
+        except (Exception, psycopg.DatabaseError) as error:
+            return label, str(error)
+        return label, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, statements))
+
+def finish_bulk_load(conn, workers):
+    '''
+    Restore the foreign keys saved by prepare_bulk_load and build the curated indexes.
+
+    Each foreign key is added back as NOT VALID, which is instant, and then checked with
+    ALTER TABLE ... VALIDATE CONSTRAINT. Validation only takes a SHARE UPDATE EXCLUSIVE lock, so the
+    validations run in parallel with each other, followed by the index builds, each on its own connection.
+    Foreign keys of partitioned tables are added and checked in one step instead.
+
+    A deferred_constraint row is only deleted once its foreign key has been validated, so a foreign key
+    that fails (e.g. on an orphan row) is retried by the next bulk load instead of being lost.
+    return: tuple (dict with the seconds spent validating constraints and building indexes, list of the
+    constraints and indexes that failed)
+    '''
+    timings = {}
+    failed = []
+
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute('SELECT table_name, constraint_name, definition FROM deferred_constraint ORDER BY table_name, constraint_name;')
+        constraints = cur.fetchall()
+        cur.execute("SELECT relname FROM pg_class WHERE relkind = 'p';")
+        partitioned = {row[0] for row in cur}
+        # Constraints left NOT VALID by an earlier run that failed to validate them only need validating.
+        cur.execute("SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f';")
+        existing = set(cur.fetchall())
+
+        validations = []
+        keys = {}
+        for table, name, definition in constraints:
+            if table in partitioned and (table, name) not in existing:
+                # Partitioned tables can't have NOT VALID foreign keys, so these are checked as they are added.
+                label = f'{table}.{name} {definition}'
+                validations.append((label, [f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition};']))
+            else:
+                if (table, name) not in existing:
+                    cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID;')
+                label = f'{table}.{name}'
+                validations.append((label, [f'ALTER TABLE {table} VALIDATE CONSTRAINT {name};']))
+            keys[label] = (table, name)
+    conn.commit()
+
+    with conn.cursor() as cur:
+        for label, error in run_parallel(validations, workers):
+            if error is not None:
+                logger.error(f'Constraint {label} could not be validated: {error}')
+                failed.append(label)
+            else:
+                cur.execute('DELETE FROM deferred_constraint WHERE table_name = %s AND constraint_name = %s;', keys[label])
+    conn.commit()
+    timings['constraints'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexes = [(name, [sql]) for name, sql in read_index_statements()]
+    for label, error in run_parallel(indexes, workers):
+        if error is not None:
+            logger.error(f'Index {label} could not be built: {error}')
+            failed.append(label)
+    timings['indexes'] = time.perf_counter() - start
+
+    logger.info(f'Bulk load: restored {len(constraints) - len([label for label in failed if label in keys])} of {len(constraints)} foreign keys and built {len(indexes)} indexes')
+    return timings, failed
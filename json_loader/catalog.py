@@ -0,0 +1,189 @@
+#! /usr/bin/python3
+
+import argparse
+from glob import glob
+import logging
+import os
+import sqlite3
+import time
+from config import CATALOG_PATH, DATASET_PATH
+from stream_json import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+# Dataset types with one file per match, named <match_id>.json.
+MATCH_DATASETS = ('events', 'lineups', 'three-sixty')
+
+CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches_file (
+    file_path TEXT PRIMARY KEY,
+    competition_id INTEGER NOT NULL,
+    season_id INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS match (
+    match_id INTEGER PRIMARY KEY,
+    competition_id INTEGER NOT NULL,
+    season_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS match_file (
+    match_id INTEGER NOT NULL,
+    dataset_type TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime REAL NOT NULL,
+    PRIMARY KEY (match_id, dataset_type)
+);
+CREATE INDEX IF NOT EXISTS match_season_idx ON match (competition_id, season_id);
+'''
+
+class DatasetCatalog:
+    '''
+    A catalog of the dataset files, kept in a local SQLite file: the competition season of every match,
+    read from data/matches/<competition_id>/<season_id>.json, and the path, size and mtime of every
+    events, lineups and three-sixty file.
+
+    refresh() only parses the matches files whose size or mtime changed since the last refresh, and only
+    writes the rows of per-match files that were added, changed or removed. After select(), file_paths()
+    lists only the files of the selected competitions and seasons, so the loaders never read the others.
+    '''
+
+    def __init__(self):
+        self.db = None
+        self.competitions = None
+        self.seasons = None
+
+    def open(self, path=CATALOG_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(CATALOG_SCHEMA)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def refresh(self):
+        '''
+        Bring the catalog up to date with the files under DATASET_PATH.
+
+        return: tuple (matches files parsed, per-match file rows written or removed)
+        '''
+        start = time.perf_counter()
+        parsed = self.refresh_matches()
+        changed = sum(self.refresh_match_files(dataset_type) for dataset_type in MATCH_DATASETS)
+        self.db.commit()
+        logger.info(f'Catalog refreshed in {time.perf_counter() - start:.2f}s: {parsed} matches files parsed, {changed} match files changed')
+        return parsed, changed
+
+    def refresh_matches(self):
+        '''Re-read the matches files that changed, and forget those that are gone. return: the number of files parsed'''
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute('SELECT file_path, file_size, file_mtime FROM matches_file;')}
+        parsed = 0
+        for file_path in glob(os.path.join(DATASET_PATH, 'data', 'matches', '*', '*.json')):
+            path = os.path.relpath(file_path, DATASET_PATH)
+            stat = os.stat(file_path)
+            if known.pop(path, None) == (stat.st_size, stat.st_mtime):
+                continue
+
+            competition_id = int(os.path.basename(os.path.dirname(file_path)))
+            season_id = int(os.path.splitext(os.path.basename(file_path))[0])
+            # Only the match ids are needed, so the entries are streamed rather than loaded whole.
+            match_ids = [entry['match_id'] for entry in iter_json_array(file_path)]
+            self.db.execute('DELETE FROM match WHERE competition_id = ? AND season_id = ?;', (competition_id, season_id))
+            self.db.executemany('INSERT OR REPLACE INTO match (match_id, competition_id, season_id) VALUES (?, ?, ?);',
+                                [(match_id, competition_id, season_id) for match_id in match_ids])
+            self.db.execute('INSERT OR REPLACE INTO matches_file (file_path, competition_id, season_id, file_size, file_mtime) VALUES (?, ?, ?, ?, ?);',
+                            (path, competition_id, season_id, stat.st_size, stat.st_mtime))
+            parsed += 1
+
+        for path in known:
+            competition_id, season_id = self.db.execute('SELECT competition_id, season_id FROM matches_file WHERE file_path = ?;', (path,)).fetchone()
+            self.db.execute('DELETE FROM match WHERE competition_id = ? AND season_id = ?;', (competition_id, season_id))
+            self.db.execute('DELETE FROM matches_file WHERE file_path = ?;', (path,))
+        return parsed
+
+    def refresh_match_files(self, dataset_type):
+        '''
+        Record the events, lineups or three-sixty files that were added, changed or removed, from one listing
+        of their directory. return: the number of rows written or removed
+        '''
+        known = {match_id: (size, mtime) for match_id, size, mtime in self.db.execute(
+            'SELECT match_id, file_size, file_mtime FROM match_file WHERE dataset_type = ?;', (dataset_type,))}
+        directory = os.path.join(DATASET_PATH, 'data', dataset_type)
+        rows = []
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name, extension = os.path.splitext(entry.name)
+                    if extension != '.json' or not name.isdigit():
+                        continue
+                    match_id = int(name)
+                    stat = entry.stat()
+                    if known.pop(match_id, None) != (stat.st_size, stat.st_mtime):
+                        rows.append((match_id, dataset_type, os.path.join('data', dataset_type, entry.name), stat.st_size, stat.st_mtime))
+
+        self.db.executemany('INSERT OR REPLACE INTO match_file (match_id, dataset_type, file_path, file_size, file_mtime) VALUES (?, ?, ?, ?, ?);', rows)
+        self.db.executemany('DELETE FROM match_file WHERE match_id = ? AND dataset_type = ?;', [(match_id, dataset_type) for match_id in known])
+        return len(rows) + len(known)
+
+    def select(self, competitions=None, seasons=None):
+        '''Restrict file_paths() to some competitions and/or seasons. None selects every one.'''
+        self.competitions = list(competitions) if competitions else None
+        self.seasons = list(seasons) if seasons else None
+
+    def season_conditions(self, table):
+        '''WHERE conditions and parameters of the current selection, on a table with competition_id and season_id.'''
+        conditions, params = [], []
+        for column, values in (('competition_id', self.competitions), ('season_id', self.seasons)):
+            if values is not None:
+                conditions.append(f"{table}.{column} IN ({', '.join('?' * len(values))})")
+                params += values
+        return conditions, params
+
+    def file_paths(self, dataset_type):
+        '''
+        Paths of the selected files of a dataset type, ordered like load_data.get_file_paths.
+
+        Without a selection, per-match files whose match isn't in any matches file are listed too.
+        '''
+        if dataset_type == 'matches':
+            conditions, params = self.season_conditions('matches_file')
+            where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+            rows = self.db.execute(f'SELECT file_path FROM matches_file {where} ORDER BY competition_id, season_id;', params)
+        elif dataset_type in MATCH_DATASETS:
+            conditions, params = self.season_conditions('match')
+            rows = self.db.execute(f'''
+            SELECT match_file.file_path FROM match_file
+            LEFT JOIN match ON match.match_id = match_file.match_id
+            WHERE {' AND '.join(['match_file.dataset_type = ?'] + conditions)}
+            ORDER BY match_file.match_id;
+            ''', [dataset_type] + params)
+        else:
+            raise ValueError(f'Unknown dataset type {dataset_type}')
+        return [os.path.join(DATASET_PATH, file_path) for (file_path,) in rows]
+
+    def summary(self):
+        '''return: list of (competition_id, season_id, matches, events files, bytes of events files), one per competition season'''
+        return self.db.execute('''
+        SELECT m.competition_id, m.season_id, COUNT(*), COUNT(f.match_id), COALESCE(SUM(f.file_size), 0)
+        FROM match m
+        LEFT JOIN match_file f ON f.match_id = m.match_id AND f.dataset_type = 'events'
+        GROUP BY m.competition_id, m.season_id
+        ORDER BY m.competition_id, m.season_id;
+        ''').fetchall()
+
+# Shared by every loader in this process. get_file_paths falls back to listing the directories while it isn't open.
+catalog = DatasetCatalog()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default = CATALOG_PATH, help = 'SQLite file holding the catalog')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    catalog.open(args.path)
+    catalog.refresh()
+    for competition_id, season_id, matches, event_files, event_bytes in catalog.summary():
+        print(f'{competition_id}\t{season_id}\t{matches} matches\t{event_files} events files\t{event_bytes / (1 << 20):.1f} MB')
+    catalog.close()
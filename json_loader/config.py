@@ -11,3 +11,12 @@ DATABASE_CONFIG = {
 # This setup assumes the data is unzipped in the parent directory of the repo.
 current_dir = os.path.dirname(os.path.abspath(__file__))
 DATASET_PATH = os.path.join(os.path.dirname(current_dir), 'open-data')
+
+# Local catalog of the dataset files, mapping each match to its competition season (see catalog.py).
+CATALOG_PATH = os.path.join(os.path.dirname(current_dir), 'dataset_catalog.sqlite')
+
+# Number of buffered rows after which the batch writer sends them to the database in one pipeline.
+BATCH_SIZE = 5000
+
+# Secondary indexes dropped and rebuilt around a bulk load.
+INDEXES_PATH = os.path.join(os.path.dirname(current_dir), 'sql', 'indexes.sql')
@@ -0,0 +1,95 @@
+#! /usr/bin/python3
+
+# Dimension tables, in foreign key order, with the columns a cached row holds. The first column is the primary key.
+DIMENSION_TABLES = {
+    'country': ('country_id', 'country_name'),
+    'season': ('season_id', 'season_name'),
+    'team': ('team_id', 'team_name', 'team_gender', 'country_id'),
+    'player': ('player_id', 'player_name', 'player_nickname', 'jersey_number', 'country_id'),
+    'stadium': ('stadium_id', 'name', 'country_id'),
+    'referee': ('referee_id', 'name', 'country_id'),
+    'competition': ('competition_id', 'competition_name', 'competition_gender', 'competition_youth', 'competition_international', 'season_id', 'country_id'),
+    # Lookup tables for event attributes, keyed by the StatsBomb ids
+    'event_type': ('event_type_id', 'name'),
+    'play_pattern': ('play_pattern_id', 'name'),
+    'position': ('position_id', 'position_name'),
+    'outcome': ('outcome_id', 'name'),
+    'body_part': ('body_part_id', 'name'),
+    'height': ('height_id', 'name'),
+    'pass_type': ('pass_type_id', 'name'),
+    'technique': ('technique_id', 'name'),
+    'shot_type': ('shot_type_id', 'name'),
+    'tackle_type': ('tackle_type_id', 'name'),
+    'goalkeeper_action_type': ('goalkeeper_action_type_id', 'name'),
+}
+
+class DimensionCache:
+    '''
+    Process-wide record of which dimension rows are already in the database.
+
+    Loaders add() every dimension row they come across. Rows that are already known are dropped locally,
+    and only the genuinely new ones are queued on a BatchWriter by flush().
+    '''
+
+    def __init__(self):
+        self.known = {table: set() for table in DIMENSION_TABLES}
+        self.pending = {table: {} for table in DIMENSION_TABLES}
+        self.country_ids = {}
+
+    def preload(self, conn):
+        '''Replace the cache contents with the dimension keys currently in the database.'''
+        self.__init__()
+        with conn.cursor() as cur:
+            for table, columns in DIMENSION_TABLES.items():
+                cur.execute(f'SELECT {columns[0]} FROM {table};')
+                self.known[table] = {row[0] for row in cur}
+
+            cur.execute('SELECT country_id, country_name FROM country;')
+            self.country_ids = {name: country_id for country_id, name in cur}
+        conn.commit()
+
+    def add(self, table, row):
+        '''
+        Queue a dimension row for insertion unless a row with the same key is already known.
+
+        row: tuple matching DIMENSION_TABLES[table]; missing trailing columns are filled with None
+        return: True if the row is new
+        '''
+        key = row[0]
+        if key is None or key in self.known[table] or key in self.pending[table]:
+            return False
+
+        width = len(DIMENSION_TABLES[table])
+        self.pending[table][key] = tuple(row) + (None,) * (width - len(row))
+        if table == 'country':
+            self.country_ids.setdefault(row[1], key)
+        return True
+
+    def country_id(self, country_name):
+        '''Look up a country_id by name, without a round trip. Returns None for unknown countries.'''
+        return self.country_ids.get(country_name)
+
+    def flush(self, writer):
+        '''
+        Queue all pending rows on a BatchWriter as INSERT ... ON CONFLICT DO NOTHING, table by table in primary key order.
+
+        The rows are written in the writer's transaction. If that transaction is rolled back, preload() the cache again.
+        return: the number of rows queued
+        '''
+        count = 0
+        for table, columns in DIMENSION_TABLES.items():
+            pending = self.pending[table]
+            if not pending:
+                continue
+
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) ON CONFLICT DO NOTHING;"
+            for key in sorted(pending):
+                writer.add(sql, pending[key])
+            count += len(pending)
+
+            self.known[table].update(pending)
+            pending.clear()
+        return count
+
+# Shared by every loader in this process. Worker processes preload their own copy.
+dimensions = DimensionCache()
@@ -0,0 +1,207 @@
+#! /usr/bin/python3
+
+import os
+from load_data import EVENT_COLUMNS, build_event_row
+from stream_json import iter_json_array
+
+# NumPy is only needed for the in-memory event store, not for loading the database.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Stand-in for a missing id in the integer columns (e.g. the player of a "Half Start" event).
+MISSING = -1
+
+# Columns of a MatchEventStore and their dtypes. Missing floats are NaN.
+FIELDS = (
+    ('match_id', 'int32'),
+    ('event_index', 'int32'),
+    ('period', 'int8'),
+    ('timestamp_ms', 'int64'),
+    ('minute', 'int16'),
+    ('second', 'int16'),
+    ('event_type_id', 'int16'),
+    ('possession', 'int32'),
+    ('possession_team_id', 'int32'),
+    ('play_pattern_id', 'int16'),
+    ('team_id', 'int32'),
+    ('player_id', 'int32'),
+    ('position_id', 'int16'),
+    ('x', 'float32'),
+    ('y', 'float32'),
+    ('zone_id', 'int16'),
+    ('duration', 'float32'),
+    ('off_camera', 'bool'),
+    ('under_pressure', 'bool'),
+    ('counterpress', 'bool'),
+    ('out', 'bool'),
+)
+
+# Position of each source column in an EVENT_COLUMNS row.
+_COLUMN = {name: i for i, name in enumerate(EVENT_COLUMNS)}
+
+def timestamp_ms(value):
+    '''Milliseconds since the start of the period of a datetime.time event timestamp.'''
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000 + value.microsecond // 1000
+
+class MatchEventStore:
+    '''
+    Events of one or more matches held as one NumPy array per column, sorted by (match_id, event_index).
+
+    Filters build boolean masks with vectorized comparisons, and since a possession is a contiguous run of
+    events within a match, possessions are grouped by their start offsets without sorting.
+
+        store = MatchEventStore.from_json(['open-data/data/events/3788741.json'])
+        shots = store.filter(event_types=[16], start_ms=0, end_ms=15 * 60 * 1000)
+        shots['x'].mean()
+    '''
+
+    def __init__(self, columns, event_ids):
+        '''
+        columns: dict of column name -> array, for every name in FIELDS
+        event_ids: array of the event UUIDs as 16-byte strings, aligned with the columns
+        '''
+        if np is None:
+            raise ImportError('MatchEventStore needs numpy (pip install numpy)')
+        self.columns = columns
+        self.event_ids = event_ids
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''
+        Build a store from rows laid out like load_data.EVENT_COLUMNS (as made by build_event_row), where the
+        location is any (x, y) pair or None.
+        '''
+        if np is None:
+            raise ImportError('MatchEventStore needs numpy (pip install numpy)')
+        rows = list(rows)
+        count = len(rows)
+
+        def column(name, dtype, fill=MISSING):
+            i = _COLUMN[name]
+            return np.fromiter((fill if row[i] is None else row[i] for row in rows), dtype=dtype, count=count)
+
+        columns = {}
+        for name, dtype in FIELDS:
+            if name == 'timestamp_ms':
+                i = _COLUMN['timestamp']
+                columns[name] = np.fromiter((MISSING if row[i] is None else timestamp_ms(row[i]) for row in rows), dtype=dtype, count=count)
+            elif name in ('x', 'y'):
+                i, axis = _COLUMN['location'], 0 if name == 'x' else 1
+                columns[name] = np.fromiter((np.nan if row[i] is None else row[i][axis] for row in rows), dtype=dtype, count=count)
+            elif dtype == 'bool':
+                columns[name] = column(name, dtype, fill=False)
+            elif dtype.startswith('float'):
+                columns[name] = column(name, dtype, fill=np.nan)
+            else:
+                columns[name] = column(name, dtype)
+
+        event_ids = np.array([row[_COLUMN['event_id']].bytes for row in rows], dtype='S16')
+
+        # Keep events in match order, whatever order the rows came in.
+        order = np.lexsort((columns['event_index'], columns['match_id']))
+        return cls({name: values[order] for name, values in columns.items()}, event_ids[order])
+
+    @classmethod
+    def from_json(cls, file_paths):
+        '''Parse StatsBomb events files with the loader's row builder. The match id is taken from each file name.'''
+        def rows():
+            for file_path in file_paths:
+                match_id = int(os.path.splitext(os.path.basename(file_path))[0])
+                for entry in iter_json_array(file_path):
+                    yield build_event_row(entry, match_id)
+        return cls.from_rows(rows())
+
+    @classmethod
+    def from_database(cls, conn, match_ids):
+        '''Read the events of the given matches from the events table. Lineup pseudo-events are left out.'''
+        selected = ['location[0], location[1]' if name == 'location' else name for name in EVENT_COLUMNS]
+        location = _COLUMN['location']
+        with conn.cursor() as cur:
+            cur.execute(f'''
+            SELECT {', '.join(selected)} FROM events
+            WHERE match_id = ANY(%s) AND event_index IS NOT NULL
+            ORDER BY match_id, event_index;
+            ''', (list(match_ids),))
+            rows = [row[:location] + ((row[location], row[location + 1]) if row[location] is not None else None,) + row[location + 2:] for row in cur]
+        conn.commit()
+        return cls.from_rows(rows)
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def take(self, selection):
+        '''New store with the events picked by a boolean mask or an array of positions.'''
+        return MatchEventStore({name: values[selection] for name, values in self.columns.items()}, self.event_ids[selection])
+
+    def mask(self, event_types=None, teams=None, players=None, matches=None, zones=None, period=None, start_ms=None, end_ms=None):
+        '''
+        Boolean mask of the events matching every given condition.
+
+        event_types, teams, players, matches, zones: iterables of ids to keep (zones as in pitch_zones.py)
+        period: int - Only events of this period
+        start_ms, end_ms: int - Time window within the period, in milliseconds; end_ms is exclusive
+        '''
+        selected = np.ones(len(self), dtype=bool)
+        for name, values in (('event_type_id', event_types), ('team_id', teams), ('player_id', players), ('match_id', matches), ('zone_id', zones)):
+            if values is not None:
+                selected &= np.isin(self.columns[name], np.fromiter(values, dtype=self.columns[name].dtype))
+        if period is not None:
+            selected &= self.columns['period'] == period
+        if start_ms is not None:
+            selected &= self.columns['timestamp_ms'] >= start_ms
+        if end_ms is not None:
+            selected &= self.columns['timestamp_ms'] < end_ms
+        return selected
+
+    def filter(self, **conditions):
+        '''New store with the events matching mask(**conditions).'''
+        return self.take(self.mask(**conditions))
+
+    def possession_starts(self):
+        '''Offsets of the first event of every possession; each possession runs until the next offset.'''
+        match_id, possession = self.columns['match_id'], self.columns['possession']
+        changed = (match_id[1:] != match_id[:-1]) | (possession[1:] != possession[:-1])
+        return np.concatenate(([0], np.flatnonzero(changed) + 1)) if len(self) else np.zeros(0, dtype=np.intp)
+
+    def possessions(self):
+        '''
+        One entry per possession, as arrays: match_id, possession, team_id (the team in possession),
+        start_ms, end_ms (timestamps of its first and last event), period and events (its number of events).
+        '''
+        starts = self.possession_starts()
+        ends = np.append(starts[1:], len(self)) - 1
+        return {
+            'match_id': self.columns['match_id'][starts],
+            'possession': self.columns['possession'][starts],
+            'team_id': self.columns['possession_team_id'][starts],
+            'period': self.columns['period'][starts],
+            'start_ms': self.columns['timestamp_ms'][starts],
+            'end_ms': self.columns['timestamp_ms'][ends],
+            'events': ends - starts + 1,
+        }
+
+    def per_possession(self, values, reducer=np.add):
+        '''
+        Reduce a per-event array over each possession, e.g. per_possession(store.mask(event_types=[30])) counts passes.
+
+        return: array with one value per possession, aligned with possessions()
+        '''
+        values = np.asarray(values)
+        # Booleans would be or-ed together rather than counted.
+        if values.dtype == bool:
+            values = values.astype(np.int64)
+        return reducer.reduceat(values, self.possession_starts()) if len(self) else np.zeros(0)
+
+    def counts(self, name, selection=None):
+        '''
+        Number of events per distinct value of a column, e.g. counts('player_id', store.mask(event_types=[16])).
+
+        return: tuple (values, counts) of arrays, sorted by value
+        '''
+        values = self.columns[name] if selection is None else self.columns[name][selection]
+        return np.unique(values, return_counts=True)
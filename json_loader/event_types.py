@@ -0,0 +1,188 @@
+#! /usr/bin/python3
+
+from adapters import to_point
+from dimension_cache import dimensions
+
+# StatsBomb event type ids of the events that have a row in a per-type table.
+PASS = 30
+SHOT = 16
+CARRY = 43
+DRIBBLE = 14
+BALL_RECOVERY = 2
+CLEARANCE = 9
+FOUL_COMMITTED = 22
+SUBSTITUTION = 19
+FOUL_WON = 21
+INTERCEPTION = 10
+BLOCK = 6
+DUEL = 4
+BALL_RECEIPT = 42
+GOAL_KEEPER = 23
+BAD_BEHAVIOUR = 24
+STARTING_XI = 35
+TACTICAL_SHIFT = 36
+# Event types without a per-type table
+DRIBBLED_PAST = 39
+
+# Duels of this type are stored in the tackle table.
+TACKLE_DUEL_TYPE = 11
+# Older open-data revisions flag through balls with a boolean rather than the pass technique.
+THROUGH_BALL = {'id': 108, 'name': 'Through Ball'}
+# Outcome of a successful dribble
+DRIBBLE_COMPLETE = 8
+
+# Per-type tables, in the order they are written, with their columns and the Postgres types binary COPY needs.
+SUBTYPE_TABLES = {
+    'pass': (('event_id', 'recipient_id', 'length', 'angle', 'height_id', 'end_location', 'body_part_id', 'type_id'),
+             ('uuid', 'int4', 'float8', 'float8', 'int4', 'point', 'int4', 'int4')),
+    'shot': (('event_id', 'end_location', 'outcome_id', 'technique_id', 'body_part_id', 'type_id', 'statsbomb_xg', 'first_time'),
+             ('uuid', 'point', 'int4', 'int4', 'int4', 'int4', 'float8', 'bool')),
+    'carry': (('event_id', 'end_location'),
+              ('uuid', 'point')),
+    'dribble': (('event_id', 'outcome_id'),
+                ('uuid', 'int4')),
+    'ball_recovery': (('event_id', 'recovery_failure'),
+                      ('uuid', 'bool')),
+    'clearance': (('event_id', 'body_part_id', 'right_foot'),
+                  ('uuid', 'int4', 'bool')),
+    'foul_committed': (('event_id', 'card_id'),
+                       ('uuid', 'int4')),
+    'substitution': (('event_id', 'replacement_id', 'outcome_id'),
+                     ('uuid', 'int4', 'int4')),
+    'foul_won': (('event_id', 'defensive'),
+                 ('uuid', 'bool')),
+    'interception': (('event_id', 'outcome_id'),
+                     ('uuid', 'int4')),
+    'block': (('event_id', 'deflection'),
+              ('uuid', 'bool')),
+    'tackle': (('event_id', 'type_id', 'outcome_id'),
+               ('uuid', 'int4', 'int4')),
+    'ball_receipt': (('event_id', 'outcome_id'),
+                     ('uuid', 'int4')),
+    'goalkeeper_action': (('event_id', 'outcome_id', 'technique_id', 'type_id'),
+                          ('uuid', 'int4', 'int4', 'int4')),
+    'bad_behaviour': (('event_id', 'card_id'),
+                      ('uuid', 'int4')),
+    'tactics': (('event_id', 'formation', 'lineup_type'),
+                ('uuid', 'varchar', 'varchar')),
+}
+
+def lookup(table, attribute):
+    '''
+    Register a StatsBomb {"id": ..., "name": ...} attribute with the dimension cache.
+
+    return: its id, or None if the attribute is missing
+    '''
+    if attribute is None:
+        return None
+    dimensions.add(table, (attribute['id'], attribute['name']))
+    return attribute['id']
+
+def player_id(attribute):
+    '''Id of a StatsBomb player attribute. Players themselves come from the lineups.'''
+    return attribute['id'] if attribute is not None else None
+
+def pass_row(event_id, attrs):
+    # Open play passes have no type, so the technique (e.g. "Through Ball") stands in for it.
+    pass_type = attrs.get('type') or attrs.get('technique')
+    if pass_type is None and attrs.get('through_ball'):
+        pass_type = THROUGH_BALL
+    return (event_id, player_id(attrs.get('recipient')), attrs.get('length'), attrs.get('angle'), lookup('height', attrs.get('height')),
+            to_point(attrs.get('end_location')), lookup('body_part', attrs.get('body_part')), lookup('pass_type', pass_type))
+
+def shot_row(event_id, attrs):
+    return (event_id, to_point(attrs.get('end_location')), lookup('outcome', attrs.get('outcome')), lookup('technique', attrs.get('technique')),
+            lookup('body_part', attrs.get('body_part')), lookup('shot_type', attrs.get('type')), attrs.get('statsbomb_xg'), attrs.get('first_time', False))
+
+def carry_row(event_id, attrs):
+    return (event_id, to_point(attrs.get('end_location')))
+
+def outcome_row(event_id, attrs):
+    '''Row for the tables that only record an outcome (dribble, interception, ball_receipt).'''
+    return (event_id, lookup('outcome', attrs.get('outcome')))
+
+def ball_recovery_row(event_id, attrs):
+    return (event_id, attrs.get('recovery_failure', False))
+
+def clearance_row(event_id, attrs):
+    return (event_id, lookup('body_part', attrs.get('body_part')), attrs.get('right_foot', False))
+
+def card_row(event_id, attrs):
+    '''Row for foul_committed and bad_behaviour. The cards table can't hold per-event cards yet, so card_id stays empty.'''
+    return (event_id, None)
+
+def substitution_row(event_id, attrs):
+    return (event_id, player_id(attrs.get('replacement')), lookup('outcome', attrs.get('outcome')))
+
+def foul_won_row(event_id, attrs):
+    return (event_id, attrs.get('defensive', False))
+
+def block_row(event_id, attrs):
+    return (event_id, attrs.get('deflection', False))
+
+def tackle_row(event_id, attrs):
+    return (event_id, lookup('tackle_type', attrs.get('type')), lookup('outcome', attrs.get('outcome')))
+
+def goalkeeper_row(event_id, attrs):
+    return (event_id, lookup('outcome', attrs.get('outcome')), lookup('technique', attrs.get('technique')), lookup('goalkeeper_action_type', attrs.get('type')))
+
+def tactics_row(event_id, attrs, type_name):
+    formation = attrs.get('formation')
+    return (event_id, str(formation) if formation is not None else None, type_name)
+
+# StatsBomb event type id -> (table, key of the event's attributes, row builder)
+DISPATCH = {
+    PASS: ('pass', 'pass', pass_row),
+    SHOT: ('shot', 'shot', shot_row),
+    CARRY: ('carry', 'carry', carry_row),
+    DRIBBLE: ('dribble', 'dribble', outcome_row),
+    BALL_RECOVERY: ('ball_recovery', 'ball_recovery', ball_recovery_row),
+    CLEARANCE: ('clearance', 'clearance', clearance_row),
+    FOUL_COMMITTED: ('foul_committed', 'foul_committed', card_row),
+    SUBSTITUTION: ('substitution', 'substitution', substitution_row),
+    FOUL_WON: ('foul_won', 'foul_won', foul_won_row),
+    INTERCEPTION: ('interception', 'interception', outcome_row),
+    BLOCK: ('block', 'block', block_row),
+    BALL_RECEIPT: ('ball_receipt', 'ball_receipt', outcome_row),
+    GOAL_KEEPER: ('goalkeeper_action', 'goalkeeper', goalkeeper_row),
+    BAD_BEHAVIOUR: ('bad_behaviour', 'bad_behaviour', card_row),
+}
+
+class EventFanOut:
+    '''
+    Collects the per-type rows of a whole match file, one buffer per table, so each table can be written
+    with a single bulk write once the file has been parsed.
+
+    Every lookup value an event refers to (event type, play pattern, position, outcome, body part, ...) is
+    registered with the dimension cache along the way, and has to be flushed before the rows are written.
+    '''
+
+    def __init__(self):
+        self.buffers = {table: [] for table in SUBTYPE_TABLES}
+
+    def add(self, entry, event_id):
+        '''Register the lookups of one event and buffer its per-type row, if its type has a table.'''
+        event_type = entry['type']
+        lookup('event_type', event_type)
+        lookup('play_pattern', entry.get('play_pattern'))
+        lookup('position', entry.get('position'))
+
+        type_id = event_type['id']
+        if type_id in DISPATCH:
+            table, key, build_row = DISPATCH[type_id]
+            self.buffers[table].append(build_row(event_id, entry.get(key) or {}))
+
+        elif type_id == DUEL and (entry.get('duel') or {}).get('type', {}).get('id') == TACKLE_DUEL_TYPE:
+            self.buffers['tackle'].append(tackle_row(event_id, entry['duel']))
+
+        elif type_id in (STARTING_XI, TACTICAL_SHIFT):
+            self.buffers['tactics'].append(tactics_row(event_id, entry.get('tactics') or {}, event_type['name']))
+
+    def row_count(self):
+        return sum(len(rows) for rows in self.buffers.values())
+
+    def tables(self):
+        '''Yield (table, columns, types, rows) for every table with buffered rows.'''
+        for table, (columns, types) in SUBTYPE_TABLES.items():
+            if self.buffers[table]:
+                yield table, columns, types, self.buffers[table]
@@ -0,0 +1,206 @@
+#! /usr/bin/python3
+
+import argparse
+from collections import namedtuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Match clock (in seconds) at which each period starts. Period 5 is the penalty shootout, which isn't played time.
+PERIOD_STARTS = {1: 0, 2: 45 * 60, 3: 90 * 60, 4: 105 * 60}
+
+# Points in time are ordered by period first, as the match clock of first half stoppage time overlaps the
+# start of the second half. They are encoded as period * PERIOD_SPAN + second of match clock.
+PERIOD_SPAN = 100000
+OPEN_END = 10 * PERIOD_SPAN
+
+OnPitch = namedtuple('OnPitch', 'player_id team_id position_id')
+
+INTERVALS_SQL = '''
+SELECT li.match_id, m.competition_id, m.season_id, li.player_id, li.team_id, li.position_id,
+       li.from_period, li.start_second, li.to_period, li.end_second
+FROM lineup_interval li
+JOIN match m ON m.match_id = li.match_id
+{where};
+'''
+
+# How long each period of a match lasted, taken from the end of its last possession.
+PERIOD_ENDS_SQL = '''
+SELECT p.match_id, p.period, EXTRACT(EPOCH FROM MAX(p.end_time))::int
+FROM possession p
+JOIN match m ON m.match_id = p.match_id
+{where}
+GROUP BY p.match_id, p.period;
+'''
+
+def instant(period, second):
+    '''A point in time of a match, ordered across periods, see PERIOD_SPAN.'''
+    return period * PERIOD_SPAN + second
+
+class IntervalTree:
+    '''
+    A static centered interval tree over half-open [start, end) intervals, answering which intervals contain
+    a point in O(log n + k).
+
+    Each node keeps the intervals containing its center, sorted by start and by end, and the intervals lying
+    entirely before or after the center go to its left and right subtrees.
+    '''
+
+    def __init__(self, intervals):
+        '''intervals: list of (start, end, value). Empty ones (start >= end) contain no point and are dropped.'''
+        self.root = self.build([interval for interval in intervals if interval[0] < interval[1]])
+
+    @classmethod
+    def build(cls, intervals):
+        if not intervals:
+            return None
+        starts = sorted(start for start, _, _ in intervals)
+        center = starts[len(starts) // 2]
+        here = [interval for interval in intervals if interval[0] <= center < interval[1]]
+        left = [interval for interval in intervals if interval[1] <= center]
+        right = [interval for interval in intervals if interval[0] > center]
+        return (
+            center,
+            sorted(here, key=lambda interval: interval[0]),
+            sorted(here, key=lambda interval: interval[1], reverse=True),
+            cls.build(left),
+            cls.build(right),
+        )
+
+    def at(self, point):
+        '''return: list of the values of the intervals containing point'''
+        found = []
+        node = self.root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if point < center:
+                for start, _, value in by_start:
+                    if start > point:
+                        break
+                    found.append(value)
+                node = left
+            else:
+                for _, end, value in by_end:
+                    if end <= point:
+                        break
+                    found.append(value)
+                node = right if point > center else None
+        return found
+
+class LineupIntervals:
+    '''
+    The lineup_interval rows of a set of matches, indexed to answer who was on the pitch at a point of a
+    match (one interval tree per match) and how many minutes a player played in a competition season
+    (summed once, when the index is built).
+    '''
+
+    def __init__(self, rows, period_ends=None):
+        '''
+        rows: (match_id, competition_id, season_id, player_id, team_id, position_id, from_period, start_second, to_period, end_second)
+        period_ends: dict of (match_id, period) -> seconds the period lasted; without an entry a period lasts
+        until the next one starts (45 minutes, or 15 in extra time)
+        '''
+        self.period_ends = period_ends or {}
+        intervals = {}
+        self.last_periods = {}
+        # A match lasted until the end of the last period it has possessions or substitutions in.
+        periods = [(match_id, period) for match_id, period in self.period_ends] + [(row[0], max(row[6], row[8] or row[6])) for row in rows]
+        for match_id, period in periods:
+            self.last_periods[match_id] = min(max(period, self.last_periods.get(match_id, 1)), max(PERIOD_STARTS))
+
+        self.minutes = {}
+        for match_id, competition_id, season_id, player_id, team_id, position_id, from_period, start_second, to_period, end_second in rows:
+            end = OPEN_END if end_second is None else instant(to_period or from_period, end_second)
+            intervals.setdefault(match_id, []).append((instant(from_period, start_second), end, OnPitch(player_id, team_id, position_id)))
+
+            key = (competition_id, season_id, player_id)
+            played = self.seconds_played(match_id, from_period, start_second, to_period, end_second)
+            self.minutes[key] = self.minutes.get(key, 0) + played / 60
+
+        self.trees = {match_id: IntervalTree(match_intervals) for match_id, match_intervals in intervals.items()}
+
+    @classmethod
+    def from_database(cls, conn, competition_id=None, season_id=None):
+        '''Read the intervals (and period lengths) of every match, or of one competition and/or season.'''
+        conditions, params = [], []
+        if competition_id is not None:
+            conditions.append('m.competition_id = %s')
+            params.append(competition_id)
+        if season_id is not None:
+            conditions.append('m.season_id = %s')
+            params.append(season_id)
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+        with conn.cursor() as cur:
+            cur.execute(INTERVALS_SQL.format(where=where), params)
+            rows = cur.fetchall()
+            cur.execute(PERIOD_ENDS_SQL.format(where=where), params)
+            period_ends = {(match_id, period): seconds for match_id, period, seconds in cur.fetchall() if period in PERIOD_STARTS}
+        conn.commit()
+        return cls(rows, period_ends)
+
+    def period_end(self, match_id, period):
+        '''Match clock at which a period ended.'''
+        if (match_id, period) in self.period_ends:
+            return PERIOD_STARTS[period] + self.period_ends[match_id, period]
+        return PERIOD_STARTS.get(period + 1, PERIOD_STARTS[period] + 15 * 60)
+
+    def seconds_played(self, match_id, from_period, start_second, to_period, end_second):
+        '''Seconds of an interval spent on the pitch, adding up the part of it in each period it spans.'''
+        if end_second is None:
+            to_period = self.last_periods[match_id]
+        played = 0
+        for period in range(from_period, min(to_period or from_period, max(PERIOD_STARTS)) + 1):
+            if period not in PERIOD_STARTS:
+                continue
+            start = start_second if period == from_period else PERIOD_STARTS[period]
+            end = end_second if period == to_period and end_second is not None else self.period_end(match_id, period)
+            played += max(end - start, 0)
+        return played
+
+    def on_pitch(self, match_id, period, minute, second=0):
+        '''
+        The players on the pitch at a point of a match, e.g. on_pitch(3788741, 2, 67) for the 68th minute.
+
+        minute, second: match clock as in the events, so the second half starts at minute 45
+        return: list of OnPitch (player_id, team_id, position_id), empty for a match without intervals
+        '''
+        tree = self.trees.get(match_id)
+        return [] if tree is None else tree.at(instant(period, minute * 60 + second))
+
+    def minutes_played(self, competition_id, season_id, player_id):
+        '''Minutes a player spent on the pitch in a competition season, 0 if they never played.'''
+        return self.minutes.get((competition_id, season_id, player_id), 0)
+
+    def season_minutes(self, competition_id, season_id):
+        '''return: dict of player_id -> minutes played in a competition season'''
+        return {player_id: minutes for (competition, season, player_id), minutes in self.minutes.items()
+                if (competition, season) == (competition_id, season_id)}
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    parser = argparse.ArgumentParser()
+    parser.add_argument('competition_id', type = int)
+    parser.add_argument('season_id', type = int)
+    parser.add_argument('--top', default = 10, type = int, help = 'Number of players with the most minutes to print')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = connect_db()
+    start = time.perf_counter()
+    index = LineupIntervals.from_database(conn, args.competition_id, args.season_id)
+    logger.info(f'Indexed {len(index.trees)} matches in {time.perf_counter() - start:.2f}s')
+    conn.close()
+
+    # Time a lookup at every minute of every match.
+    lookups = [(match_id, period, minute) for match_id in index.trees for period, minute in [(1, m) for m in range(45)] + [(2, m) for m in range(45, 90)]]
+    start = time.perf_counter()
+    for match_id, period, minute in lookups:
+        index.on_pitch(match_id, period, minute)
+    elapsed = time.perf_counter() - start
+    logger.info(f'{len(lookups)} on-pitch lookups in {elapsed:.3f}s ({elapsed / max(len(lookups), 1) * 1e6:.1f} µs per lookup)')
+
+    season = index.season_minutes(args.competition_id, args.season_id)
+    for player_id, minutes in sorted(season.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'{player_id}\t{minutes:.0f}')
@@ -1,23 +1,66 @@
 #! /usr/bin/python3
 
 import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import time as dt_time
 from glob import glob
 import json
+import logging
+import time
 import uuid
 import os
+import resource
+import sys
 import psycopg
-from config import DATABASE_CONFIG, DATASET_PATH
+from adapters import to_point
+import async_load
+from batching import BatchWriter
+from bulk_load import create_indexes, finish_bulk_load, prepare_bulk_load
+from catalog import catalog
+from config import BATCH_SIZE, DATABASE_CONFIG, DATASET_PATH
+from dimension_cache import DIMENSION_TABLES, dimensions
+from event_types import SUBTYPE_TABLES, EventFanOut
+from pitch_zones import point_zone
+from partitions import PARTITION_COLUMNS, PARTITION_TYPES, PARTITIONED_TABLES, partitions
+from manifest import check_file, file_fingerprint, record_file
+from possessions import POSSESSION_COLUMNS, POSSESSION_TYPES, PossessionChains
+from progress import ProgressReporter
+from rollups import add_match, match_statements, rebuild as rebuild_rollups
+from stream_json import iter_json_array
+from three_sixty import FREEZE_FRAME_COLUMNS, FREEZE_FRAME_TYPES, THREE_SIXTY_COLUMNS, THREE_SIXTY_TYPES, ThreeSixtyFrames, event_uuids
+
+logger = logging.getLogger(__name__)
+LOG_FORMAT = '%(asctime)s %(processName)s %(levelname)s %(message)s'
+
+# Whether loading a match file also updates player_season_stats and team_season_stats. Bulk loads rebuild them once at the end instead.
+refresh_rollups = True
+
+# Column layouts shared by the INSERT and COPY paths of load_events.
+# The type names are needed by binary COPY, which can't infer them from the Python values.
+# The per-type tables (pass, shot, ...) are described in event_types.SUBTYPE_TABLES.
+EVENT_COLUMNS = ('event_id', 'match_id', 'event_index', 'period', 'timestamp', 'minute', 'second', 'event_type_id', 'possession', 'possession_team_id', 'play_pattern_id', 'team_id', 'player_id', 'position_id', 'location', 'zone_id', 'duration', 'off_camera', 'under_pressure', 'counterpress', 'out')
+EVENT_TYPES = ('uuid', 'int4', 'int4', 'int4', 'time', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'point', 'int4', 'float8', 'bool', 'bool', 'bool', 'bool')
 
 def connect_db():
     '''Connect to the PostgreSQL database server.'''        
     conn = None
     try:
-        print('Connecting to the PostgreSQL database...')
+        logger.info('Connecting to the PostgreSQL database...')
         conn = psycopg.connect(**DATABASE_CONFIG) 
     except (Exception, psycopg.DatabaseError) as error:
-        print(error)
+        logger.error(error)
     return conn
 
+def peak_rss_mb():
+    '''
+    Peak resident set size of this process so far, in MB. It is a high-water mark, so it only goes up: a
+    file that needed less memory than an earlier one doesn't lower it.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes everywhere else.
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
 def load_json(file_path):
     '''Basic helper function which attempts to load data from a JSON file'''        
     if os.path.isfile(file_path):
@@ -33,6 +76,7 @@ def get_file_paths(dataset_type):
 
     dataset_type: str - The type of dataset ("competitions", "events", "lineups", "matches", "three-sixty")
 
+    Once the dataset catalog is open, the paths come from it, restricted to the selected competitions and seasons.
     return: iterator of file paths cooresponding to the dataset type
     '''
     base_path = os.path.join(DATASET_PATH, 'data')
@@ -40,6 +84,9 @@ def get_file_paths(dataset_type):
         # Competitions just has a single JSON file.
         return [os.path.join(base_path, 'competitions.json')]
 
+    elif catalog.db is not None:
+        return catalog.file_paths(dataset_type)
+
     elif dataset_type in ['events', 'lineups', 'three-sixty']:
         # These datasets have mutliple JSON files per directory.
         path_pattern = os.path.join(base_path, dataset_type, '*.json')
@@ -63,255 +110,328 @@ def load_competitions(file_path, conn, test):
     '''Load competition data from a JSON file into the database.'''
     data = load_json(file_path) 
 
-    # SQL to get country_id from country_name
-    country_id_sql = "SELECT country_id FROM country WHERE country_name = %s;"
-
-    # SQL to insert data into the competition table
-    insert_sql = ''' 
-    INSERT INTO competition (competition_id, competition_name, competition_gender, competition_youth, competition_international, season_id, country_id) 
-    VALUES (%s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (competition_id) DO NOTHING;
+    # Seasons go through the dimension cache. Competitions are upserted instead: the matches loader may already
+    # have written a minimal row without the gender, youth and international attributes, which are filled in here.
+    columns = DIMENSION_TABLES['competition']
+    competition_sql = f'''
+    INSERT INTO competition ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})
+    ON CONFLICT (competition_id) DO UPDATE
+    SET {', '.join(f'{column} = COALESCE(EXCLUDED.{column}, competition.{column})' for column in columns[1:])};
     '''
+    competitions = {}
+    writer = BatchWriter(conn)
+    for entry in data:
+        competition_id = entry['competition_id']
+        season_id = entry['season_id']
+        country_name = entry['country_name']
+        competition_name = entry['competition_name']
+        competition_gender = entry['competition_gender']
+        competition_youth = bool(entry['competition_youth'])
+        competition_international = bool(entry['competition_international'])
+
+        # TODO: Consider whether I need to load in these attributes or not.
+
+        season_name = entry['season_name']
+        match_updated = entry['match_updated']
+        match_updated_360 = entry.get('match_updated_360')
+        match_available = entry['match_available']
+        match_available_360 = entry.get('match_available_360')
+
+        # Get country_id from country_name
+        country_id = dimensions.country_id(entry['country_name'])
+        if country_id is None:
+            logger.warning(f"Country name {entry['country_name']} not found in database.")
+            continue  # Skip this entry
+
+        dimensions.add('season', (season_id, season_name))
+        competitions.setdefault(competition_id, (
+            competition_id,
+            competition_name,
+            competition_gender,
+            competition_youth,
+            competition_international,
+            season_id,
+            country_id
+        ))
+
+        # Log extracted data for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Competition ID: {competition_id}, Season ID: {season_id}, Country Name: {country_name}")
+            logger.debug(f"Competition Name: {competition_name}, Gender: {competition_gender}")
+            logger.debug(f"Youth: {competition_youth}, International: {competition_international}")
+            logger.debug(f"Season Name: {season_name}, Match Updated: {match_updated}")
+            logger.debug(f"Match Updated 360: {match_updated_360}, Match Available: {match_available}")
+            logger.debug(f"Match Available 360: {match_available_360}")
+
+    # The seasons are queued first, as competitions reference them. Competitions are listed once per season;
+    # the first row of each is kept, as when they were inserted one by one.
+    dimensions.flush(writer)
+    for competition_id in sorted(competitions):
+        writer.add(competition_sql, competitions[competition_id])
+    dimensions.known['competition'].update(competitions)
+    writer.flush()
 
-    with conn.cursor() as cur:
-        for entry in data:
-            competition_id = entry['competition_id']
-            season_id = entry['season_id']
-            country_name = entry['country_name']
-            competition_name = entry['competition_name']
-            competition_gender = entry['competition_gender']
-            competition_youth = bool(entry['competition_youth'])
-            competition_international = bool(entry['competition_international'])
-
-            # TODO: Consider whether I need to load in these attributes or not.
-
-            season_name = entry['season_name']
-            match_updated = entry['match_updated']
-            match_updated_360 = entry.get('match_updated_360')
-            match_available = entry['match_available']
-            match_available_360 = entry.get('match_available_360')
-
-            # Get country_id from country_name
-            cur.execute(country_id_sql, (entry['country_name'],))
-            country_id = cur.fetchone()
-            if country_id:
-                country_id = country_id[0]
-
-            else:
-                print(f"Country name {entry['country_name']} not found in database.")
-                continue  # Skip this entry
-
-            # Execute the SQL insert statement
-            cur.execute(insert_sql, (
-                competition_id,
-                competition_name,
-                competition_gender,
-                competition_youth,
-                competition_international,
-                season_id,
-                country_id
-            ))
-
-            # Print extracted data for debugging
-            print(f"Competition ID: {competition_id}, Season ID: {season_id}, Country Name: {country_name}")
-            print(f"Competition Name: {competition_name}, Gender: {competition_gender}")
-            print(f"Youth: {competition_youth}, International: {competition_international}")
-            print(f"Season Name: {season_name}, Match Updated: {match_updated}")
-            print(f"Match Updated 360: {match_updated_360}, Match Available: {match_available}")
-            print(f"Match Available 360: {match_available_360}") 
-            print('\n')
-            
     # Commit all changes to the database
     conn.commit()
+    writer.log_stats(os.path.basename(file_path))
+    return len(data)
+
+def build_event_row(entry, match_id):
+    '''Convert a single StatsBomb event dict into a row matching EVENT_COLUMNS.'''
+    player = entry.get('player')
+    position = entry.get('position')
+    location = to_point(entry.get('location'))
+
+    return (
+        uuid.UUID(entry['id']),
+        match_id,
+        entry['index'],
+        entry['period'],
+        dt_time.fromisoformat(entry['timestamp']),
+        entry['minute'],
+        entry['second'],
+        entry['type']['id'],
+        entry['possession'],
+        entry['possession_team']['id'],
+        entry['play_pattern']['id'],
+        entry['team']['id'],
+        player['id'] if player is not None else None,
+        position['id'] if position is not None else None,
+        location,
+        point_zone(location),
+        entry.get('duration'),
+        entry.get('off_camera', False),
+        entry.get('under_pressure', False),
+        entry.get('counterpress', False),
+        entry.get('out', False),
+    )
+
+def copy_rows(cur, table, columns, types, rows):
+    '''
+    Stream rows into a table using binary COPY FROM STDIN.
 
-def load_events(file_path, conn, test):
-    '''Load event data from a JSON file into the database.'''
-    data = load_json(file_path) 
+    cur: psycopg cursor
+    table: str - The destination table
+    columns: tuple of column names, in the same order as each row
+    types: tuple of Postgres type names for the columns (required by binary COPY)
+    rows: iterable of tuples
 
+    return: the number of rows written
     '''
-    events_sql = 
-    INSERT INTO events (event_id, match_id, event_index, period, timestamp, minute, second, event_type_id, possession, possession_team_id, play_pattern_id, team_id, location, duration, off_camera, under_pressure, counterpress, out)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    '''
-    events_sql = '''
-    INSERT INTO events (event_id, match_id, event_index, period, timestamp, minute, second, possession, possession_team_id, team_id, location, duration, off_camera, under_pressure, counterpress, out)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    count = 0
+    copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+    with cur.copy(copy_sql) as copy:
+        copy.set_types(types)
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    return count
+
+def insert_statement(table, columns):
+    '''INSERT statement for one row of the given columns.'''
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))});"
+
+def insert_rows(cur, table, columns, rows):
+    '''Insert rows into a table with one INSERT statement per row, the baseline COPY is measured against.'''
+    insert_sql = insert_statement(table, columns)
+    count = 0
+    for row in rows:
+        cur.execute(insert_sql, row)
+        count += 1
+    return count
+
+def parse_events(file_path):
     '''
+    Parse an events file into the rows of events and the per-type tables (pass, shot, carry, ...).
 
-    shot_sql = '''
-    INSERT INTO shot (event_id, statsbomb_xg, first_time)
-    VALUES (%s, %s, %s)
+    The lookup rows the events refer to (event types, outcomes, ...) are registered with the dimension cache,
+    and have to be flushed before the rows are written.
+    return: tuple (match_id, list of (table, columns, types, rows) in write order)
     '''
+    entries = iter_json_array(file_path)
 
     # Extract match_id from filename (assuming file_path like '.../1234.json')
     match_id = int(os.path.splitext(os.path.basename(file_path))[0])
 
-    with conn.cursor() as cur:
-        for entry in data:
-            event_id = entry['id']
-            index = entry['index']
-            period = entry['period']
-            timestamp = entry['timestamp']
-            minute = entry['minute']
-            second = entry['second']
-            
-            # Extracting data from nested 'type' dictionary
-            event_type_id = entry['type']['id']
-            event_type_name = entry['type']['name']
-            
-            possession = entry['possession']
-            
-            # Extracting data from nested 'possession_team' dictionary
-            possession_team_id = entry['possession_team']['id']
-            possession_team_name = entry['possession_team']['name']
+    # The rows of the whole file are collected first: the lookup rows they refer to (event types, outcomes, ...)
+    # are only known once every event has been seen, and must be written before the events.
+    event_rows = []
+    fan_out = EventFanOut()
+    chains = PossessionChains(match_id, EVENT_COLUMNS)
+    for entry in entries:
+        row = build_event_row(entry, match_id)
+        event_rows.append(row)
+        fan_out.add(entry, row[0])
+        chains.add(row)
+
+        # Log extracted data for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Event ID: {entry['id']}, Index: {entry['index']}, Period: {entry['period']}, Timestamp: {entry['timestamp']}")
+            logger.debug(f"Minute: {entry['minute']}, Second: {entry['second']}, Event Type: {entry['type']['id']} - {entry['type']['name']}")
+            logger.debug(f"Possession: {entry['possession']}, Possession Team: {entry['possession_team']['id']} - {entry['possession_team']['name']}")
+            logger.debug(f"Play Pattern: {entry['play_pattern']['id']} - {entry['play_pattern']['name']}, Team: {entry['team']['id']} - {entry['team']['name']}")
+            logger.debug(f"Related Events: {entry.get('related_events', [])}")
+            logger.debug(f"Location: {row[EVENT_COLUMNS.index('location')]}, Duration: {entry.get('duration')}")
+            logger.debug(f"Off Camera: {entry.get('off_camera', False)}, Under Pressure: {entry.get('under_pressure', False)}, Counterpress: {entry.get('counterpress', False)}, Out: {entry.get('out', False)}")
+
+    # Events reference their possession, and per-type rows reference events, so that is the order they are written in.
+    return match_id, [
+        ('possession', POSSESSION_COLUMNS, POSSESSION_TYPES, list(chains.rows())),
+        ('events', EVENT_COLUMNS, EVENT_TYPES, event_rows),
+    ] + list(fan_out.tables())
+
+def partition_rows(cur, match_id, tables):
+    '''In the partitioned schema every row of events and the per-type tables carries the competition season of its match.'''
+    if not partitions.enabled:
+        return tables
+    key = partitions.season(cur, match_id)
+    return [
+        (table, columns + PARTITION_COLUMNS, types + PARTITION_TYPES, [row + key for row in rows]) if table in PARTITIONED_TABLES else (table, columns, types, rows)
+        for table, columns, types, rows in tables
+    ]
+
+def load_events(file_path, conn, test, mode='insert'):
+    '''
+    Load event data from a JSON file into the database, along with the per-type rows (pass, shot, carry, ...).
 
-            # Convert 'location' if exists and is a list of two floats
-            location = tuple(entry['location']) if 'location' in entry and len(entry['location']) == 2 else None
-            duration = entry.get('duration')
-            
-            # Extracting data from nested 'play_pattern' dictionary
-            play_pattern_id = entry['play_pattern']['id']
-            play_pattern_name = entry['play_pattern']['name']
-            
-            # Extracting data from nested 'team' dictionary
-            team_id = entry['team']['id']
-            team_name = entry['team']['name']
-            
-            # Handling potentially missing 'related_events' key
-            related_events = entry.get('related_events', [])
-
-            off_camera = entry.get('off_camera', False)
-            under_pressure = entry.get('under_pressure', False)
-            counterpress = entry.get('counterpress', False)
-            out = entry.get('out', False)
-
-            recipient_id, length, angle, height_id, end_location, body_part_id, type_id = None, None, None, None, None, None, None
-            # TODO: Extract passes
-            if hasattr(entry, 'pass'):
-                if entry['pass'] is not None:
-                   pass 
-
-            # TODO: Extract shots (xG scores, outcomes etc.)
-            statsbomb_xg, first_time = None, None 
-            if hasattr(entry, 'shot'):
-                if entry['shot'] is not None:
-                    statsbomb_xg = entry['shot']['statsbomb_xg']
-                    first_time = entry['shot']['first_time']
-                    
-            
+    mode: str - "insert" runs one INSERT per row, "copy" writes each table with a single binary COPY
+    '''
+    start = time.perf_counter()
+    match_id, tables = parse_events(file_path)
+
+    writer = BatchWriter(conn)
+    dimensions.flush(writer)
+    writer.flush()
 
-            # TODO: Extract dribbles
-            if hasattr(entry, 'dribble'):
-                if entry['dribble'] is not None:
-                    pass
-
-            # Print extracted data for debugging
-            print(f"Event ID: {event_id}, Index: {index}, Period: {period}, Timestamp: {timestamp}")
-            print(f"Minute: {minute}, Second: {second}, Event Type: {event_type_id} - {event_type_name}")
-            print(f"Possession: {possession}, Possession Team: {possession_team_id} - {possession_team_name}")
-            print(f"Play Pattern: {play_pattern_id} - {play_pattern_name}, Team: {team_id} - {team_name}")
-            print(f"Related Events: {related_events}") 
-            print(f"Location: {location}, Duration: {duration}")
-            print(f"Off Camera: {off_camera}, Under Pressure: {under_pressure}, Counterpress: {counterpress}, Out: {out}")
-            print('\n')
-
-            cur.execute(events_sql, (event_id, match_id, index, period, timestamp, minute, second, possession, possession_team_id, team_id, location, duration, off_camera, under_pressure, counterpress, out))
-            if statsbomb_xg is not None:
-                cur.execute(shot_sql, (event_id, statsbomb_xg, first_time)) 
+    row_count = 0
+    with conn.cursor() as cur:
+        for table, columns, types, rows in partition_rows(cur, match_id, tables):
+            if mode == 'copy':
+                row_count += copy_rows(cur, table, columns, types, rows)
+            else:
+                row_count += insert_rows(cur, table, columns, rows)
+
+        if refresh_rollups:
+            add_match(cur, match_id)
         conn.commit()
 
-def load_lineups(file_path, conn, test):
-    '''Load lineup data from a JSON file into the database.'''
+    # Report throughput so the COPY and INSERT paths can be compared file by file.
+    elapsed = time.perf_counter() - start
+    logger.info(f"[{mode}] {os.path.basename(file_path)}: {row_count} rows in {elapsed:.2f}s ({row_count / elapsed if elapsed else 0:.0f} rows/sec), process peak RSS so far {peak_rss_mb():.0f} MB")
+    return row_count
 
-    data = load_json(file_path) 
+# Columns of the pseudo-event written for each team in a lineups file.
+LINEUP_EVENT_COLUMNS = ('event_id', 'match_id', 'event_type_id', 'timestamp')
+LINEUP_EVENT_TYPES = ('uuid', 'int4', 'int4', 'time')
 
-    team_sql_query = ''' 
-    INSERT INTO team (team_id, team_name) VALUES (%s, %s)
-    ON CONFLICT (team_id) DO NOTHING;
-    '''
-    country_sql_query = ''' 
-    INSERT INTO country (country_id, country_name) VALUES (%s, %s)
-    ON CONFLICT (country_id) DO NOTHING;
-    '''
-    player_sql_query = ''' 
-    INSERT INTO player (player_id, player_name, player_nickname, jersey_number, country_id) VALUES (%s, %s, %s, %s, %s)
-    ON CONFLICT (player_id) DO NOTHING;
-    '''
-    position_event_sql_query = ''' 
-    INSERT INTO position_event (event_id, position_id, start_reason, end_reason, from_time, to_time, from_period, to_period) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (event_id, position_id) DO NOTHING;
+# Columns of lineup_interval: one row per spell a player spent in one position.
+LINEUP_INTERVAL_COLUMNS = ('match_id', 'player_id', 'team_id', 'position_id', 'from_period', 'start_second', 'to_period', 'end_second', 'start_reason', 'end_reason')
+LINEUP_INTERVAL_TYPES = ('int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'varchar', 'varchar')
+
+def clock_seconds(value):
+    '''Seconds of match clock of a lineups "MM:SS" time (the second half starts at "45:00"), or None.'''
+    if not value:
+        return None
+    minutes, seconds = value.split(':')
+    return int(minutes) * 60 + int(seconds)
+
+def parse_lineups(file_path):
     '''
+    Parse a lineups file. Teams, countries, players and positions are registered with the dimension cache.
 
-    event_sql_query = '''
-    INSERT INTO events (event_id, match_id, event_type_id, timestamp)
-    VALUES (%s, %s, %s, '00:00:00')
-    RETURNING event_id;
+    return: tuple (match_id, list of (table, columns, types, rows) holding one lineup pseudo-event per team
+    and the lineup_interval rows of every player, number of players)
     '''
-    
+    data = iter_json_array(file_path)
+
     # Extract match_id from filename (assuming file_path like '.../1234.json')
     match_id = int(os.path.splitext(os.path.basename(file_path))[0])
 
-    global pseudo_event_type_id 
+    row_count = 0
+    event_rows = []
+    interval_rows = []
+    for entry in data:
+        team_id = entry['team_id']
+        team_name = entry['team_name']
+        lineup = entry['lineup']
+        row_count += len(lineup)
+        logger.debug(f"Team ID: {team_id}, Team Name: {team_name}")
+            
+        for player in lineup:
+            player_id = player['player_id']
+            player_name = player['player_name']
+            player_nickname = player['player_nickname'] if player['player_nickname'] else None
+            jersey_number = player['jersey_number']
+
+            country_id, country_name = None, None
+            if 'country' in player:
+                country_id = player['country']['id']
+                country_name = player['country']['name']
+                dimensions.add('country', (country_id, country_name))
+
+            dimensions.add('player', (player_id, player_name, player_nickname, jersey_number, country_id))
+
+            cards = player['cards']  # List of cards if any
+            positions = player['positions']
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Player ID: {player_id}, Player Name: {player_name}, Nickname: {player_nickname}, Jersey Number: {jersey_number}")
+                logger.debug(f"Country ID: {country_id}, Country Name: {country_name}")
+                logger.debug(f"Cards: {cards}")
+
+            # One interval per position held. A spell without "to" lasted until the final whistle, and is stored with a NULL end.
+            for position in positions:
+                position_id = position['position_id']
+                dimensions.add('position', (position_id, position['position']))
+                interval_rows.append((
+                    match_id, player_id, team_id, position_id,
+                    position['from_period'], clock_seconds(position['from']),
+                    position.get('to_period') or None, clock_seconds(position.get('to')),
+                    position.get('start_reason'), position.get('end_reason'),
+                ))
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Position ID: {position_id}, Position Name: {position['position']}")
+                    logger.debug(f"From: {position['from']}, To: {position.get('to')}, From Period: {position['from_period']}, To Period: {position.get('to_period')}")
+                    logger.debug(f"Start Reason: {position.get('start_reason')}, End Reason: {position.get('end_reason')}")
+
+        # A pseudo-event for the lineup. Its id is generated here, so nothing needs to be read back.
+        event_rows.append((uuid.uuid4(), match_id, pseudo_event_type_id, dt_time(0)))
+
+        # Insert team
+        dimensions.add('team', (team_id, team_name))
+
+    return match_id, [
+        ('events', LINEUP_EVENT_COLUMNS, LINEUP_EVENT_TYPES, event_rows),
+        ('lineup_interval', LINEUP_INTERVAL_COLUMNS, LINEUP_INTERVAL_TYPES, interval_rows),
+    ], row_count
+
+def load_lineups(file_path, conn, test, mode='insert'):
+    '''
+    Load lineup data from a JSON file into the database.
 
+    mode: str - "insert" sends the rows through one batch writer, "copy" writes each table with a single binary COPY
+    '''
+    match_id, tables, row_count = parse_lineups(file_path)
+
+    # Teams, countries, players and positions go through the dimension cache, written before the rows referencing them.
+    writer = BatchWriter(conn)
+    dimensions.flush(writer)
+    writer.flush()
     with conn.cursor() as cur:
-        for entry in data:
-            team_id = entry['team_id']
-            team_name = entry['team_name']
-            lineup = entry['lineup']
-            
-            for player in lineup:
-                player_id = player['player_id']
-                player_name = player['player_name']
-                player_nickname = player['player_nickname'] if player['player_nickname'] else None
-                jersey_number = player['jersey_number']
-
-                country_id, country_name = None, None
-                if hasattr(player, 'country'):
-                    country_id = player['country']['id']
-                    country_name = player['country']['name']
-                
-                cards = player['cards']  # List of cards if any
-                positions = player['positions']
-                
-                for position in positions:
-                    position_id = position['position_id']
-                    position_name = position['position']
-                    from_time = position['from']
-                    to_time = position['to'] if position['to'] else None
-                    from_period = position['from_period']
-                    to_period = position['to_period'] if position['to_period'] else None
-                    start_reason = position['start_reason']
-                    end_reason = position['end_reason']
-
-            # Print extracted data for debugging
-            print(f"Team ID: {team_id}, Team Name: {team_name}")
-            print(f"Player ID: {player_id}, Player Name: {player_name}, Nickname: {player_nickname}, Jersey Number: {jersey_number}")
-            print(f"Country ID: {country_id}, Country Name: {country_name}")
-            print(f"Position ID: {position_id}, Position Name: {position_name}")
-            print(f"From: {from_time}, To: {to_time}, From Period: {from_period}, To Period: {to_period}")
-            print(f"Start Reason: {start_reason}, End Reason: {end_reason}")
-            print(f"Cards: {cards}")
-            print('\n')
-
-            event_id = uuid.uuid4()
-            # Insert a pseudo-event for the lineup
-            cur.execute(event_sql_query, (event_id, match_id, pseudo_event_type_id))
-            pseudo_event_id = cur.fetchone()[0] # Fetch the created event_id
-
-            # Insert team
-            cur.execute(team_sql_query, (team_id, team_name))
-
-            # Insert country
-            if country_id is not None:
-                cur.execute(country_sql_query, (country_id, country_name))
-
-            # Insert player
-            cur.execute(player_sql_query, (player_id, player_name, player_nickname, jersey_number, country_id))
-            # Insert or update position information related to this event (player in lineup)
-            #cur.execute(position_event_sql_query, (pseudo_event_id, player_id, position_id, start_reason, end_reason, from_time, to_time, from_period, to_period))
+        for table, columns, types, rows in partition_rows(cur, match_id, tables):
+            if mode == 'copy':
+                copy_rows(cur, table, columns, types, rows)
+            else:
+                sql = insert_statement(table, columns)
+                for row in rows:
+                    writer.add(sql, row)
+    writer.flush()
 
     conn.commit()
-
+    logger.info(f"[{mode}] {os.path.basename(file_path)}: process peak RSS so far {peak_rss_mb():.0f} MB")
+    writer.log_stats(os.path.basename(file_path))
+    return row_count
 
 def load_matches(file_path, conn, test):
     '''Load match data from a JSON file into the database.'''
@@ -320,223 +440,435 @@ def load_matches(file_path, conn, test):
     match_sql = '''
     INSERT INTO match (match_id, match_date, home_team_id, away_team_id, home_score, away_score, competition_id, season_id, stadium_id, referee_id)
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (match_id) DO NOTHING;
-    '''
-    season_sql = '''
-    INSERT INTO season (season_id, season_name)
-    VALUES (%s, %s)
-    ON CONFLICT (season_id) DO NOTHING;
-    '''
-    country_sql = '''
-    INSERT INTO country (country_id, country_name)
-    VALUES (%s, %s)
-    ON CONFLICT (country_id) DO NOTHING;
-    '''
-    team_sql = '''
-    INSERT INTO team (team_id, team_name, team_gender, country_id)
-    VALUES (%s, %s, %s, %s)
-    ON CONFLICT (team_id) DO NOTHING;
-    '''
-    stadium_sql = '''
-    INSERT INTO stadium (stadium_id, name, country_id)
-    VALUES (%s, %s, %s)
-    ON CONFLICT (stadium_id) DO NOTHING;
-    '''
-    referee_sql = '''
-    INSERT INTO referee (referee_id, name, country_id)
-    VALUES (%s, %s, %s)
-    ON CONFLICT (referee_id) DO NOTHING;
+    ON CONFLICT (match_id) DO UPDATE
+    SET match_date = EXCLUDED.match_date, home_team_id = EXCLUDED.home_team_id, away_team_id = EXCLUDED.away_team_id,
+        home_score = EXCLUDED.home_score, away_score = EXCLUDED.away_score, competition_id = EXCLUDED.competition_id,
+        season_id = EXCLUDED.season_id, stadium_id = EXCLUDED.stadium_id, referee_id = EXCLUDED.referee_id;
     '''
     comp_stage_sql = '''
     INSERT INTO competition_stage (stage_id, name)
     VALUES (%s, %s)
     ON CONFLICT (stage_id) DO NOTHING;
     '''
-    comp_sql = ''' 
-    INSERT INTO competition (competition_id, competition_name, season_id, country_id)
-    VALUES (%s, %s, %s, %s)
-    ON CONFLICT (competition_id) DO NOTHING;
-    '''
 
-    with conn.cursor() as cur:
-        for entry in data:
-            match_id = entry['match_id']
-            match_date = entry['match_date']
-            kick_off = entry['kick_off']
-            home_score = entry['home_score']
-            away_score = entry['away_score']
-            match_status = entry['match_status']
-            match_status_360 = entry['match_status_360']
-            last_updated = entry['last_updated']
-            last_updated_360 = entry['last_updated_360']
-            match_week = entry['match_week']
-
-            # Extracting data for populating a minimal entry for competition
-            competition_id, competition_name, competition_country_name = None, None, None
-            if hasattr(entry, 'competition'):
-                competition_id = entry['competition']['competition_id']
-                competition_name = entry['competition']['competition_name']
-                competition_country_name = entry['competition']['country_name']
-
-            season_id = entry['season']['season_id']
-            season_name = entry['season']['season_name']
-
-            # This filters for a subset of the seasons and competitions of desired focus for this project.
-            if test:
-                #if competition_name == 'La Liga' and season_name in ['2020/2021', '2019/2020', '2018/2019']:
-                if season_name in ['2020/2021', '2019/2020', '2018/2019']:
-                    pass
-                #elif competition_name == 'Premier League' and season_name in ['2003/2004']:
-                elif season_name in ['2003/2004']:
-                    pass
-                else:
-                    continue
-
-            home_team_id = entry['home_team']['home_team_id']
-            home_team_name = entry['home_team']['home_team_name']
-            home_team_gender = entry['home_team']['home_team_gender']
-            home_country = entry['home_team']['country']
-
-            away_team_id = entry['away_team']['away_team_id']
-            away_team_name = entry['away_team']['away_team_name']
-            away_team_gender = entry['away_team']['away_team_gender']
-            away_country = entry['away_team']['country']
-
-            competition_stage_id = entry['competition_stage']['id']
-            competition_stage_name = entry['competition_stage']['name']
-
-            # Certain entries don't have stadium attributes
-            stadium_id, stadium_name, stadium_country = None, None, None
-            if hasattr(entry, 'stadium'):
-                stadium_id = entry['stadium']['id']
-                stadium_name = entry['stadium']['name']
-                stadium_country = entry['stadium']['country']
-
-            # Certain entries don't have referee attributes
-            referee_id, referee_name, referee_country = None, None, None
-            if hasattr(entry, 'referee'):
-                referee_id = entry['referee']['id']
-                referee_name = entry['referee']['name']
-                referee_country = entry['referee']['country']
-
-            # Handling managers, which is a list of dictionaries
-            #home_team_managers = entry['home_team']['managers']
-            #away_team_managers = entry['away_team']['managers']
-
-            # Print extracted data for debugging
-            print(f"Match ID: {match_id}, Match Date: {match_date}, Kick Off: {kick_off}")
-            print(f"Home Score: {home_score}, Away Score: {away_score}, Match Status: {match_status}")
-            print(f"Competition ID: {competition_id}, Season ID: {season_id}")
-            print(f"Home Team: {home_team_id} - {home_team_name}, Away Team: {away_team_id} - {away_team_name}")
-            print(f"Stadium: {stadium_id} - {stadium_name}, Referee: {referee_id} - {referee_name}")
-            #print(f"Home Team Managers: {home_team_managers}, Away Team Managers: {away_team_managers}")
-            print('\n')
-
-            #Inserting Season
-            cur.execute(season_sql, (season_id, season_name))
-
-            # Inserting countries
-            all_countries = [away_country, home_country]
-            if referee_id is not None:
-                all_countries.append(referee_country)
-            if stadium_id is not None:
-                all_countries.append(stadium_country)
-
-            for c in all_countries:
-                cur.execute(country_sql, (c['id'], c['name']))
-
-            # Check to see if the competition country matches any present country
-            competition_country_id = None
-            for c in all_countries:
-                if c['name'] == competition_country_name:
-                    competition_country_id = c['id']
-
-            if competition_id is None:
-                pass # Skip inserting as this match doesn't have a competition linked
-            elif competition_country_id is None:
-                print(f'Error: Cannot insert competition {competition_name} as its country {competition_country_name} is not the same as any of the current match object countries')
+    # Season, country, team, stadium, referee and competition rows go through the dimension cache, so each one
+    # is sent once per process rather than once per match. Match rows are held back until those are written.
+    match_rows = []
+
+    writer = BatchWriter(conn)
+    for entry in data:
+        match_id = entry['match_id']
+        match_date = entry['match_date']
+        kick_off = entry['kick_off']
+        home_score = entry['home_score']
+        away_score = entry['away_score']
+        match_status = entry['match_status']
+        match_status_360 = entry['match_status_360']
+        last_updated = entry['last_updated']
+        last_updated_360 = entry['last_updated_360']
+        match_week = entry['match_week']
+
+        # Extracting data for populating a minimal entry for competition
+        competition_id, competition_name, competition_country_name = None, None, None
+        if 'competition' in entry:
+            competition_id = entry['competition']['competition_id']
+            competition_name = entry['competition']['competition_name']
+            competition_country_name = entry['competition']['country_name']
+
+        season_id = entry['season']['season_id']
+        season_name = entry['season']['season_name']
+
+        # This filters for a subset of the seasons and competitions of desired focus for this project.
+        if test:
+            #if competition_name == 'La Liga' and season_name in ['2020/2021', '2019/2020', '2018/2019']:
+            if season_name in ['2020/2021', '2019/2020', '2018/2019']:
+                pass
+            #elif competition_name == 'Premier League' and season_name in ['2003/2004']:
+            elif season_name in ['2003/2004']:
+                pass
             else:
-                # We now can insert into the competition table
-                cur.execute(comp_sql, (competition_id, competition_name, season_id, competition_country_id))
+                continue
+
+        home_team_id = entry['home_team']['home_team_id']
+        home_team_name = entry['home_team']['home_team_name']
+        home_team_gender = entry['home_team']['home_team_gender']
+        home_country = entry['home_team']['country']
+
+        away_team_id = entry['away_team']['away_team_id']
+        away_team_name = entry['away_team']['away_team_name']
+        away_team_gender = entry['away_team']['away_team_gender']
+        away_country = entry['away_team']['country']
+
+        competition_stage_id = entry['competition_stage']['id']
+        competition_stage_name = entry['competition_stage']['name']
+
+        # Certain entries don't have stadium attributes
+        stadium_id, stadium_name, stadium_country = None, None, None
+        if 'stadium' in entry:
+            stadium_id = entry['stadium']['id']
+            stadium_name = entry['stadium']['name']
+            stadium_country = entry['stadium']['country']
+
+        # Certain entries don't have referee attributes
+        referee_id, referee_name, referee_country = None, None, None
+        if 'referee' in entry:
+            referee_id = entry['referee']['id']
+            referee_name = entry['referee']['name']
+            referee_country = entry['referee']['country']
+
+        # Handling managers, which is a list of dictionaries
+        #home_team_managers = entry['home_team']['managers']
+        #away_team_managers = entry['away_team']['managers']
+
+        # Log extracted data for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Match ID: {match_id}, Match Date: {match_date}, Kick Off: {kick_off}")
+            logger.debug(f"Home Score: {home_score}, Away Score: {away_score}, Match Status: {match_status}")
+            logger.debug(f"Competition ID: {competition_id}, Season ID: {season_id}")
+            logger.debug(f"Home Team: {home_team_id} - {home_team_name}, Away Team: {away_team_id} - {away_team_name}")
+            logger.debug(f"Stadium: {stadium_id} - {stadium_name}, Referee: {referee_id} - {referee_name}")
+            #logger.debug(f"Home Team Managers: {home_team_managers}, Away Team Managers: {away_team_managers}")
+
+        #Inserting Season
+        dimensions.add('season', (season_id, season_name))
+
+        # Inserting countries
+        all_countries = [away_country, home_country]
+        if referee_id is not None:
+            all_countries.append(referee_country)
+        if stadium_id is not None:
+            all_countries.append(stadium_country)
+
+        for c in all_countries:
+            dimensions.add('country', (c['id'], c['name']))
+
+        # Look up the competition country among every country seen so far
+        competition_country_id = dimensions.country_id(competition_country_name)
+
+        if competition_id is None:
+            pass # Skip inserting as this match doesn't have a competition linked
+        else:
+            # The match references the competition, so it's inserted even when its country is unknown (e.g. "Europe")
+            if competition_country_id is None:
+                logger.warning(f'Competition {competition_name} has country {competition_country_name}, which is not the country of any team, stadium or referee')
+            dimensions.add('competition', (competition_id, competition_name, None, None, None, season_id, competition_country_id))
+
+        # Inserting teams
+        dimensions.add('team', (home_team_id, home_team_name, home_team_gender, home_country['id']))
+        dimensions.add('team', (away_team_id, away_team_name, away_team_gender, away_country['id']))
+
+        # Inserting stadium
+        if stadium_id is not None:
+            dimensions.add('stadium', (stadium_id, stadium_name, stadium_country['id']))
+
+        # Inserting referee
+        if referee_id is not None:
+            dimensions.add('referee', (referee_id, referee_name, referee_country['id']))
+
+        # Inserting competition stage
+
+        # Leaving omitted for now; don't need it for our usecase.
+        #cur.execute(comp_stage_sql (competition_stage_id, competition_stage_name))
+
+        # Also omitting adding managers for now.
+
+
+        # Inserting match
+        match_rows.append((match_id, match_date, home_team_id, away_team_id, home_score, away_score, competition_id, season_id, stadium_id, referee_id))
+
+    # Write the new dimension rows of this file, then the matches that reference them.
+    dimensions.flush(writer)
+    for row in match_rows:
+        writer.add(match_sql, row)
+    writer.flush()
 
-            # Let's hope that the competition already existed in the DB if the above clause fails...
+    conn.commit()
+    writer.log_stats(os.path.basename(file_path))
+    return len(match_rows)
 
-            # Inserting teams
-            cur.execute(team_sql, (home_team_id, home_team_name, home_team_gender, home_country['id']))
-            cur.execute(team_sql, (away_team_id, away_team_name, away_team_gender, away_country['id']))
+def parse_three_sixty(file_path):
+    '''
+    Pack a three-sixty file with ThreeSixtyFrames.
 
-            # Inserting stadium
-            if stadium_id is not None:
-                cur.execute(stadium_sql,  (stadium_id, stadium_name, stadium_country['id']))
+    return: tuple (match_id, list of (table, columns, types, rows) in write order)
+    '''
+    frames = ThreeSixtyFrames.from_json(file_path)
 
-            # Inserting referee
-            if referee_id is not None:
-                cur.execute(referee_sql,  (referee_id, referee_name, referee_country['id']))
+    if logger.isEnabledFor(logging.DEBUG):
+        for event_id, size in zip(event_uuids(frames.event_ids), frames.frame_offsets[1:] - frames.frame_offsets[:-1]):
+            logger.debug(f"Event UUID: {event_id}, Freeze Frame Players: {size}")
 
-            # Inserting competition stage
+    # Freeze frames reference three_sixty, so those rows have to be in first.
+    return frames.match_id, [
+        ('three_sixty', THREE_SIXTY_COLUMNS, THREE_SIXTY_TYPES, frames.three_sixty_rows()),
+        ('freeze_frames', FREEZE_FRAME_COLUMNS, FREEZE_FRAME_TYPES, frames.freeze_frame_rows()),
+    ]
 
-            # Leaving omitted for now; don't need it for our usecase.
-            #cur.execute(comp_stage_sql (competition_stage_id, competition_stage_name))
+def load_three_sixty(file_path, conn, mode='insert'):
+    '''
+    Load three-sixty data from a JSON file into the database.
 
-            # Also omitting adding managers for now.
+    The freeze frames are packed with ThreeSixtyFrames and written like the events: one binary COPY per
+    table, or one INSERT per row.
+    '''
+    start = time.perf_counter()
+    match_id, tables = parse_three_sixty(file_path)
 
+    row_count = 0
+    with conn.cursor() as cur:
+        for table, columns, types, rows in tables:
+            if mode == 'copy':
+                row_count += copy_rows(cur, table, columns, types, rows)
+            else:
+                row_count += insert_rows(cur, table, columns, rows)
 
-            # Inserting match
-            cur.execute(match_sql, (match_id, match_date, home_team_id, away_team_id, home_score, away_score, competition_id, season_id, stadium_id, referee_id))
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    logger.info(f"[{mode}] {os.path.basename(file_path)}: {row_count} rows in {elapsed:.2f}s, process peak RSS so far {peak_rss_mb():.0f} MB")
+    return row_count
 
-        conn.commit()
+def collect_lineup_dimensions(file_path):
+    '''
+    Parse a lineups file and collect the dimension rows it references.
 
-def load_three_sixty(file_path, conn):
-    '''Load three-sixty data from a JSON file into the database.'''
-    data = load_json(file_path) 
+    return: tuple of dicts (countries, teams, players), each mapping id to a row tuple
+    '''
+    data = iter_json_array(file_path)
+    countries, teams, players = {}, {}, {}
+    for entry in data:
+        teams[entry['team_id']] = (entry['team_id'], entry['team_name'])
+        for player in entry['lineup']:
+            country_id = None
+            if player.get('country') is not None:
+                country_id = player['country']['id']
+                countries[country_id] = (country_id, player['country']['name'])
+            players[player['player_id']] = (player['player_id'], player['player_name'], player['player_nickname'] or None, player['jersey_number'], country_id)
+    return countries, teams, players
+
+def load_dimensions(countries, teams, players, conn):
+    '''
+    Insert the country, team and player rows needed by the fact loaders in a single transaction.
 
-    three_sixty_sql = '''
-    INSERT INTO three_sixty (event_uuid, visible_area)
-    VALUES (%s, %s)
+    The dimension cache writes rows in primary key order, so this never contends with the ON CONFLICT DO NOTHING
+    upserts the workers run later, and every foreign key the workers need already exists.
     '''
-    freeze_frame_sql = '''
-    INSERT INTO freeze_frames (event_uuid, teammate, actor, keeper, location)
-    VALUES (%s, %s, %s, %s, POINT(%s, %s))
+    for row in countries.values():
+        dimensions.add('country', row)
+    for row in teams.values():
+        dimensions.add('team', row)
+    for row in players.values():
+        dimensions.add('player', row)
+
+    writer = BatchWriter(conn)
+    dimensions.flush(writer)
+    writer.flush()
+    conn.commit()
+    writer.log_stats('dimensions')
+    logger.info(f'Loaded dimensions: {len(countries)} countries, {len(teams)} teams, {len(players)} players')
+
+# Tables holding per-event attributes, which have to be cleared before the events they reference.
+EVENT_CHILD_TABLES = list(SUBTYPE_TABLES)
+
+def delete_file_statements(dataset_type, file_path):
     '''
-    with conn.cursor() as cur:
-        for entry in data:
-            event_uuid = entry['event_uuid']
-            visible_area = entry['visible_area']  # This is a list representing a polygon
-            freeze_frame = entry['freeze_frame']  # This is a list of dictionaries
+    Statements deleting the rows written by a previous load of a match file, so that it can be re-inserted in the same transaction.
+
+    Events and lineups both write into the events table; they are told apart by the lineup pseudo-event type.
+    Matches and competitions are upserts and need nothing deleted.
+    return: list of (sql, params)
+    '''
+    if dataset_type in ('matches', 'competitions'):
+        return []
 
-            # Print the basic data
-            print(f"Event UUID: {event_uuid}")
-            print(f"Visible Area Coordinates: {visible_area}")
+    # Extract match_id from filename (assuming file_path like '.../1234.json')
+    match_id = int(os.path.splitext(os.path.basename(file_path))[0])
+    statements = []
+
+    if dataset_type == 'events':
+        # The old events have to be taken out of the season rollups while they are still there.
+        if refresh_rollups:
+            statements += match_statements(match_id, -1)
+        for table in EVENT_CHILD_TABLES:
+            statements.append((f'''
+            DELETE FROM {table} USING events
+            WHERE {table}.event_id = events.event_id AND events.match_id = %s AND events.event_type_id IS DISTINCT FROM %s;
+            ''', (match_id, pseudo_event_type_id)))
+        statements.append(('DELETE FROM events WHERE match_id = %s AND event_type_id IS DISTINCT FROM %s;', (match_id, pseudo_event_type_id)))
+        statements.append(('DELETE FROM possession WHERE match_id = %s;', (match_id,)))
+
+    elif dataset_type == 'lineups':
+        statements.append(('''
+        DELETE FROM position_event USING events
+        WHERE position_event.event_id = events.event_id AND events.match_id = %s AND events.event_type_id = %s;
+        ''', (match_id, pseudo_event_type_id)))
+        statements.append(('DELETE FROM events WHERE match_id = %s AND event_type_id = %s;', (match_id, pseudo_event_type_id)))
+        statements.append(('DELETE FROM lineup_interval WHERE match_id = %s;', (match_id,)))
+
+    elif dataset_type == 'three-sixty':
+        statements.append(('''
+        DELETE FROM freeze_frames USING three_sixty
+        WHERE freeze_frames.event_uuid = three_sixty.event_uuid AND three_sixty.match_id = %s;
+        ''', (match_id,)))
+        statements.append(('DELETE FROM three_sixty WHERE match_id = %s;', (match_id,)))
+
+    return statements
+
+def delete_file_rows(cur, dataset_type, file_path):
+    '''Delete the rows written by a previous load of a match file, see delete_file_statements.'''
+    for sql, params in delete_file_statements(dataset_type, file_path):
+        cur.execute(sql, params)
+
+def load_dataset_file(dataset_type, file_path, conn, test, mode):
+    '''
+    Pass a file to the loader for its dataset type.
 
-            # Skip polygons which do not contain pairs of coordinates
-            if len(visible_area) % 2 != 0:
-                break
-            # Convert list to a PostgreSQL polygon format
-            polygon_format = ','.join(f'{visible_area[i]} {visible_area[i+1]}' for i in range(0, len(visible_area), 2))
-            polygon_value = f'POLYGON(({polygon_format}))'
-            cur.execute(three_sixty_sql, (event_uuid, polygon_value))
+    return: the number of rows the loader wrote
+    '''
+    if dataset_type == 'competitions':
+        return load_competitions(file_path, conn, test)
+    elif dataset_type == 'matches':
+        return load_matches(file_path, conn, test)
+    elif dataset_type == 'events':
+        return load_events(file_path, conn, test, mode)
+    elif dataset_type == 'lineups':
+        return load_lineups(file_path, conn, test, mode)
+    elif dataset_type == 'three-sixty':
+        return load_three_sixty(file_path, conn, mode)
+    else:
+        raise ValueError(f'Unknown dataset type {dataset_type}')
 
-            # Process each freeze frame entry
-            for ff in freeze_frame:
-                teammate = ff['teammate']
-                actor = ff['actor']
-                keeper = ff['keeper']
-                location = ff['location']
+# Dataset types whose loader skips part of each file when the --test filter is on.
+PARTIALLY_LOADED_DATASETS = ('matches',)
 
-                # Print or process these details
-                print(f"Teammate: {teammate}, Actor: {actor}, Keeper: {keeper}, Location: {location}")
+def load_file_incremental(dataset_type, file_path, conn, test, mode, full=False):
+    '''
+    Load a file unless load_manifest shows it is unchanged since its last load.
 
-                cur.execute(freeze_frame_sql, (event_uuid, teammate, actor, keeper, location))
+    A changed file has its old rows deleted, its manifest entry updated and its new rows inserted
+    in one transaction (the loaders commit once at the end), so an interrupted run can simply be restarted.
 
-            print('\n')
+    A file the loader only takes part of (a matches file filtered by --test) is not recorded in the manifest,
+    so a later unfiltered run still loads all of it. The --competition / --season filters select whole files
+    and need no such care.
 
-    conn.commit()
+    full: bool - Reload the file even if it is unchanged
+    return: the number of rows written, or None if the file was skipped
+    '''
+    with conn.cursor() as cur:
+        fingerprint, recorded = check_file(cur, file_path)
+        if fingerprint is None and not full:
+            conn.commit()  # check_file may have refreshed the mtime of an unchanged file
+            return None
+        if fingerprint is None:
+            fingerprint = file_fingerprint(file_path)
+
+        # A file without a manifest entry has no rows to delete. Skipping the deletes matters for bulk loads,
+        # where they would scan the unindexed events table once per file.
+        if recorded:
+            delete_file_rows(cur, dataset_type, file_path)
+        if not (test and dataset_type in PARTIALLY_LOADED_DATASETS):
+            record_file(cur, dataset_type, file_path, fingerprint)
+
+    return load_dataset_file(dataset_type, file_path, conn, test, mode)
+
+def load_serial(dataset_types, conn, test, mode, full):
+    '''Load every file of the given dataset types on a single connection.'''
+    for dataset_type in dataset_types:
+        paths = get_file_paths(dataset_type)
+        progress = ProgressReporter(dataset_type, paths)
+        for p in paths:
+            progress.update(p, load_file_incremental(dataset_type, p, conn, test, mode, full))
+        progress.finish()
+
+# Each worker process keeps its own connection for the lifetime of the pool.
+worker_conn = None
+
+def init_worker(event_type_id, log_level, batch_size, rollups):
+    '''Process pool initializer: open this worker's connection and set the lineup pseudo-event type.'''
+    global worker_conn, pseudo_event_type_id, refresh_rollups
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    BatchWriter.batch_size = batch_size
+    pseudo_event_type_id = event_type_id
+    refresh_rollups = rollups
+    worker_conn = connect_db()
+    if worker_conn is None:
+        raise RuntimeError('Worker could not connect to the database')
+    dimensions.preload(worker_conn)
+    partitions.preload(worker_conn)
+
+def load_file(dataset_type, file_path, test, mode, full):
+    '''
+    Load a single file on this worker's connection. Every loader commits once per file.
+
+    return: tuple (dataset_type, file_path, rows written or None if skipped, error message or None)
+    '''
+    try:
+        rows = load_file_incremental(dataset_type, file_path, worker_conn, test, mode, full)
+    except (Exception, psycopg.DatabaseError) as error:
+        worker_conn.rollback()
+        # Rows the cache was told about may have been rolled back with the file.
+        dimensions.preload(worker_conn)
+        partitions.preload(worker_conn)
+        return dataset_type, file_path, None, str(error)
+    return dataset_type, file_path, rows, None
+
+def load_parallel(dataset_types, conn, workers, test, mode, full, event_type_id):
+    '''
+    Load the files of the given dataset types over a pool of worker processes.
+
+    dataset_types: list of str - Any of "events", "lineups", "three-sixty"
+    conn: connection used for the dimension tables, which are written before any worker starts loading
+    workers: int - Number of worker processes
+    '''
+    # Season partitions are created up front, so workers only ever insert into existing partitions.
+    if partitions.enabled:
+        partitions.create_all(conn)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(event_type_id, logging.getLogger().level, BatchWriter.batch_size, refresh_rollups)) as pool:
+        # Parse the lineups in parallel, but write their dimension rows from this process only.
+        # Events need them too, since they reference the players listed in the lineups.
+        if 'lineups' in dataset_types or 'events' in dataset_types:
+            countries, teams, players = {}, {}, {}
+            for file_countries, file_teams, file_players in pool.map(collect_lineup_dimensions, get_file_paths('lineups'), chunksize=16):
+                countries.update(file_countries)
+                teams.update(file_teams)
+                players.update(file_players)
+            load_dimensions(countries, teams, players, conn)
+
+        futures = []
+        progress = {}
+        for dataset_type in dataset_types:
+            paths = get_file_paths(dataset_type)
+            progress[dataset_type] = ProgressReporter(dataset_type, paths)
+            futures += [pool.submit(load_file, dataset_type, p, test, mode, full) for p in paths]
+
+        for future in as_completed(futures):
+            dataset_type, file_path, rows, error = future.result()
+            if error is not None:
+                logger.error(f'Failed to load {file_path}: {error}')
+            progress[dataset_type].update(file_path, rows, failed=error is not None)
+
+    for reporter in progress.values():
+        reporter.finish()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--dataset', default = 'all', choices=['competitions','events','lineups','matches','three-sixty', 'all'])
     parser.add_argument('--test', default = True, type = bool)
+    parser.add_argument('--mode', default = 'copy', choices=['copy', 'insert'], help = 'How events, lineups and three-sixty rows are written: binary COPY per table, or INSERTs')
+    parser.add_argument('--workers', default = 1, type = int, help = 'Number of processes used to load events, lineups and three-sixty files')
+    parser.add_argument('--async', dest = 'use_async', action = 'store_true', help = 'Load events, lineups and three-sixty files with asyncio: parsing overlaps with --writers concurrent write transactions')
+    parser.add_argument('--writers', default = 4, type = int, help = 'Concurrent write transactions (pooled connections) with --async')
+    parser.add_argument('--queue-size', default = 8, type = int, help = 'Parsed files waiting for a writer with --async')
+    parser.add_argument('--competition', action = 'append', type = int, help = 'Only load the matches of these competition ids, e.g. --competition 11 --competition 2')
+    parser.add_argument('--season', action = 'append', type = int, help = 'Only load the matches of these season ids; files of other seasons are never read')
+    parser.add_argument('--full', action = 'store_true', help = 'Reload every file, even those load_manifest shows as unchanged')
+    parser.add_argument('--batch-size', default = BATCH_SIZE, type = int, help = 'Rows buffered per pipeline by the matches, lineups and competitions loaders')
+    parser.add_argument('--bulk', action = 'store_true', help = 'Drop foreign keys and secondary indexes for the load, then validate and rebuild them in parallel')
+    parser.add_argument('--log-level', default = 'warning', choices=['debug', 'info', 'warning', 'error'], help = 'debug logs every parsed row, info logs per-file timings')
     args = parser.parse_args()
+    logging.basicConfig(level = args.log_level.upper(), format = LOG_FORMAT)
+    BatchWriter.batch_size = args.batch_size
     choice = args.dataset
     conn = connect_db()
 
@@ -559,44 +891,60 @@ if __name__ == '__main__':
         cur.execute(get_pseudo_event_id_sql)
         pseudo_event_type_id = cur.fetchone()[0]  # fetchone() returns a tuple, and we need the first element
 
-    if choice == 'competitions':
-        paths = get_file_paths(choice)
-        load_competitions(paths[0], conn)
-
-    elif choice == 'events':
-        paths = get_file_paths(choice)
-        load_events(paths[0], conn)
+    dimensions.preload(conn)
+    partitions.preload(conn)
 
-    elif choice == 'lineups':
-        paths = get_file_paths(choice)
-        load_lineups(paths[0], conn)
+    # The files to load are listed from the catalog, which only re-reads the matches files that changed.
+    catalog.open()
+    catalog.refresh()
+    catalog.select(args.competition, args.season)
 
-    elif choice == 'matches':
-        paths = get_file_paths(choice)
-        load_matches(paths[0], conn)
-
-    elif choice == 'three-sixty':
-        paths = get_file_paths(choice)
-        load_three_sixty(paths[0], conn)
+    if args.bulk:
+        refresh_rollups = False
+        prepare_bulk_load(conn)
+    else:
+        create_indexes(conn)
+    load_start = time.perf_counter()
+
+    if args.use_async and choice in ['events', 'lineups', 'three-sixty', 'all']:
+        datasets = [choice]
+        if choice == 'all':
+            # Matches write the country, team, season and match rows every other dataset refers to.
+            load_serial(['matches'], conn, False, args.mode, args.full)
+            datasets = ['lineups', 'events', 'three-sixty']
+        asyncio.run(async_load.load_async(datasets, conn, args.writers, args.queue_size, args.mode, args.full, pseudo_event_type_id, refresh_rollups))
+
+    elif args.workers > 1 and choice in ['events', 'lineups', 'three-sixty', 'all']:
+        if choice == 'all':
+            # Matches write the country, team, season and match rows every other dataset refers to.
+            load_serial(['matches'], conn, False, args.mode, args.full)
+            load_parallel(['lineups', 'events', 'three-sixty'], conn, args.workers, args.test, args.mode, args.full, pseudo_event_type_id)
+        else:
+            load_parallel([choice], conn, args.workers, args.test, args.mode, args.full, pseudo_event_type_id)
+
+    elif choice != 'all':
+        load_serial([choice], conn, args.test, args.mode, args.full)
 
     else:
-        '''
         # First, populate from the matches dataset
-        match_paths = get_file_paths('matches')
-        for p in match_paths:
-            load_matches(p, conn, False)
+        load_serial(['matches'], conn, False, args.mode, args.full)
         # Next, populate from the compettions dataset
-        competition_paths = get_file_paths('competitions')
-        for p in competition_paths:
-            load_competitions(p, conn, args.test)
-        # Then, populate from the lineups dataset.
-        lineup_paths = get_file_paths('lineups')
-        for p in lineup_paths:
-            load_lineups(p, conn, args.test)
-                
-        '''
+        load_serial(['competitions'], conn, args.test, args.mode, args.full)
+        # Then, populate from the lineups dataset, which holds the players the events refer to.
+        load_serial(['lineups'], conn, args.test, args.mode, args.full)
         # Finally, populate the events dataset (we skip the three-sixty for our usecase)
-        events_paths = get_file_paths('events')
-        for p in events_paths:
-           load_events(p, conn, args.test)
-         
+        load_serial(['events'], conn, args.test, args.mode, args.full)
+
+    if args.bulk:
+        load_time = time.perf_counter() - load_start
+        timings, failed = finish_bulk_load(conn, max(args.workers, 2))
+        start = time.perf_counter()
+        rebuild_rollups(conn)
+        timings['rollups'] = time.perf_counter() - start
+        sys.stderr.write(
+            f"Bulk load: {load_time:.2f}s loading, {timings['constraints']:.2f}s validating constraints, "
+            f"{timings['indexes']:.2f}s building indexes, {timings['rollups']:.2f}s rebuilding season rollups\n"
+        )
+        if failed:
+            sys.stderr.write(f"Bulk load: {len(failed)} constraints or indexes failed, see the log; failed foreign keys are kept in deferred_constraint and retried by the next --bulk run\n")
+            sys.exit(1)
@@ -0,0 +1,65 @@
+#! /usr/bin/python3
+
+import hashlib
+import os
+from config import DATASET_PATH
+
+# Files are hashed in chunks so large event files are never held in memory just to fingerprint them.
+HASH_CHUNK_SIZE = 1 << 20
+
+def relative_path(file_path):
+    '''Path of a dataset file relative to DATASET_PATH, so the manifest survives moving the data directory.'''
+    return os.path.relpath(os.path.abspath(file_path), DATASET_PATH)
+
+def content_hash(file_path):
+    '''SHA-256 hex digest of a file's contents.'''
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_fingerprint(file_path):
+    '''The (size, mtime, hash) fingerprint recorded in load_manifest for a file.'''
+    stat = os.stat(file_path)
+    return (stat.st_size, stat.st_mtime, content_hash(file_path))
+
+def check_file(cur, file_path):
+    '''
+    Compare a file against its load_manifest entry.
+
+    The content hash is only computed when the size or mtime differ from the manifest, so unchanged files
+    cost a single stat() call. If only the mtime changed (e.g. the repo was re-cloned) the manifest entry
+    is refreshed and the file is still treated as unchanged.
+
+    return: tuple (None if the file is unchanged, otherwise a (size, mtime, hash) fingerprint to pass to
+    record_file; whether the file has a manifest entry, i.e. rows of an earlier load may exist)
+    '''
+    stat = os.stat(file_path)
+    path = relative_path(file_path)
+
+    cur.execute('SELECT file_size, file_mtime, content_hash FROM load_manifest WHERE file_path = %s;', (path,))
+    entry = cur.fetchone()
+    if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+        return None, True
+
+    file_hash = content_hash(file_path)
+    if entry is not None and entry[2] == file_hash:
+        cur.execute('UPDATE load_manifest SET file_size = %s, file_mtime = %s WHERE file_path = %s;', (stat.st_size, stat.st_mtime, path))
+        return None, True
+
+    return (stat.st_size, stat.st_mtime, file_hash), entry is not None
+
+def record_file_statement(dataset_type, file_path, fingerprint):
+    '''Statement inserting or updating the load_manifest entry of a file. return: tuple (sql, params)'''
+    size, mtime, file_hash = fingerprint
+    return '''
+    INSERT INTO load_manifest (file_path, dataset_type, file_size, file_mtime, content_hash, loaded_at)
+    VALUES (%s, %s, %s, %s, %s, now())
+    ON CONFLICT (file_path) DO UPDATE
+    SET file_size = EXCLUDED.file_size, file_mtime = EXCLUDED.file_mtime, content_hash = EXCLUDED.content_hash, loaded_at = EXCLUDED.loaded_at;
+    ''', (relative_path(file_path), dataset_type, size, mtime, file_hash)
+
+def record_file(cur, dataset_type, file_path, fingerprint):
+    '''Insert or update the load_manifest entry of a file. Runs in the caller's transaction.'''
+    cur.execute(*record_file_statement(dataset_type, file_path, fingerprint))
@@ -0,0 +1,248 @@
+#! /usr/bin/python3
+
+import argparse
+from datetime import date
+import logging
+import os
+import time
+from adapters import Point
+from dimension_cache import DIMENSION_TABLES, dimensions
+from event_types import SUBTYPE_TABLES, EventFanOut
+from load_data import EVENT_COLUMNS, EVENT_TYPES, LOG_FORMAT, build_event_row, get_file_paths, load_json
+from stream_json import iter_json_array
+
+# pyarrow is only needed for the Parquet export, not for loading the database.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Lookup tables whose rows the event parser collects (event types, outcomes, pass types, ...), written alongside the events.
+LOOKUP_TABLES = ('event_type', 'play_pattern', 'position', 'outcome', 'body_part', 'height', 'pass_type', 'technique', 'shot_type', 'tackle_type', 'goalkeeper_action_type')
+
+MATCH_FIELDS = (
+    ('match_id', 'int32'), ('match_date', 'date32'), ('kick_off', 'string'), ('match_week', 'int32'),
+    ('competition_name', 'string'), ('season_name', 'string'), ('competition_stage', 'string'),
+    ('home_team_id', 'int32'), ('home_team_name', 'string'), ('away_team_id', 'int32'), ('away_team_name', 'string'),
+    ('home_score', 'int32'), ('away_score', 'int32'), ('stadium_id', 'int32'), ('stadium_name', 'string'),
+    ('referee_id', 'int32'), ('referee_name', 'string'),
+)
+
+LINEUP_FIELDS = (
+    ('team_id', 'int32'), ('team_name', 'string'), ('player_id', 'int32'), ('player_name', 'string'),
+    ('player_nickname', 'string'), ('jersey_number', 'int32'), ('country_id', 'int32'), ('country_name', 'string'),
+)
+
+def arrow_type(pg_type):
+    '''Arrow type for one of the Postgres type names used for binary COPY. Points are split into two columns instead.'''
+    return {
+        'uuid': pa.string(),
+        'int4': pa.int32(),
+        'float8': pa.float64(),
+        'bool': pa.bool_(),
+        'varchar': pa.string(),
+        'time': pa.time64('us'),
+    }[pg_type]
+
+def arrow_schema(fields):
+    '''Arrow schema from (name, pyarrow type factory name) pairs.'''
+    return pa.schema([(name, getattr(pa, kind)()) for name, kind in fields])
+
+def event_fields():
+    '''
+    Columns of the exported event files: the events columns, then the columns of every per-type table prefixed
+    with the table name (pass_recipient_id, shot_statsbomb_xg, ...). POINT columns become <name>_x and <name>_y.
+
+    return: list of (column name, source table, source column index, pg type, point axis or None)
+    '''
+    fields = []
+    tables = [('events', EVENT_COLUMNS, EVENT_TYPES, '')]
+    tables += [(table, columns, types, f'{table}_') for table, (columns, types) in SUBTYPE_TABLES.items()]
+
+    for table, columns, types, prefix in tables:
+        for index, (column, pg_type) in enumerate(zip(columns, types)):
+            # event_id is only kept once, from the events table.
+            if table != 'events' and column == 'event_id':
+                continue
+            if pg_type == 'point':
+                fields.append((f'{prefix}{column}_x', table, index, 'float8', 0))
+                fields.append((f'{prefix}{column}_y', table, index, 'float8', 1))
+            else:
+                fields.append((f'{prefix}{column}', table, index, pg_type, None))
+    return fields
+
+EVENT_FIELDS = event_fields() if pa is not None else []
+
+def match_partition(output_dir, kind, competition_id, season_id):
+    '''Hive-style directory of one competition season, so pyarrow and DuckDB can prune on it.'''
+    path = os.path.join(output_dir, kind, f'competition_id={competition_id}', f'season_id={season_id}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def is_current(source_path, output_path):
+    '''Whether an exported file is newer than the JSON file it was written from.'''
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+
+def events_table(file_path, match_id):
+    '''
+    Parse an events file with the loader's row builders and lay the rows out as one wide Arrow table,
+    one row per event with its per-type columns filled in.
+    '''
+    event_rows = []
+    fan_out = EventFanOut()
+    for entry in iter_json_array(file_path):
+        row = build_event_row(entry, match_id)
+        event_rows.append(row)
+        fan_out.add(entry, row[0])
+
+    positions = {row[0]: i for i, row in enumerate(event_rows)}
+    rows_by_table = {'events': event_rows}
+    rows_by_table.update((table, rows) for table, _, _, rows in fan_out.tables())
+
+    columns = {}
+    for name, table, index, pg_type, axis in EVENT_FIELDS:
+        if table == 'events':
+            values = [row[index] for row in event_rows]
+        else:
+            # Per-type columns are empty for events of other types.
+            values = [None] * len(event_rows)
+            for row in rows_by_table.get(table, ()):
+                values[positions[row[0]]] = row[index]
+
+        if axis is not None:
+            values = [value[axis] if isinstance(value, Point) else None for value in values]
+        elif pg_type == 'uuid':
+            values = [str(value) if value is not None else None for value in values]
+        columns[name] = pa.array(values, type=arrow_type(pg_type))
+
+    return pa.table(columns)
+
+def matches_table(entries):
+    '''Match metadata of one matches file, with the team, stadium and referee names inlined.'''
+    rows = []
+    for entry in entries:
+        stadium = entry.get('stadium') or {}
+        referee = entry.get('referee') or {}
+        rows.append({
+            'match_id': entry['match_id'],
+            'match_date': date.fromisoformat(entry['match_date']),
+            'kick_off': entry.get('kick_off'),
+            'match_week': entry.get('match_week'),
+            'competition_name': entry['competition']['competition_name'],
+            'season_name': entry['season']['season_name'],
+            'competition_stage': (entry.get('competition_stage') or {}).get('name'),
+            'home_team_id': entry['home_team']['home_team_id'],
+            'home_team_name': entry['home_team']['home_team_name'],
+            'away_team_id': entry['away_team']['away_team_id'],
+            'away_team_name': entry['away_team']['away_team_name'],
+            'home_score': entry.get('home_score'),
+            'away_score': entry.get('away_score'),
+            'stadium_id': stadium.get('id'),
+            'stadium_name': stadium.get('name'),
+            'referee_id': referee.get('id'),
+            'referee_name': referee.get('name'),
+        })
+
+    return pa.Table.from_pylist(rows, schema=arrow_schema(MATCH_FIELDS))
+
+def lineups_table(file_path):
+    '''One row per player listed in a lineups file.'''
+    rows = []
+    for entry in iter_json_array(file_path):
+        for player in entry['lineup']:
+            country = player.get('country') or {}
+            rows.append({
+                'team_id': entry['team_id'],
+                'team_name': entry['team_name'],
+                'player_id': player['player_id'],
+                'player_name': player['player_name'],
+                'player_nickname': player.get('player_nickname'),
+                'jersey_number': player.get('jersey_number'),
+                'country_id': country.get('id'),
+                'country_name': country.get('name'),
+            })
+    return pa.Table.from_pylist(rows, schema=arrow_schema(LINEUP_FIELDS))
+
+def write_lookups(output_dir):
+    '''
+    Write the lookup rows collected while parsing events, merged with those of earlier exports, as
+    lookups/<table>.parquet with the same columns as the database tables.
+    '''
+    path = os.path.join(output_dir, 'lookups')
+    os.makedirs(path, exist_ok=True)
+
+    for table in LOOKUP_TABLES:
+        key, name = DIMENSION_TABLES[table]
+        file_path = os.path.join(path, f'{table}.parquet')
+        if os.path.exists(file_path):
+            for row in pq.read_table(file_path).to_pylist():
+                dimensions.add(table, (row[key], row[name]))
+
+        rows = sorted(dimensions.pending[table].values())
+        pq.write_table(pa.table({key: pa.array([r[0] for r in rows], pa.int32()), name: pa.array([r[1] for r in rows], pa.string())}), file_path)
+
+def export(output_dir, full=False, compression='zstd'):
+    '''
+    Export the dataset to Parquet under output_dir:
+
+        matches/competition_id=<id>/season_id=<id>/matches.parquet
+        events/competition_id=<id>/season_id=<id>/<match_id>.parquet
+        lineups/competition_id=<id>/season_id=<id>/<match_id>.parquet
+        lookups/<table>.parquet
+
+    Files whose Parquet output is newer than the JSON are skipped, unless full is set.
+    return: the number of files written
+    '''
+    if pa is None:
+        raise ImportError('The Parquet export needs pyarrow (pip install pyarrow)')
+
+    start = time.perf_counter()
+    written = 0
+
+    # The matches files say which competition season every match belongs to.
+    match_seasons = {}
+    for file_path in get_file_paths('matches'):
+        entries = load_json(file_path)
+        if not entries:
+            continue
+        competition_id = int(os.path.basename(os.path.dirname(file_path)))
+        season_id = int(os.path.splitext(os.path.basename(file_path))[0])
+        match_seasons.update((entry['match_id'], (competition_id, season_id)) for entry in entries)
+
+        output_path = os.path.join(match_partition(output_dir, 'matches', competition_id, season_id), 'matches.parquet')
+        if full or not is_current(file_path, output_path):
+            pq.write_table(matches_table(entries), output_path, compression=compression)
+            written += 1
+
+    for dataset_type in ('events', 'lineups'):
+        for file_path in get_file_paths(dataset_type):
+            match_id = int(os.path.splitext(os.path.basename(file_path))[0])
+            if match_id not in match_seasons:
+                logger.warning(f'Skipping {file_path}: match {match_id} is not in any matches file')
+                continue
+
+            output_path = os.path.join(match_partition(output_dir, dataset_type, *match_seasons[match_id]), f'{match_id}.parquet')
+            if not full and is_current(file_path, output_path):
+                continue
+
+            table = events_table(file_path, match_id) if dataset_type == 'events' else lineups_table(file_path)
+            pq.write_table(table, output_path, compression=compression)
+            written += 1
+            logger.info(f'{dataset_type} {match_id}: {table.num_rows} rows written to {output_path}')
+
+    write_lookups(output_dir)
+    logger.info(f'Exported {written} files in {time.perf_counter() - start:.1f}s')
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_dir', help = 'Directory the Parquet files are written to')
+    parser.add_argument('--full', action = 'store_true', help = 'Rewrite every file, even those newer than their JSON')
+    parser.add_argument('--compression', default = 'zstd', choices = ['zstd', 'snappy', 'gzip', 'none'])
+    parser.add_argument('--log-level', default = 'info', choices = ['debug', 'info', 'warning', 'error'])
+    args = parser.parse_args()
+    logging.basicConfig(level = args.log_level.upper(), format = LOG_FORMAT)
+    export(args.output_dir, args.full, args.compression)
@@ -0,0 +1,145 @@
+#! /usr/bin/python3
+
+import argparse
+import os
+import time
+from event_types import SHOT
+
+# DuckDB is only needed to query the Parquet export.
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# The same questions as Q_1..Q_10 in queries.py, against the views created by ParquetStore.
+# Competition and season names come from the matches files, player and team names from the lineups.
+SEASON_FILTER = 'm.competition_name = $competition AND list_contains($seasons, m.season_name)'
+
+PLAYERS = '(SELECT DISTINCT ON (player_id) player_id, player_name FROM lineups)'
+TEAMS = '(SELECT DISTINCT ON (team_id) team_id, team_name FROM lineups)'
+
+QUERIES = {
+    'Q_1': ('La Liga', ['2020/2021'], f'''
+        SELECT p.player_name, AVG(e.shot_statsbomb_xg) AS avg_xg
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        WHERE {SEASON_FILTER} AND e.shot_statsbomb_xg > 0
+        GROUP BY p.player_name ORDER BY avg_xg DESC'''),
+    'Q_2': ('La Liga', ['2020/2021'], f'''
+        SELECT p.player_name, COUNT(*) AS shot_count
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        WHERE {SEASON_FILTER} AND e.event_type_id = $shot
+        GROUP BY p.player_name ORDER BY shot_count DESC'''),
+    'Q_3': ('La Liga', ['2020/2021', '2019/2020', '2018/2019'], f'''
+        SELECT p.player_name, COUNT(*) AS first_time_shot_count
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        WHERE {SEASON_FILTER} AND e.event_type_id = $shot AND e.shot_first_time
+        GROUP BY p.player_name ORDER BY first_time_shot_count DESC'''),
+    'Q_4': ('La Liga', ['2020/2021'], f'''
+        SELECT t.team_name, COUNT(*) AS total_passes
+        FROM events e JOIN matches m USING (match_id) JOIN {TEAMS} t USING (team_id)
+        JOIN lookup_event_type et ON et.event_type_id = e.event_type_id
+        WHERE {SEASON_FILTER} AND et.name = 'Pass'
+        GROUP BY t.team_name ORDER BY total_passes DESC'''),
+    'Q_5': ('Premier League', ['2003/2004'], f'''
+        SELECT p.player_name, COUNT(*) AS passes_received
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p ON p.player_id = e.pass_recipient_id
+        WHERE {SEASON_FILTER}
+        GROUP BY p.player_name ORDER BY passes_received DESC'''),
+    'Q_6': ('Premier League', ['2003/2004'], f'''
+        SELECT t.team_name, COUNT(*) AS total_shots
+        FROM events e JOIN matches m USING (match_id) JOIN {TEAMS} t USING (team_id)
+        WHERE {SEASON_FILTER} AND e.event_type_id = $shot
+        GROUP BY t.team_name ORDER BY total_shots DESC'''),
+    'Q_7': ('La Liga', ['2020/2021'], f'''
+        SELECT p.player_name, COUNT(*) AS total_through_balls
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        JOIN lookup_pass_type pt ON pt.pass_type_id = e.pass_type_id
+        WHERE {SEASON_FILTER} AND pt.name = 'Through Ball'
+        GROUP BY p.player_name ORDER BY total_through_balls DESC'''),
+    'Q_8': ('La Liga', ['2020/2021'], f'''
+        SELECT t.team_name, COUNT(*) AS total_through_balls
+        FROM events e JOIN matches m USING (match_id) JOIN {TEAMS} t USING (team_id)
+        JOIN lookup_pass_type pt ON pt.pass_type_id = e.pass_type_id
+        WHERE {SEASON_FILTER} AND pt.name = 'Through Ball'
+        GROUP BY t.team_name ORDER BY total_through_balls DESC'''),
+    'Q_9': ('La Liga', ['2020/2021', '2019/2020', '2018/2019'], f'''
+        SELECT p.player_name, COUNT(*) AS successful_dribbles
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        JOIN lookup_outcome o ON o.outcome_id = e.dribble_outcome_id
+        WHERE {SEASON_FILTER} AND o.name = 'Successful'
+        GROUP BY p.player_name ORDER BY successful_dribbles DESC'''),
+    'Q_10': ('La Liga', ['2020/2021'], f'''
+        SELECT p.player_name, COUNT(*) AS times_dribbled_past
+        FROM events e JOIN matches m USING (match_id) JOIN {PLAYERS} p USING (player_id)
+        JOIN lookup_outcome o ON o.outcome_id = e.dribble_outcome_id
+        WHERE {SEASON_FILTER} AND o.name = 'Lost'
+        GROUP BY p.player_name ORDER BY times_dribbled_past ASC'''),
+}
+
+class ParquetStore:
+    '''
+    Read-only access to a directory written by parquet_export.py, through an in-process DuckDB connection.
+
+    events, matches and lineups are views over the Hive-partitioned files, so a filter on competition_id or
+    season_id only opens that season's files. The lookup tables are available as lookup_<table>.
+    '''
+
+    def __init__(self, root):
+        if duckdb is None:
+            raise ImportError('Querying the Parquet export needs duckdb (pip install duckdb)')
+        self.root = root
+        self.conn = duckdb.connect()
+
+        for name in ('events', 'matches', 'lineups'):
+            pattern = os.path.join(root, name, '*', '*', '*.parquet')
+            self.conn.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true);")
+
+        lookups = os.path.join(root, 'lookups')
+        for file_name in sorted(os.listdir(lookups)):
+            table = os.path.splitext(file_name)[0]
+            self.conn.execute(f"CREATE VIEW lookup_{table} AS SELECT * FROM read_parquet('{os.path.join(lookups, file_name)}');")
+
+    def sql(self, query, params=None):
+        '''Run a query against the views. return: DuckDB relation result'''
+        return self.conn.execute(query, params or {})
+
+    def season_events(self, competition_id, season_id, columns=None):
+        '''
+        Events of one competition season as a pyarrow Table.
+
+        columns: list of str - Only read these columns
+        '''
+        selected = ', '.join(columns) if columns else '*'
+        return self.sql(f'SELECT {selected} FROM events WHERE competition_id = $competition_id AND season_id = $season_id ORDER BY match_id, event_index;',
+                        {'competition_id': competition_id, 'season_id': season_id}).fetch_arrow_table()
+
+    def query(self, name):
+        '''
+        Answer one of the Q_1..Q_10 questions of queries.py.
+
+        return: tuple (column names, list of row tuples)
+        '''
+        competition, seasons, query = QUERIES[name]
+        params = {'competition': competition, 'seasons': seasons}
+        if '$shot' in query:
+            params['shot'] = SHOT
+        result = self.sql(query, params)
+        return [column[0] for column in result.description], result.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('root', help = 'Directory written by parquet_export.py')
+    parser.add_argument('--query', action = 'append', choices = list(QUERIES), help = 'Only run these queries')
+    args = parser.parse_args()
+
+    store = ParquetStore(args.root)
+    for name in args.query or QUERIES:
+        start = time.perf_counter()
+        columns, rows = store.query(name)
+        print(f'{name}: {len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms')
+        for row in rows[:5]:
+            print('    ' + ', '.join(str(value) for value in row))
+    store.close()
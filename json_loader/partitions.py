@@ -0,0 +1,138 @@
+#! /usr/bin/python3
+
+import argparse
+import logging
+import os
+import re
+from event_types import SUBTYPE_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Tables partitioned by sql/ddl_partitioned.sql. events comes first, as the per-type tables reference it.
+PARTITIONED_TABLES = ('events',) + tuple(SUBTYPE_TABLES)
+
+# Columns appended to every row of a partitioned table, with their types for binary COPY.
+PARTITION_COLUMNS = ('competition_id', 'season_id')
+PARTITION_TYPES = ('int4', 'int4')
+
+_SEASON_PARTITION = re.compile(r'events_c(\d+)_s(\d+)')
+
+class SeasonPartitions:
+    '''
+    Keeps track of the competition season partitions of the partitioned schema variant.
+
+    When events is a plain table (sql/ddl.sql only), enabled is False and nothing here is used. Otherwise
+    the loader asks season() for the partition key of a match, which creates the season's partitions of
+    every partitioned table the first time the season is seen.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.known = set()
+        self.match_seasons = {}
+
+    def preload(self, conn):
+        '''Find out whether events is partitioned, and which season partitions exist.'''
+        self.__init__()
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'events'::regclass);")
+            self.enabled = cur.fetchone()[0]
+            if self.enabled:
+                cur.execute(r"SELECT relname FROM pg_class WHERE relname LIKE 'events\_c%\_s%' AND relispartition;")
+                for (name,) in cur:
+                    match = _SEASON_PARTITION.fullmatch(name)
+                    if match:
+                        self.known.add((int(match.group(1)), int(match.group(2))))
+        conn.commit()
+
+    def ensure(self, cur, competition_id, season_id):
+        '''Create the partitions of a competition season in every partitioned table, unless they exist.'''
+        if (competition_id, season_id) in self.known:
+            return
+        for table in PARTITIONED_TABLES:
+            cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table}_c{competition_id} PARTITION OF {table}
+            FOR VALUES IN ({competition_id}) PARTITION BY LIST (season_id);
+            ''')
+            cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table}_c{competition_id}_s{season_id} PARTITION OF {table}_c{competition_id}
+            FOR VALUES IN ({season_id});
+            ''')
+        self.known.add((competition_id, season_id))
+        logger.info(f'Created partitions for competition {competition_id}, season {season_id}')
+
+    def season(self, cur, match_id):
+        '''
+        Partition key of a match, creating the season's partitions if needed. The match must already be loaded.
+
+        return: tuple (competition_id, season_id) to append to the match's rows
+        '''
+        if match_id not in self.match_seasons:
+            cur.execute('SELECT competition_id, season_id FROM match WHERE match_id = %s;', (match_id,))
+            row = cur.fetchone()
+            if row is None or None in row:
+                raise ValueError(f'Match {match_id} has no competition season to partition its events by')
+            self.match_seasons[match_id] = tuple(row)
+
+        key = self.match_seasons[match_id]
+        self.ensure(cur, *key)
+        return key
+
+    def create_all(self, conn):
+        '''
+        Create the partitions of every competition season in the match table.
+
+        Called before worker processes start, so the workers never run DDL against the tables they load into.
+        '''
+        with conn.cursor() as cur:
+            cur.execute('SELECT DISTINCT competition_id, season_id FROM match WHERE competition_id IS NOT NULL AND season_id IS NOT NULL ORDER BY 1, 2;')
+            for competition_id, season_id in cur.fetchall():
+                self.ensure(cur, competition_id, season_id)
+        conn.commit()
+
+    def drop(self, conn, competition_id, season_id):
+        '''
+        Drop every partition of a competition season, along with its season rollups, possessions and lineup intervals.
+
+        The load_manifest entries of the season's events and lineups files are removed too, so the next run
+        of the loader loads the season again.
+        '''
+        with conn.cursor() as cur:
+            # Per-type partitions go first, so nothing references the events partition once it is detached.
+            for table in reversed(PARTITIONED_TABLES):
+                cur.execute(f'ALTER TABLE IF EXISTS {table}_c{competition_id} DETACH PARTITION {table}_c{competition_id}_s{season_id};')
+                cur.execute(f'DROP TABLE IF EXISTS {table}_c{competition_id}_s{season_id};')
+
+            for table in ('player_season_stats', 'team_season_stats'):
+                cur.execute(f'DELETE FROM {table} WHERE competition_id = %s AND season_id = %s;', (competition_id, season_id))
+
+            for table in ('possession', 'lineup_interval'):
+                cur.execute(f'DELETE FROM {table} t USING match m WHERE t.match_id = m.match_id AND m.competition_id = %s AND m.season_id = %s;', (competition_id, season_id))
+            cur.execute('SELECT match_id FROM match WHERE competition_id = %s AND season_id = %s;', (competition_id, season_id))
+            paths = [os.path.join('data', dataset_type, f'{match_id}.json') for (match_id,) in cur.fetchall() for dataset_type in ('events', 'lineups')]
+            cur.execute('DELETE FROM load_manifest WHERE file_path = ANY(%s);', (paths,))
+        conn.commit()
+
+        self.known.discard((competition_id, season_id))
+        logger.info(f'Dropped partitions for competition {competition_id}, season {season_id}')
+
+# Shared by every loader in this process. Worker processes preload their own copy.
+partitions = SeasonPartitions()
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--create', action = 'store_true', help = 'Create the partitions of every competition season in the match table')
+    parser.add_argument('--drop', nargs = 2, type = int, metavar = ('COMPETITION_ID', 'SEASON_ID'), help = 'Drop the partitions of one competition season')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = connect_db()
+    partitions.preload(conn)
+    if not partitions.enabled:
+        raise SystemExit('events is not partitioned; run sql/ddl_partitioned.sql first')
+    if args.create:
+        partitions.create_all(conn)
+    if args.drop:
+        partitions.drop(conn, *args.drop)
+    conn.close()
@@ -0,0 +1,120 @@
+#! /usr/bin/python3
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# StatsBomb pitch coordinates run from (0, 0) to (120, 80), with the attacking team shooting at x = 120.
+PITCH_LENGTH = 120.0
+PITCH_WIDTH = 80.0
+
+# The pitch is cut into ZONE_COLUMNS strips along its length and ZONE_ROWS channels across it (20 x 26.7 zones).
+# Zones are numbered from 1 column by column, starting in the defending team's left corner, so zone 14
+# is the central zone just outside the opponent's penalty area.
+ZONE_COLUMNS = 6
+ZONE_ROWS = 3
+
+# Named rectangles, as (x0, y0, x1, y1).
+AREAS = {
+    'penalty_area': (102.0, 18.0, 120.0, 62.0),
+    'six_yard_box': (114.0, 30.0, 120.0, 50.0),
+    'final_third': (80.0, 0.0, 120.0, 80.0),
+}
+
+def zone_id(x, y):
+    '''Zone of a pitch location, or None without one. Locations on or past the far edges count as the last zone.'''
+    if x is None or y is None:
+        return None
+    column = min(max(int(x * ZONE_COLUMNS // PITCH_LENGTH), 0), ZONE_COLUMNS - 1)
+    row = min(max(int(y * ZONE_ROWS // PITCH_WIDTH), 0), ZONE_ROWS - 1)
+    return column * ZONE_ROWS + row + 1
+
+def point_zone(point):
+    '''Zone of a Point (or any (x, y) pair), or None.'''
+    return None if point is None else zone_id(point[0], point[1])
+
+def zone_bounds(zone):
+    '''The rectangle (x0, y0, x1, y1) covered by a zone.'''
+    column, row = divmod(zone - 1, ZONE_ROWS)
+    width, height = PITCH_LENGTH / ZONE_COLUMNS, PITCH_WIDTH / ZONE_ROWS
+    return (column * width, row * height, (column + 1) * width, (row + 1) * height)
+
+# The same computation as zone_id in SQL, used to fill zone_id for events loaded before the column existed.
+ZONE_SQL = f'''
+    LEAST(GREATEST(floor(location[0] * {ZONE_COLUMNS} / {PITCH_LENGTH})::int, 0), {ZONE_COLUMNS - 1}) * {ZONE_ROWS}
+    + LEAST(GREATEST(floor(location[1] * {ZONE_ROWS} / {PITCH_WIDTH})::int, 0), {ZONE_ROWS - 1}) + 1
+'''
+
+def backfill(conn):
+    '''Set zone_id on every event with a location but no zone.'''
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(f'UPDATE events SET zone_id = {ZONE_SQL} WHERE location IS NOT NULL AND zone_id IS NULL;')
+        count = cur.rowcount
+    conn.commit()
+    logger.info(f'Set the zone of {count} events in {time.perf_counter() - start:.2f}s')
+
+def event_filters(event_types=None, match_ids=None):
+    '''Extra WHERE conditions and parameters shared by the queries below.'''
+    conditions, params = [], []
+    if event_types is not None:
+        conditions.append('event_type_id = ANY(%s)')
+        params.append(list(event_types))
+    if match_ids is not None:
+        conditions.append('match_id = ANY(%s)')
+        params.append(list(match_ids))
+    return ''.join(f' AND {condition}' for condition in conditions), params
+
+def events_in_zones(conn, zones, event_types=None, match_ids=None, columns='*'):
+    '''
+    Events whose location lies in any of the given zones, through the index on events.zone_id.
+
+    zones: iterable of zone ids, e.g. [14]
+    event_types, match_ids: iterables of ids to restrict the events to
+    return: list of rows
+    '''
+    extra, params = event_filters(event_types, match_ids)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT {columns} FROM events WHERE zone_id = ANY(%s){extra};', [list(zones)] + params)
+        return cur.fetchall()
+
+def events_in_rect(conn, x0, y0, x1, y1, event_types=None, match_ids=None, columns='*'):
+    '''
+    Events whose location lies in a rectangle (edges included), through the spatial index on events.location.
+
+    return: list of rows
+    '''
+    extra, params = event_filters(event_types, match_ids)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT {columns} FROM events WHERE location <@ box(point(%s, %s), point(%s, %s)){extra};', [x0, y0, x1, y1] + params)
+        return cur.fetchall()
+
+def events_in_area(conn, area, event_types=None, match_ids=None, columns='*'):
+    '''Events in one of the named AREAS, e.g. events_in_area(conn, 'penalty_area', event_types=[16]) for shots from inside the box.'''
+    return events_in_rect(conn, *AREAS[area], event_types=event_types, match_ids=match_ids, columns=columns)
+
+def freeze_frames_in_rect(conn, x0, y0, x1, y1, match_ids=None):
+    '''
+    Freeze frame players located in a rectangle, through the spatial index on freeze_frames.location.
+
+    return: list of (event_uuid, teammate, actor, keeper, location) rows
+    '''
+    query = 'SELECT f.event_uuid, f.teammate, f.actor, f.keeper, f.location FROM freeze_frames f'
+    params = [x0, y0, x1, y1]
+    if match_ids is not None:
+        query += ' JOIN three_sixty t ON t.event_uuid = f.event_uuid AND t.match_id = ANY(%s)'
+        params.insert(0, list(match_ids))
+    with conn.cursor() as cur:
+        cur.execute(query + ' WHERE f.location <@ box(point(%s, %s), point(%s, %s));', params)
+        return cur.fetchall()
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    logging.basicConfig(level=logging.INFO)
+    from bulk_load import create_indexes
+    conn = connect_db()
+    backfill(conn)
+    # The zone and rectangle queries depend on the zone_id and location indexes of sql/indexes.sql.
+    create_indexes(conn)
+    conn.close()
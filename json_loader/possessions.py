@@ -0,0 +1,86 @@
+#! /usr/bin/python3
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Columns of the possession table, with their types for binary COPY.
+POSSESSION_COLUMNS = ('match_id', 'possession', 'team_id', 'play_pattern_id', 'period', 'start_index', 'end_index', 'start_time', 'end_time', 'event_count', 'terminal_event_type_id')
+POSSESSION_TYPES = ('int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'time', 'time', 'int4', 'int4')
+
+class PossessionChains:
+    '''
+    Builds the possession rows of a match from its event rows, in the same pass that parses them.
+
+    Each add() only updates the entry of the event's possession: the team and play pattern come from its
+    first event, and the terminal event type from its last (by event index), so the events can come in any order.
+    '''
+
+    def __init__(self, match_id, columns):
+        '''columns: the column names of the event rows passed to add(), e.g. load_data.EVENT_COLUMNS'''
+        self.match_id = match_id
+        self.chains = {}
+        self.positions = [columns.index(name) for name in ('event_index', 'period', 'timestamp', 'event_type_id', 'possession', 'possession_team_id', 'play_pattern_id')]
+
+    def add(self, row):
+        '''Count one event row towards its possession.'''
+        index, period, timestamp, event_type_id, possession, team_id, play_pattern_id = [row[i] for i in self.positions]
+        if possession is None:
+            return
+
+        chain = self.chains.get(possession)
+        if chain is None:
+            self.chains[possession] = [team_id, play_pattern_id, period, index, index, timestamp, timestamp, 1, event_type_id]
+            return
+
+        chain[7] += 1
+        if index < chain[3]:
+            chain[0], chain[1], chain[2], chain[3], chain[5] = team_id, play_pattern_id, period, index, timestamp
+        if index > chain[4]:
+            chain[4], chain[6], chain[8] = index, timestamp, event_type_id
+
+    def rows(self):
+        '''Rows for the possession table, laid out like POSSESSION_COLUMNS, in possession order.'''
+        for possession in sorted(self.chains):
+            team_id, play_pattern_id, period, start_index, end_index, start_time, end_time, event_count, terminal = self.chains[possession]
+            yield (self.match_id, possession, team_id, play_pattern_id, period, start_index, end_index, start_time, end_time, event_count, terminal)
+
+# Recomputes the possessions of the events already in the database, e.g. one loaded before the possession
+# table existed. The first and last values of each possession are taken by event_index with array_agg.
+REBUILD_SQL = f'''
+INSERT INTO possession ({', '.join(POSSESSION_COLUMNS)})
+SELECT
+    match_id, possession,
+    (array_agg(possession_team_id ORDER BY event_index))[1],
+    (array_agg(play_pattern_id ORDER BY event_index))[1],
+    (array_agg(period ORDER BY event_index))[1],
+    MIN(event_index), MAX(event_index),
+    (array_agg(timestamp ORDER BY event_index))[1],
+    (array_agg(timestamp ORDER BY event_index DESC))[1],
+    COUNT(*),
+    (array_agg(event_type_id ORDER BY event_index DESC))[1]
+FROM events
+WHERE possession IS NOT NULL
+GROUP BY match_id, possession
+ON CONFLICT (match_id, possession) DO UPDATE
+SET {', '.join(f'{column} = EXCLUDED.{column}' for column in POSSESSION_COLUMNS[2:])};
+'''
+
+def rebuild(conn):
+    '''Recompute the possession table from every loaded event.'''
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(REBUILD_SQL)
+    conn.commit()
+    logger.info(f'Rebuilt possessions in {time.perf_counter() - start:.2f}s')
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    logging.basicConfig(level=logging.INFO)
+    from bulk_load import create_indexes
+    conn = connect_db()
+    # The chain lookups depend on the events (match_id, event_index) and possession indexes of sql/indexes.sql.
+    create_indexes(conn)
+    rebuild(conn)
+    conn.close()
@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+
+import os
+import sys
+import time
+
+class ProgressReporter:
+    '''
+    Progress line for loading one dataset type: files done, rows/sec, bytes parsed and ETA.
+
+    update() is cheap and can be called after every file; a line is written at most once per interval.
+    The ETA is based on the bytes still to parse and the parse rate so far, as file sizes vary a lot.
+    '''
+
+    def __init__(self, dataset_type, file_paths, interval=1.0, stream=sys.stderr):
+        self.dataset_type = dataset_type
+        self.sizes = {p: os.path.getsize(p) for p in file_paths}
+        self.total_bytes = sum(self.sizes.values())
+        self.interval = interval
+        self.stream = stream
+
+        self.files, self.skipped, self.failed, self.rows = 0, 0, 0, 0
+        self.parsed_bytes, self.skipped_bytes = 0, 0
+        self.start = time.monotonic()
+        self.last_emit = self.start
+
+    def update(self, file_path, rows=None, failed=False):
+        '''
+        Record a finished file.
+
+        rows: int - Rows written for the file, or None if it was skipped as unchanged
+        failed: bool - The file could not be loaded
+        '''
+        size = self.sizes.get(file_path, 0)
+        self.files += 1
+        if failed:
+            self.failed += 1
+            self.skipped_bytes += size
+        elif rows is None:
+            self.skipped += 1
+            self.skipped_bytes += size
+        else:
+            self.rows += rows
+            self.parsed_bytes += size
+
+        now = time.monotonic()
+        if now - self.last_emit >= self.interval:
+            self.last_emit = now
+            self.emit(now)
+
+    def finish(self):
+        '''Write the final line for this dataset type.'''
+        self.emit(time.monotonic())
+
+    def emit(self, now):
+        elapsed = now - self.start
+        row_rate = self.rows / elapsed if elapsed else 0
+        byte_rate = self.parsed_bytes / elapsed if elapsed else 0
+        remaining = self.total_bytes - self.parsed_bytes - self.skipped_bytes
+
+        if remaining <= 0:
+            eta = 'done'
+        elif byte_rate:
+            eta = time.strftime('%H:%M:%S', time.gmtime(remaining / byte_rate))
+        else:
+            eta = '--:--:--'
+
+        self.stream.write(
+            f'{self.dataset_type}: {self.files}/{len(self.sizes)} files ({self.skipped} unchanged, {self.failed} failed), '
+            f'{self.rows} rows ({row_rate:.0f} rows/sec), '
+            f'{self.parsed_bytes / (1 << 20):.1f}/{self.total_bytes / (1 << 20):.1f} MB parsed, ETA {eta}\n'
+        )
+        self.stream.flush()
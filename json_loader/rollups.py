@@ -0,0 +1,137 @@
+#! /usr/bin/python3
+
+import logging
+import time
+from event_types import DRIBBLE_COMPLETE, DRIBBLED_PAST, THROUGH_BALL
+
+logger = logging.getLogger(__name__)
+
+# Aggregate columns of the rollup tables, in table order.
+PLAYER_STATS = ('matches', 'shots', 'shots_with_xg', 'xg', 'first_time_shots', 'passes', 'passes_received', 'through_balls', 'dribbles', 'dribbles_complete', 'dribbled_past')
+TEAM_STATS = ('matches', 'shots', 'shots_with_xg', 'xg', 'passes', 'through_balls', 'dribbles', 'dribbles_complete')
+
+# Per-event aggregates shared by both tables. Every event has at most one per-type row, so the joins don't fan out.
+EVENT_AGGREGATES = {
+    'matches': 'count(DISTINCT e.match_id)',
+    'shots': 'count(s.event_id)',
+    'shots_with_xg': 'count(*) FILTER (WHERE s.statsbomb_xg > 0)',
+    'xg': 'coalesce(sum(s.statsbomb_xg), 0)',
+    'first_time_shots': 'count(*) FILTER (WHERE s.first_time)',
+    'passes': 'count(pa.event_id)',
+    'passes_received': '0',
+    'through_balls': 'count(*) FILTER (WHERE pa.type_id = %(through_ball)s)',
+    'dribbles': 'count(d.event_id)',
+    'dribbles_complete': 'count(*) FILTER (WHERE d.outcome_id = %(dribble_complete)s)',
+    'dribbled_past': 'count(*) FILTER (WHERE e.event_type_id = %(dribbled_past)s)',
+}
+
+EVENT_JOINS = '''
+    FROM events e
+    JOIN match m ON m.match_id = e.match_id
+    LEFT JOIN shot s ON s.event_id = e.event_id
+    LEFT JOIN pass pa ON pa.event_id = e.event_id
+    LEFT JOIN dribble d ON d.event_id = e.event_id
+'''
+
+# Only events of matches with a competition season can be rolled up.
+SEASON_FILTER = 'm.competition_id IS NOT NULL AND m.season_id IS NOT NULL'
+
+def upsert_sql(table, key, stats, contribution):
+    '''
+    INSERT ... SELECT that adds %(sign)s times the grouped contribution rows to a rollup table.
+
+    Rows are written in primary key order, so concurrent loaders lock them in the same order.
+    '''
+    columns = ('competition_id', 'season_id', key) + stats
+    totals = ', '.join(f'%(sign)s * sum({stat})' for stat in stats)
+    updates = ', '.join(f'{stat} = r.{stat} + EXCLUDED.{stat}' for stat in stats)
+    return f'''
+    WITH contribution AS ({contribution})
+    INSERT INTO {table} AS r ({', '.join(columns)})
+    SELECT competition_id, season_id, {key}, {totals}
+    FROM contribution
+    GROUP BY competition_id, season_id, {key}
+    ORDER BY competition_id, season_id, {key}
+    ON CONFLICT (competition_id, season_id, {key}) DO UPDATE SET {updates};
+    '''
+
+def player_sql(events_filter):
+    aggregates = ', '.join(f'{EVENT_AGGREGATES[stat]} AS {stat}' for stat in PLAYER_STATS)
+    received = ', '.join('count(*)' if stat == 'passes_received' else '0' for stat in PLAYER_STATS)
+    contribution = f'''
+    SELECT m.competition_id, m.season_id, e.player_id, {aggregates}
+    {EVENT_JOINS}
+    WHERE {events_filter} AND {SEASON_FILTER} AND e.player_id IS NOT NULL
+    GROUP BY m.competition_id, m.season_id, e.player_id
+    UNION ALL
+    SELECT m.competition_id, m.season_id, pa.recipient_id, {received}
+    FROM pass pa
+    JOIN events e ON e.event_id = pa.event_id
+    JOIN match m ON m.match_id = e.match_id
+    WHERE {events_filter} AND {SEASON_FILTER} AND pa.recipient_id IS NOT NULL
+    GROUP BY m.competition_id, m.season_id, pa.recipient_id
+    '''
+    return upsert_sql('player_season_stats', 'player_id', PLAYER_STATS, contribution)
+
+def team_sql(events_filter):
+    aggregates = ', '.join(f'{EVENT_AGGREGATES[stat]} AS {stat}' for stat in TEAM_STATS)
+    contribution = f'''
+    SELECT m.competition_id, m.season_id, e.team_id, {aggregates}
+    {EVENT_JOINS}
+    WHERE {events_filter} AND {SEASON_FILTER} AND e.team_id IS NOT NULL
+    GROUP BY m.competition_id, m.season_id, e.team_id
+    '''
+    return upsert_sql('team_season_stats', 'team_id', TEAM_STATS, contribution)
+
+MATCH_FILTER = 'e.match_id = %(match_id)s'
+PLAYER_MATCH_SQL = player_sql(MATCH_FILTER)
+TEAM_MATCH_SQL = team_sql(MATCH_FILTER)
+
+def params(**kwargs):
+    return {'through_ball': THROUGH_BALL['id'], 'dribble_complete': DRIBBLE_COMPLETE, 'dribbled_past': DRIBBLED_PAST, **kwargs}
+
+def match_statements(match_id, sign):
+    '''
+    Statements adding (sign=1) or subtracting (sign=-1) the events of one match to the season rollups.
+
+    Subtracting has to happen before the match's events are deleted, and adding after they have been
+    written, in the same transaction. Rows left with no matches are removed.
+    return: list of (sql, params)
+    '''
+    statements = [(PLAYER_MATCH_SQL, params(match_id=match_id, sign=sign)), (TEAM_MATCH_SQL, params(match_id=match_id, sign=sign))]
+
+    if sign < 0:
+        for table in ('player_season_stats', 'team_season_stats'):
+            statements.append((f'''
+            DELETE FROM {table} r USING match m
+            WHERE m.match_id = %s AND r.competition_id = m.competition_id AND r.season_id = m.season_id AND r.matches <= 0;
+            ''', (match_id,)))
+    return statements
+
+def apply_match(cur, match_id, sign):
+    '''Add (sign=1) or subtract (sign=-1) the events of one match to the season rollups, see match_statements.'''
+    for sql, values in match_statements(match_id, sign):
+        cur.execute(sql, values)
+
+def add_match(cur, match_id):
+    apply_match(cur, match_id, 1)
+
+def remove_match(cur, match_id):
+    apply_match(cur, match_id, -1)
+
+def rebuild(conn):
+    '''Recompute both rollup tables from every loaded event, e.g. after a bulk load or on an existing database.'''
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute('TRUNCATE player_season_stats, team_season_stats;')
+        cur.execute(player_sql('TRUE'), params(sign=1))
+        cur.execute(team_sql('TRUE'), params(sign=1))
+    conn.commit()
+    logger.info(f'Rebuilt season rollups in {time.perf_counter() - start:.2f}s')
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    logging.basicConfig(level=logging.INFO)
+    conn = connect_db()
+    rebuild(conn)
+    conn.close()
@@ -0,0 +1,191 @@
+#! /usr/bin/python3
+
+import argparse
+import logging
+import time
+from load_data import copy_rows
+from three_sixty import GOAL_POSTS, event_uuids, in_shooting_cone
+
+# NumPy holds the feature arrays.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+GOAL_CENTRE = (120.0, 40.0)
+
+# Every shot of a competition season, with what the features are computed from.
+SHOTS_SQL = '''
+SELECT e.event_id, e.match_id, e.location[0], e.location[1], e.under_pressure,
+       s.body_part_id, bp.name = 'Head', s.first_time, s.statsbomb_xg
+FROM shot s
+JOIN events e ON e.event_id = s.event_id
+JOIN match m ON m.match_id = e.match_id
+LEFT JOIN body_part bp ON bp.body_part_id = s.body_part_id
+WHERE m.competition_id = %s AND m.season_id = %s
+ORDER BY e.match_id, e.event_index;
+'''
+
+# The freeze frame opponents of those shots, where three-sixty data exists.
+OPPONENTS_SQL = '''
+SELECT f.event_uuid, f.keeper, f.location[0], f.location[1]
+FROM freeze_frames f
+JOIN events e ON e.event_id = f.event_uuid
+JOIN shot s ON s.event_id = e.event_id
+JOIN match m ON m.match_id = e.match_id
+WHERE m.competition_id = %s AND m.season_id = %s AND NOT f.teammate AND f.location IS NOT NULL;
+'''
+
+SCORE_COLUMNS = ('event_id', 'model', 'xg')
+SCORE_TYPES = ('uuid', 'varchar', 'float8')
+
+class ShotFeatures:
+    '''
+    Features of every shot of a competition season as NumPy arrays, one element per shot:
+
+    event_ids (16-byte UUIDs), match_id, x, y, distance (to the centre of the goal), angle (radians of goal
+    mouth visible from the shot location), body_part_id, header, first_time, under_pressure, statsbomb_xg,
+    has_freeze_frame, and defenders_in_cone / keeper_in_cone (opponents inside the triangle between the shot
+    and the posts, 0 without a freeze frame).
+    '''
+
+    def __init__(self, columns):
+        if np is None:
+            raise ImportError('ShotFeatures needs numpy (pip install numpy)')
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['event_ids'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_database(cls, conn, competition_id, season_id):
+        '''Read the shots of a competition season and their freeze frames with two queries, and compute every feature at once.'''
+        if np is None:
+            raise ImportError('ShotFeatures needs numpy (pip install numpy)')
+        with conn.cursor() as cur:
+            cur.execute(SHOTS_SQL, (competition_id, season_id))
+            shots = cur.fetchall()
+            cur.execute(OPPONENTS_SQL, (competition_id, season_id))
+            opponents = cur.fetchall()
+        conn.commit()
+
+        fields = list(zip(*shots)) if shots else [()] * 9
+        columns = {
+            'event_ids': np.array([event_id.bytes for event_id in fields[0]], dtype='S16'),
+            'match_id': np.array(fields[1], dtype=np.int32),
+            'x': np.array(fields[2], dtype=np.float64),
+            'y': np.array(fields[3], dtype=np.float64),
+            'under_pressure': np.array([bool(value) for value in fields[4]], dtype=bool),
+            'body_part_id': np.array([-1 if value is None else value for value in fields[5]], dtype=np.int32),
+            'header': np.array([bool(value) for value in fields[6]], dtype=bool),
+            'first_time': np.array([bool(value) for value in fields[7]], dtype=bool),
+            'statsbomb_xg': np.array([np.nan if value is None else value for value in fields[8]], dtype=np.float64),
+        }
+        features = cls(columns)
+        features.add_geometry()
+        features.add_freeze_frames(opponents)
+        return features
+
+    def add_geometry(self):
+        '''Distance to the centre of the goal and the angle between the two posts, from the shot locations.'''
+        x, y = self.columns['x'], self.columns['y']
+        self.columns['distance'] = np.hypot(GOAL_CENTRE[0] - x, GOAL_CENTRE[1] - y)
+        (post_x, left_y), (_, right_y) = GOAL_POSTS
+        angle = np.abs(np.arctan2(right_y - y, post_x - x) - np.arctan2(left_y - y, post_x - x))
+        self.columns['angle'] = np.where(angle > np.pi, 2 * np.pi - angle, angle)
+
+    def add_freeze_frames(self, opponents):
+        '''
+        Count the opponents in the shooting cone of every shot.
+
+        opponents: rows of (event_uuid, keeper, x, y), one per opponent in a shot's freeze frame
+        '''
+        count = len(self)
+        self.columns['has_freeze_frame'] = np.zeros(count, dtype=bool)
+        self.columns['defenders_in_cone'] = np.zeros(count, dtype=np.int32)
+        self.columns['keeper_in_cone'] = np.zeros(count, dtype=bool)
+        if not opponents or not count:
+            return
+
+        event_ids, keeper, ox, oy = zip(*opponents)
+        order = np.argsort(self.columns['event_ids'])
+        sorted_ids = self.columns['event_ids'][order]
+        shot = order[np.searchsorted(sorted_ids, np.array([event_id.bytes for event_id in event_ids], dtype='S16'))]
+        keeper = np.array(keeper, dtype=bool)
+        points = np.column_stack((np.array(ox, dtype=np.float64), np.array(oy, dtype=np.float64)))
+
+        ball = np.column_stack((self.columns['x'], self.columns['y']))
+        inside = in_shooting_cone(ball[shot], points)
+        self.columns['has_freeze_frame'][shot] = True
+        self.columns['defenders_in_cone'] = np.bincount(shot, weights=inside & ~keeper, minlength=count).astype(np.int32)
+        self.columns['keeper_in_cone'] = np.bincount(shot, weights=inside & keeper, minlength=count) > 0
+
+def baseline_xg(features):
+    '''
+    A simple logistic model on distance, angle, headers and defenders in the cone, to compare others against.
+    The coefficients are hand-picked rather than fitted.
+
+    return: float array with one probability per shot
+    '''
+    z = (-1.2 - 0.09 * features['distance'] + 1.4 * features['angle'] - 0.8 * features['header']
+         + 0.3 * features['first_time'] - 0.2 * features['under_pressure'] - 0.25 * features['defenders_in_cone'])
+    return 1 / (1 + np.exp(-z))
+
+def statsbomb_xg(features):
+    '''StatsBomb's own xG, as a scorer, e.g. to store it next to other models.'''
+    return features['statsbomb_xg']
+
+# Scorers selectable by name on the command line. Any function of a ShotFeatures returning one score per shot can be passed to write_scores.
+SCORERS = {
+    'baseline': baseline_xg,
+    'statsbomb': statsbomb_xg,
+}
+
+def write_scores(conn, features, model, scorer):
+    '''
+    Score every shot and write the scores to shot_score, replacing earlier scores of the same model.
+
+    The scores are written with one binary COPY into a temporary table and merged in one statement.
+    scorer: function taking a ShotFeatures and returning one score per shot
+    return: the number of scores written
+    '''
+    scores = np.asarray(scorer(features), dtype=np.float64)
+    if scores.shape != (len(features),):
+        raise ValueError(f'Scorer returned {scores.shape} scores for {len(features)} shots')
+
+    rows = ((event_id, model, None if np.isnan(score) else score)
+            for event_id, score in zip(event_uuids(features['event_ids']), scores.tolist()))
+    with conn.cursor() as cur:
+        cur.execute('CREATE TEMPORARY TABLE shot_score_batch (LIKE shot_score INCLUDING DEFAULTS) ON COMMIT DROP;')
+        count = copy_rows(cur, 'shot_score_batch', SCORE_COLUMNS, SCORE_TYPES, rows)
+        cur.execute(f'''
+        INSERT INTO shot_score ({', '.join(SCORE_COLUMNS)}, scored_at)
+        SELECT {', '.join(SCORE_COLUMNS)}, now() FROM shot_score_batch
+        ON CONFLICT (event_id, model) DO UPDATE SET xg = EXCLUDED.xg, scored_at = EXCLUDED.scored_at;
+        ''')
+    conn.commit()
+    return count
+
+if __name__ == '__main__':
+    from load_data import connect_db
+    parser = argparse.ArgumentParser()
+    parser.add_argument('competition_id', type = int)
+    parser.add_argument('season_id', type = int)
+    parser.add_argument('--model', default = 'baseline', choices = list(SCORERS), help = 'Scorer to run; its name is stored with the scores')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = connect_db()
+    start = time.perf_counter()
+    features = ShotFeatures.from_database(conn, args.competition_id, args.season_id)
+    logger.info(f"Computed features of {len(features)} shots ({features['has_freeze_frame'].sum()} with freeze frames) in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    count = write_scores(conn, features, args.model, SCORERS[args.model])
+    logger.info(f'Wrote {count} {args.model} scores in {time.perf_counter() - start:.2f}s')
+    conn.close()
@@ -0,0 +1,84 @@
+#! /usr/bin/python3
+
+import json
+import os
+import re
+
+# ijson is optional. When it is installed (ideally with its yajl2_c backend) it is used to parse the
+# arrays, otherwise the pure standard library parser below is used.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Amount of text read from the file at a time by the standard library parser.
+CHUNK_SIZE = 1 << 16
+
+_SEPARATOR = re.compile(r'[\s,]*')
+_WHITESPACE = re.compile(r'\s*')
+
+def _iter_array_builtin(file, chunk_size):
+    '''
+    Yield the elements of a top-level JSON array from a text file one at a time.
+
+    Only the element being decoded (plus at most one chunk) is held in memory. Elements are decoded with
+    json.JSONDecoder.raw_decode, which uses the same C scanner as json.load.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise ValueError(f'Expected a JSON array in {file.name}')
+    pos = 1
+    eof = False
+
+    while True:
+        pos = _SEPARATOR.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        # Only yield an element once the ',' or ']' after it has been read: a number cut at a chunk boundary
+        # (e.g. '1.' of '1.5') still decodes, to the wrong value.
+        if pos < len(buffer):
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            if end is not None:
+                after = _WHITESPACE.match(buffer, end).end()
+                if after < len(buffer) and buffer[after] in ',]':
+                    yield obj
+                    pos = after
+                    continue
+
+        if eof:
+            raise ValueError(f'Truncated JSON array in {file.name}')
+
+        # Drop what has been consumed, and grow the read size with the buffer so huge elements stay linear.
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = file.read(max(chunk_size, len(buffer)))
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+def iter_json_array(file_path, chunk_size=CHUNK_SIZE):
+    '''
+    Stream the elements of a JSON file whose top level is an array (every StatsBomb events, lineups and
+    three-sixty file) without loading the whole file.
+
+    return: generator of the decoded elements, in file order
+    '''
+    if not os.path.isfile(file_path):
+        raise OSError(f'JSON file not found: {file_path}')
+
+    if ijson is not None:
+        with open(file_path, 'rb') as file:
+            yield from ijson.items(file, 'item', use_float=True)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yield from _iter_array_builtin(file, chunk_size)
@@ -0,0 +1,224 @@
+#! /usr/bin/python3
+
+import logging
+import os
+import uuid
+from adapters import Point, Polygon
+from stream_json import iter_json_array
+
+# NumPy holds the packed coordinates. It is needed to load three-sixty files and for the geometry below.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# StatsBomb pitch coordinates: the attacking team shoots at the goal on the x = 120 line, posts at y = 36 and 44.
+GOAL_POSTS = ((120.0, 36.0), (120.0, 44.0))
+
+THREE_SIXTY_COLUMNS = ('event_uuid', 'match_id', 'visible_area')
+THREE_SIXTY_TYPES = ('uuid', 'int4', 'polygon')
+FREEZE_FRAME_COLUMNS = ('event_uuid', 'teammate', 'actor', 'keeper', 'location')
+FREEZE_FRAME_TYPES = ('uuid', 'bool', 'bool', 'bool', 'point')
+
+def event_uuids(event_ids):
+    '''UUIDs of an array of 16-byte event ids. NumPy drops trailing NUL bytes from 'S' elements, so they are padded back.'''
+    return [uuid.UUID(bytes=event_id.ljust(16, b'\0')) for event_id in event_ids.tolist()]
+
+def _frame_index(offsets):
+    '''Frame number of every element of arrays split into frames by offsets.'''
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def _segment_min(values, offsets):
+    '''Minimum of values within each frame, NaN for empty frames.'''
+    result = np.full(len(offsets) - 1, np.nan, dtype=values.dtype)
+    filled = np.diff(offsets) > 0
+    if filled.any():
+        # Empty frames have no elements, so reducing from the starts of the filled frames stays within each frame.
+        result[filled] = np.minimum.reduceat(values, offsets[:-1][filled])
+    return result
+
+def _cross(ax, ay, bx, by, px, py):
+    '''z component of (b - a) x (p - a), element-wise.'''
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+def in_shooting_cone(ball, points):
+    '''
+    Whether each point lies inside the triangle formed by its ball location and the two goal posts.
+
+    ball, points: float arrays of shape (n, 2); a NaN ball location gives False
+    '''
+    ax, ay = ball[:, 0], ball[:, 1]
+    px, py = points[:, 0], points[:, 1]
+    (bx, by), (cx, cy) = GOAL_POSTS
+
+    d1 = _cross(ax, ay, bx, by, px, py)
+    d2 = _cross(bx, by, cx, cy, px, py)
+    d3 = _cross(cx, cy, ax, ay, px, py)
+    inside = ~(((d1 < 0) | (d2 < 0) | (d3 < 0)) & ((d1 > 0) | (d2 > 0) | (d3 > 0)))
+    return inside & np.isfinite(ax)
+
+class ThreeSixtyFrames:
+    '''
+    The three-sixty freeze frames of a match, packed into flat NumPy arrays.
+
+    Player i of frame f is at locations[frame_offsets[f] + i], with the teammate / actor / keeper flags in
+    the arrays of the same name. The visible area of frame f is the polygon area[area_offsets[f]:area_offsets[f + 1]].
+    Every computation below works on all frames of the match at once. Coordinates are kept as float64, so
+    the rows written to the database hold exactly the values of the JSON file.
+    '''
+
+    def __init__(self, match_id, event_ids, frame_offsets, locations, teammate, actor, keeper, area_offsets, area):
+        if np is None:
+            raise ImportError('ThreeSixtyFrames needs numpy (pip install numpy)')
+        self.match_id = match_id
+        self.event_ids = event_ids
+        self.frame_offsets = frame_offsets
+        self.locations = locations
+        self.teammate = teammate
+        self.actor = actor
+        self.keeper = keeper
+        self.area_offsets = area_offsets
+        self.area = area
+
+    @classmethod
+    def from_entries(cls, entries, match_id):
+        '''Pack the entries of a three-sixty file. Visible areas with an odd number of coordinates are left empty.'''
+        if np is None:
+            raise ImportError('ThreeSixtyFrames needs numpy (pip install numpy)')
+        event_ids, frame_sizes, area_sizes = [], [], []
+        locations, flags, area = [], [], []
+
+        for entry in entries:
+            event_ids.append(uuid.UUID(entry['event_uuid']).bytes)
+
+            freeze_frame = entry.get('freeze_frame') or []
+            frame_sizes.append(len(freeze_frame))
+            for player in freeze_frame:
+                locations.extend(player['location'][:2])
+                flags.append((player['teammate'], player['actor'], player['keeper']))
+
+            visible_area = entry.get('visible_area') or []
+            if len(visible_area) % 2 != 0:
+                logger.warning(f"Match {match_id}, event {entry['event_uuid']}: visible area has an odd number of coordinates, storing none")
+                visible_area = []
+            area_sizes.append(len(visible_area) // 2)
+            area.extend(visible_area)
+
+        flags = np.array(flags, dtype=bool).reshape(-1, 3)
+        return cls(
+            match_id,
+            np.array(event_ids, dtype='S16'),
+            np.concatenate(([0], np.cumsum(frame_sizes, dtype=np.int64))),
+            np.array(locations, dtype=np.float64).reshape(-1, 2),
+            flags[:, 0].copy(), flags[:, 1].copy(), flags[:, 2].copy(),
+            np.concatenate(([0], np.cumsum(area_sizes, dtype=np.int64))),
+            np.array(area, dtype=np.float64).reshape(-1, 2),
+        )
+
+    @classmethod
+    def from_json(cls, file_path):
+        '''Read a three-sixty file. The match id is taken from the file name.'''
+        match_id = int(os.path.splitext(os.path.basename(file_path))[0])
+        return cls.from_entries(iter_json_array(file_path), match_id)
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    def player_frames(self):
+        '''Frame number of every player in locations.'''
+        return _frame_index(self.frame_offsets)
+
+    def ball_locations(self):
+        '''
+        Location of the ball in every frame, taken to be the location of the actor (the player performing the
+        event). NaN for frames where the actor isn't visible.
+
+        return: float64 array of shape (frames, 2)
+        '''
+        ball = np.full((len(self), 2), np.nan, dtype=np.float64)
+        ball[self.player_frames()[self.actor]] = self.locations[self.actor]
+        return ball
+
+    def defenders_between_ball_and_goal(self, ball=None, include_keeper=True):
+        '''
+        Number of opponents inside the triangle formed by the ball and the two goal posts, in every frame.
+
+        ball: array of shape (frames, 2) - Ball locations, e.g. the event locations; defaults to ball_locations()
+        include_keeper: bool - Count the opposing keeper too
+        return: int array with one count per frame (0 where the ball location is unknown)
+        '''
+        ball = self.ball_locations() if ball is None else np.asarray(ball, dtype=np.float64)
+        frames = self.player_frames()
+        counted = in_shooting_cone(ball[frames], self.locations) & ~self.teammate
+        if not include_keeper:
+            counted &= ~self.keeper
+        return np.bincount(frames, weights=counted, minlength=len(self)).astype(np.int32)
+
+    def nearest_opponent_distance(self, ball=None):
+        '''
+        Distance from the ball to the closest visible opponent in every frame.
+
+        ball: array of shape (frames, 2) - Defaults to ball_locations()
+        return: float64 array, NaN where there is no visible opponent or no ball location
+        '''
+        ball = self.ball_locations() if ball is None else np.asarray(ball, dtype=np.float64)
+        frames = self.player_frames()
+        distance = np.hypot(self.locations[:, 0] - ball[frames, 0], self.locations[:, 1] - ball[frames, 1])
+        distance[self.teammate | np.isnan(distance)] = np.inf
+
+        nearest = _segment_min(distance, self.frame_offsets)
+        nearest[np.isinf(nearest)] = np.nan
+        return nearest
+
+    def in_visible_area(self, points, frames):
+        '''
+        Point-in-polygon test of points against the visible area of their frame, by ray casting over every
+        (point, polygon edge) pair at once.
+
+        points: array of shape (n, 2)
+        frames: int array of shape (n,) - Frame of each point
+        return: bool array of shape (n,); False for frames without a visible area
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        frames = np.asarray(frames)
+
+        # Each vertex's edge goes to the next vertex, and the last one wraps around to the first of its polygon.
+        following = np.arange(1, len(self.area) + 1)
+        starts, ends = self.area_offsets[:-1], self.area_offsets[1:]
+        closed = ends > starts
+        following[ends[closed] - 1] = starts[closed]
+
+        # Pair every point with each edge of its frame's polygon.
+        edge_counts = (ends - starts)[frames]
+        pair_point = np.repeat(np.arange(len(points)), edge_counts)
+        first_pair = np.repeat(np.cumsum(edge_counts) - edge_counts, edge_counts)
+        edge = starts[frames][pair_point] + np.arange(len(pair_point)) - first_pair
+
+        x1, y1 = self.area[edge, 0], self.area[edge, 1]
+        x2, y2 = self.area[following[edge], 0], self.area[following[edge], 1]
+        px, py = points[pair_point, 0], points[pair_point, 1]
+
+        straddles = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = straddles & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+        return np.bincount(pair_point, weights=crosses, minlength=len(points)) % 2 == 1
+
+    def point_in_visible_area(self, points):
+        '''Whether each frame's point (e.g. the event or pass end location) lies in that frame's visible area.'''
+        return self.in_visible_area(points, np.arange(len(self)))
+
+    def three_sixty_rows(self):
+        '''Rows for the three_sixty table, laid out like THREE_SIXTY_COLUMNS.'''
+        for i, event_id in enumerate(event_uuids(self.event_ids)):
+            vertices = self.area[self.area_offsets[i]:self.area_offsets[i + 1]].tolist()
+            yield (event_id, self.match_id, Polygon(map(tuple, vertices)) if vertices else None)
+
+    def freeze_frame_rows(self):
+        '''Rows for the freeze_frames table, laid out like FREEZE_FRAME_COLUMNS.'''
+        event_ids = event_uuids(self.event_ids)
+        frames = self.player_frames().tolist()
+        locations = self.locations.tolist()
+        for frame, location, teammate, actor, keeper in zip(frames, locations, self.teammate.tolist(), self.actor.tolist(), self.keeper.tolist()):
+            yield (event_ids[frame], teammate, actor, keeper, Point(*location))
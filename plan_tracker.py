@@ -0,0 +1,218 @@
+#! /usr/bin/python3
+
+'''
+plan_tracker.py
+
+Keeps a history of the query plans of the Q_1..Q_10 queries and flags plan regressions between runs.
+
+Each run stores the full EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) document of every query in a local SQLite
+file. The run is then compared with an earlier one: plan shapes (node types, scanned relations and indexes,
+join order) are diffed, scans that changed from an index to a sequential scan and slower execution times
+are flagged, and every plan node whose row estimate is off from the actual rows by more than a factor of
+--estimate-threshold is listed.
+'''
+
+import argparse
+import difflib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+import psycopg
+from benchmark import BENCHMARK_DATABASE, connect, explain, read_queries
+import queries
+
+HISTORY_PATH = os.path.join(queries.dir_path, 'plan_history.sqlite')
+
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS run (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    database TEXT NOT NULL,
+    server_version TEXT,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS plan (
+    run_id INTEGER NOT NULL REFERENCES run(run_id),
+    query TEXT NOT NULL,
+    execution_ms REAL NOT NULL,
+    planning_ms REAL NOT NULL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (run_id, query)
+);
+'''
+
+def open_history(path=HISTORY_PATH):
+    history = sqlite3.connect(path)
+    history.executescript(HISTORY_SCHEMA)
+    return history
+
+def capture(conn, selected, warmup=1):
+    '''
+    Run every query under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) after warmup discarded runs.
+
+    return: dict of 'Q_n' -> plan document, or the error message if the query failed
+    '''
+    documents = {}
+    with conn.cursor() as cur:
+        for name, query in selected.items():
+            try:
+                for _ in range(warmup + 1):
+                    document = explain(cur, query)
+                    conn.rollback()
+            except psycopg.DatabaseError as error:
+                conn.rollback()
+                documents[name] = str(error).strip()
+                continue
+            documents[name] = document
+    return documents
+
+def record_run(history, database, server_version, label, documents):
+    '''Store a run's plan documents. Failed queries aren't stored. return: the run id'''
+    cur = history.execute('INSERT INTO run (started_at, database, server_version, label) VALUES (?, ?, ?, ?);',
+                          (datetime.now().isoformat(timespec='seconds'), database, server_version, label))
+    run_id = cur.lastrowid
+    history.executemany('INSERT INTO plan (run_id, query, execution_ms, planning_ms, document) VALUES (?, ?, ?, ?, ?);', [
+        (run_id, name, document['Execution Time'], document['Planning Time'], json.dumps(document))
+        for name, document in documents.items() if isinstance(document, dict)
+    ])
+    history.commit()
+    return run_id
+
+def load_run(history, run_id):
+    '''return: dict of 'Q_n' -> plan document of a stored run'''
+    rows = history.execute('SELECT query, document FROM plan WHERE run_id = ?;', (run_id,))
+    return {name: json.loads(document) for name, document in rows}
+
+def previous_run(history, run_id):
+    '''The run before run_id, or None.'''
+    row = history.execute('SELECT MAX(run_id) FROM run WHERE run_id < ?;', (run_id,)).fetchone()
+    return row[0]
+
+def walk(node, depth=0):
+    '''Yield (depth, node) for a plan node and all of its children, depth first.'''
+    yield depth, node
+    for child in node.get('Plans', []):
+        yield from walk(child, depth + 1)
+
+def describe(node):
+    '''One-line description of a plan node without any numbers, e.g. "Index Scan using shot_pkey on shot s".'''
+    text = node['Node Type']
+    if 'Join Type' in node and node['Node Type'] != 'Hash':
+        text += f" ({node['Join Type']})"
+    if 'Index Name' in node:
+        text += f" using {node['Index Name']}"
+    if 'Relation Name' in node:
+        text += f" on {node['Relation Name']}"
+        if node.get('Alias', node['Relation Name']) != node['Relation Name']:
+            text += f" {node['Alias']}"
+    return text
+
+def plan_shape(document):
+    '''The plan as indented node descriptions, one per line. Two plans have the same shape if these are equal.'''
+    return ['  ' * depth + describe(node) for depth, node in walk(document['Plan'])]
+
+def scan_types(document):
+    '''dict of (relation, alias) -> set of scan node types used to read it.'''
+    scans = {}
+    for _, node in walk(document['Plan']):
+        if 'Relation Name' in node:
+            key = (node['Relation Name'], node.get('Alias', node['Relation Name']))
+            scans.setdefault(key, set()).add(node['Node Type'])
+    return scans
+
+def estimate_errors(document, threshold):
+    '''
+    Plan nodes whose estimated rows differ from the actual rows (both per loop) by more than a factor of threshold.
+
+    return: list of (description, estimated rows, actual rows, factor), worst first
+    '''
+    errors = []
+    for _, node in walk(document['Plan']):
+        if 'Actual Rows' not in node or node.get('Actual Loops', 1) == 0:
+            continue  # never executed
+        estimated, actual = node['Plan Rows'], node['Actual Rows']
+        factor = max(estimated, 1) / max(actual, 1)
+        factor = max(factor, 1 / factor)
+        if factor > threshold:
+            errors.append((describe(node), estimated, actual, factor))
+    return sorted(errors, key=lambda error: error[3], reverse=True)
+
+def compare_plans(before, after, time_threshold):
+    '''
+    Differences between two plan documents of the same query.
+
+    return: list of regression messages, and the unified diff of the plan shapes ([] if the shape is unchanged)
+    '''
+    regressions = []
+    shape_diff = list(difflib.unified_diff(plan_shape(before), plan_shape(after), 'before', 'after', lineterm=''))
+    if shape_diff:
+        regressions.append('plan shape changed')
+
+    old_scans, new_scans = scan_types(before), scan_types(after)
+    for key, scans in new_scans.items():
+        if 'Seq Scan' in scans and 'Seq Scan' not in old_scans.get(key, {'Seq Scan'}):
+            regressions.append(f"{key[0]} {key[1]}: {', '.join(sorted(old_scans[key]))} became Seq Scan")
+
+    old_time, new_time = before['Execution Time'], after['Execution Time']
+    if old_time and (new_time - old_time) / old_time > time_threshold:
+        regressions.append(f'execution time {old_time:.3f} ms -> {new_time:.3f} ms ({(new_time - old_time) / old_time * 100:+.1f}%)')
+    return regressions, shape_diff
+
+def report(current, baseline, estimate_threshold, time_threshold, stream=sys.stdout):
+    '''
+    Print the regressions and estimate errors of a run against a baseline run (which can be empty).
+
+    return: the number of queries with a regression
+    '''
+    regressed = 0
+    for name, document in current.items():
+        if not isinstance(document, dict):
+            stream.write(f'{name}: failed: {document}\n')
+            continue
+
+        stream.write(f"{name}: {document['Execution Time']:.3f} ms\n")
+        if name in baseline:
+            regressions, shape_diff = compare_plans(baseline[name], document, time_threshold)
+            if regressions:
+                regressed += 1
+                for message in regressions:
+                    stream.write(f'    REGRESSION: {message}\n')
+                for line in shape_diff:
+                    stream.write(f'        {line}\n')
+
+        for description, estimated, actual, factor in estimate_errors(document, estimate_threshold):
+            stream.write(f'    estimate off by {factor:.0f}x: {description} (estimated {estimated}, actual {actual})\n')
+    return regressed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default = BENCHMARK_DATABASE, help = 'Database the queries run against, e.g. one cloned by benchmark.py')
+    parser.add_argument('--query', action = 'append', help = 'Only capture these queries, e.g. --query Q_1 --query Q_4')
+    parser.add_argument('--history', default = HISTORY_PATH, help = 'SQLite file holding the plan history')
+    parser.add_argument('--label', help = 'Note stored with the run, e.g. the change being tested')
+    parser.add_argument('--warmup', default = 1, type = int, help = 'Runs per query discarded before capturing the plan')
+    parser.add_argument('--baseline', type = int, help = 'Run id to compare against, by default the previous run')
+    parser.add_argument('--estimate-threshold', default = 10.0, type = float, help = 'Highlight nodes whose row estimate is off by more than this factor')
+    parser.add_argument('--time-threshold', default = 0.2, type = float, help = 'Flag execution times that grew by more than this fraction')
+    args = parser.parse_args()
+
+    selected = read_queries()
+    if args.query:
+        selected = {name: selected[name] for name in args.query}
+
+    with connect(args.database) as conn:
+        server_version = conn.execute('SHOW server_version;').fetchone()[0]
+        conn.rollback()
+        documents = capture(conn, selected, args.warmup)
+
+    history = open_history(args.history)
+    run_id = record_run(history, args.database, server_version, args.label, documents)
+    baseline_id = args.baseline if args.baseline is not None else previous_run(history, run_id)
+    baseline = load_run(history, baseline_id) if baseline_id is not None else {}
+
+    print(f"Run {run_id}" + (f", compared with run {baseline_id}" if baseline_id is not None else ', no earlier run to compare with'))
+    regressed = report(documents, baseline, args.estimate_threshold, args.time_threshold)
+    history.close()
+    sys.exit(1 if regressed else 0)
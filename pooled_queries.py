@@ -0,0 +1,171 @@
+#! /usr/bin/python3
+
+'''
+pooled_queries.py
+
+Runs the Q_1..Q_10 queries of queries.py over a psycopg_pool connection pool, instead of opening a new
+connection (and restoring the database) for every query.
+
+Every pooled connection prepares all the queries once, when it is opened, so each run only sends
+EXECUTE q_n. Independent queries run concurrently, each on its own pooled connection. The time spent
+opening connections and preparing statements is reported separately from the time spent in the queries.
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import threading
+import time
+import psycopg
+from psycopg.conninfo import make_conninfo
+from benchmark import BENCHMARK_DATABASE, TEMPLATE_DATABASE, clone_database, connect, create_template, database_exists, read_queries, summarize
+import queries
+from queries import db_host, db_password, db_port, db_username, root_database_name
+
+# The pool is only needed by this runner.
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+class TimedConnection(psycopg.Connection):
+    '''Connection class that records how long each connect() took, in ms.'''
+    connect_times = []
+    lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, *args, **kwargs):
+        start = time.perf_counter()
+        conn = super().connect(*args, **kwargs)
+        with cls.lock:
+            cls.connect_times.append((time.perf_counter() - start) * 1000)
+        return conn
+
+def statement_name(name):
+    '''Name of the prepared statement for a query, e.g. Q_1 -> q_1.'''
+    return name.lower()
+
+class PreparedQueries:
+    '''
+    Prepares a set of queries on every connection opened by the pool, as its configure callback.
+
+    queries: dict of 'Q_n' -> query text
+    '''
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.prepare_times = []
+        self.lock = threading.Lock()
+
+    def __call__(self, conn):
+        start = time.perf_counter()
+        for name, query in self.queries.items():
+            conn.execute(f'PREPARE {statement_name(name)} AS {query.rstrip().rstrip(";")};')
+        conn.commit()
+        with self.lock:
+            self.prepare_times.append((time.perf_counter() - start) * 1000)
+
+def open_pool(database, selected, size):
+    '''
+    Open a pool of size connections to database, each with the selected queries prepared, and wait for all of them.
+
+    return: tuple (pool, PreparedQueries, seconds until every connection was ready)
+    '''
+    if ConnectionPool is None:
+        raise ImportError('The pooled runner needs psycopg_pool (pip install psycopg-pool)')
+
+    prepared = PreparedQueries(selected)
+    conninfo = make_conninfo(dbname=database, user=db_username, password=db_password, host=db_host, port=db_port)
+    start = time.perf_counter()
+    pool = ConnectionPool(conninfo, min_size=size, max_size=size, connection_class=TimedConnection, configure=prepared, open=True)
+    pool.wait()
+    return pool, prepared, time.perf_counter() - start
+
+def run_query(pool, name, runs):
+    '''
+    Run one prepared query runs times on a pooled connection.
+
+    return: dict with the wall-clock time per run (ms, round trip included), the server-side execution time
+    of the last run as reported by EXPLAIN ANALYZE, and the number of rows
+    '''
+    wall = []
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            for _ in range(runs):
+                start = time.perf_counter()
+                cur.execute(f'EXECUTE {statement_name(name)};')
+                rows = cur.fetchall()
+                wall.append((time.perf_counter() - start) * 1000)
+
+            cur.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) EXECUTE {statement_name(name)};')
+            document = cur.fetchone()[0]
+            if isinstance(document, str):
+                document = json.loads(document)
+        conn.rollback()
+
+    return {'wall_ms': summarize(wall), 'execution_ms': round(document[0]['Execution Time'], 3), 'rows': len(rows)}
+
+def run_pooled(pool, names, runs, concurrency):
+    '''
+    Run the queries, up to concurrency of them at a time, each on its own pooled connection.
+
+    return: dict of name -> run_query result (or {'error': ...}), and the wall-clock seconds for all of them
+    '''
+    results = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {name: executor.submit(run_query, pool, name, runs) for name in names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except psycopg.DatabaseError as error:
+                results[name] = {'error': str(error).strip()}
+                sys.stderr.write(f'{name}: {error}\n')
+    return results, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', default = 5, type = int, help = 'Runs per query on its pooled connection')
+    parser.add_argument('--concurrency', default = 4, type = int, help = 'Queries run at the same time, and size of the pool')
+    parser.add_argument('--query', action = 'append', help = 'Only run these queries, e.g. --query Q_1 --query Q_4')
+    parser.add_argument('--database', default = BENCHMARK_DATABASE, help = 'Database the queries run against')
+    parser.add_argument('--clone', action = 'store_true', help = 'Clone --database from the benchmark.py template first, restoring the template if needed')
+    parser.add_argument('--output', default = os.path.join(queries.dir_path, 'pooled_results.json'))
+    args = parser.parse_args()
+
+    selected = read_queries()
+    if args.query:
+        selected = {name: selected[name] for name in args.query}
+
+    if args.clone:
+        with connect(root_database_name, autocommit=True) as admin:
+            if not database_exists(admin, TEMPLATE_DATABASE):
+                create_template(admin, TEMPLATE_DATABASE)
+            clone_database(admin, TEMPLATE_DATABASE, args.database)
+
+    pool, prepared, ready = open_pool(args.database, selected, args.concurrency)
+    try:
+        results, elapsed = run_pooled(pool, list(selected), args.runs, args.concurrency)
+    finally:
+        pool.close()
+
+    setup = {
+        'connections': len(TimedConnection.connect_times),
+        'pool_ready_s': round(ready, 3),
+        'connect_ms': summarize(TimedConnection.connect_times),
+        'prepare_ms': summarize(prepared.prepare_times),
+    }
+    sys.stderr.write(
+        f"Setup: {setup['connections']} connections ready in {ready:.2f}s, "
+        f"connect median {setup['connect_ms']['median']:.1f} ms, prepare median {setup['prepare_ms']['median']:.1f} ms\n"
+    )
+    for name, result in results.items():
+        if 'error' not in result:
+            print(f"{name}: {result['rows']} rows, median {result['wall_ms']['median']:.3f} ms per run, {result['execution_ms']:.3f} ms in the server")
+    print(f'{len(results)} queries in {elapsed:.2f}s over {args.concurrency} connections')
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'database': args.database, 'runs': args.runs, 'concurrency': args.concurrency, 'setup': setup, 'queries': results, 'query_s': round(elapsed, 3)}, file, indent=2, sort_keys=True)
+        file.write('\n')
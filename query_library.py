@@ -0,0 +1,265 @@
+#! /usr/bin/python3
+
+'''
+query_library.py
+
+The analyses of Q_1..Q_10 in queries.py as parameterized Python functions, e.g.
+
+    library = QueryLibrary(connect())
+    for player_name, avg_xg in library.top_players_by_xg('La Liga', '2020/2021'):
+        ...
+    arrays = library.shots_by_team('Premier League', '2003/2004', arrays=True)
+
+Competition and season names are resolved to ids once per QueryLibrary and cached, so the queries filter
+match on integer ids. Every query is sent with its parameters as a server-side prepared statement, so
+asking about another competition or season reuses the same plan instead of preparing a new statement.
+Results are streamed from the cursor one row at a time, or returned as one NumPy array per column.
+'''
+
+import argparse
+import time
+import psycopg
+from queries import db_host, db_password, db_port, db_username, query_database_name
+
+# NumPy is only needed for results returned as arrays.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Matches of the given competitions and seasons, as ids.
+SEASON_FILTER = 'm.competition_id = ANY(%(competitions)s) AND m.season_id = ANY(%(seasons)s)'
+
+PLAYER_SHOT_XG = f'''
+SELECT p.player_name, AVG(s.statsbomb_xg) AS avg_xg
+FROM shot s
+JOIN events e ON s.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON e.player_id = p.player_id
+WHERE {SEASON_FILTER} AND s.statsbomb_xg > 0
+GROUP BY p.player_name
+ORDER BY avg_xg DESC;
+'''
+
+PLAYER_SHOTS = f'''
+SELECT p.player_name, COUNT(s.event_id) AS shot_count
+FROM shot s
+JOIN events e ON s.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON e.player_id = p.player_id
+WHERE {SEASON_FILTER}
+GROUP BY p.player_name
+ORDER BY shot_count DESC;
+'''
+
+PLAYER_FIRST_TIME_SHOTS = f'''
+SELECT p.player_name, COUNT(s.event_id) AS first_time_shot_count
+FROM shot s
+JOIN events e ON s.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON e.player_id = p.player_id
+WHERE {SEASON_FILTER} AND s.first_time
+GROUP BY p.player_name
+ORDER BY first_time_shot_count DESC;
+'''
+
+TEAM_PASSES = f'''
+SELECT t.team_name, COUNT(e.event_id) AS total_passes
+FROM events e
+JOIN event_type et ON e.event_type_id = et.event_type_id
+JOIN match m ON e.match_id = m.match_id
+JOIN team t ON e.team_id = t.team_id
+WHERE {SEASON_FILTER} AND et.name = 'Pass'
+GROUP BY t.team_name
+ORDER BY total_passes DESC;
+'''
+
+PLAYER_PASSES_RECEIVED = f'''
+SELECT p.player_name, COUNT(pa.event_id) AS passes_received
+FROM pass pa
+JOIN events e ON pa.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON pa.recipient_id = p.player_id
+WHERE {SEASON_FILTER}
+GROUP BY p.player_name
+ORDER BY passes_received DESC;
+'''
+
+TEAM_SHOTS = f'''
+SELECT t.team_name, COUNT(s.event_id) AS total_shots
+FROM shot s
+JOIN events e ON s.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN team t ON e.team_id = t.team_id
+WHERE {SEASON_FILTER}
+GROUP BY t.team_name
+ORDER BY total_shots DESC;
+'''
+
+PLAYER_PASS_TYPE = f'''
+SELECT p.player_name, COUNT(pa.event_id) AS passes
+FROM pass pa
+JOIN events e ON pa.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON e.player_id = p.player_id
+JOIN pass_type pt ON pa.type_id = pt.pass_type_id
+WHERE {SEASON_FILTER} AND pt.name = %(pass_type)s
+GROUP BY p.player_name
+ORDER BY passes DESC;
+'''
+
+TEAM_PASS_TYPE = f'''
+SELECT t.team_name, COUNT(pa.event_id) AS passes
+FROM pass pa
+JOIN events e ON pa.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN team t ON e.team_id = t.team_id
+JOIN pass_type pt ON pa.type_id = pt.pass_type_id
+WHERE {SEASON_FILTER} AND pt.name = %(pass_type)s
+GROUP BY t.team_name
+ORDER BY passes DESC;
+'''
+
+# The sort direction can't be a parameter, so there is one statement for each.
+PLAYER_DRIBBLES = f'''
+SELECT p.player_name, COUNT(d.event_id) AS dribbles
+FROM dribble d
+JOIN events e ON d.event_id = e.event_id
+JOIN match m ON e.match_id = m.match_id
+JOIN player p ON e.player_id = p.player_id
+JOIN outcome o ON d.outcome_id = o.outcome_id
+WHERE {SEASON_FILTER} AND o.name = %(outcome)s
+GROUP BY p.player_name
+ORDER BY dribbles {{}};
+'''
+PLAYER_DRIBBLES_DESC = PLAYER_DRIBBLES.format('DESC')
+PLAYER_DRIBBLES_ASC = PLAYER_DRIBBLES.format('ASC')
+
+def connect(dbname=query_database_name):
+    '''Autocommit connection with the queries.py settings, so streamed results don't hold a transaction open.'''
+    return psycopg.connect(dbname=dbname, user=db_username, password=db_password, host=db_host, port=db_port, autocommit=True)
+
+def as_list(value):
+    '''A name, or a list of names.'''
+    return [value] if isinstance(value, str) else list(value)
+
+class QueryLibrary:
+    '''
+    Prepared, parameterized versions of the queries.py questions on one connection.
+
+    Every method takes competition and season names (a season can also be a list of names) and returns an
+    iterator over result rows, or with arrays=True a dict of column name -> NumPy array.
+    '''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.competitions = None
+        self.seasons = None
+
+    def load_names(self):
+        '''Read the competition and season names once. A competition name can have several ids.'''
+        self.competitions, self.seasons = {}, {}
+        with self.conn.cursor() as cur:
+            for competition_id, name in cur.execute('SELECT competition_id, competition_name FROM competition;'):
+                self.competitions.setdefault(name, []).append(competition_id)
+            for season_id, name in cur.execute('SELECT season_id, season_name FROM season;'):
+                self.seasons[name] = season_id
+
+    def season_params(self, competition, seasons):
+        '''Ids for a competition name and season names. Raises ValueError for unknown names.'''
+        if self.competitions is None:
+            self.load_names()
+        if competition not in self.competitions:
+            raise ValueError(f'Unknown competition {competition!r}')
+        unknown = [name for name in as_list(seasons) if name not in self.seasons]
+        if unknown:
+            raise ValueError(f'Unknown seasons {unknown}')
+        return {'competitions': self.competitions[competition], 'seasons': [self.seasons[name] for name in as_list(seasons)]}
+
+    def rows(self, query, params):
+        '''Execute a query as a prepared statement and yield its rows as they are read from the cursor.'''
+        with self.conn.cursor() as cur:
+            cur.execute(query, params, prepare=True)
+            yield from cur
+
+    def arrays(self, query, params):
+        '''Execute a query as a prepared statement. return: dict of column name -> NumPy array'''
+        if np is None:
+            raise ImportError('Results as arrays need numpy (pip install numpy)')
+        with self.conn.cursor() as cur:
+            cur.execute(query, params, prepare=True)
+            names = [column.name for column in cur.description]
+            columns = list(zip(*cur)) or [()] * len(names)
+        return {name: np.array(values) for name, values in zip(names, columns)}
+
+    def run(self, query, competition, seasons, arrays=False, **params):
+        '''Run one of the statements above for a competition and season(s), with any extra parameters.'''
+        params.update(self.season_params(competition, seasons))
+        return self.arrays(query, params) if arrays else self.rows(query, params)
+
+    def top_players_by_xg(self, competition, season, arrays=False):
+        '''Q_1: (player_name, avg_xg) of every player with a shot with xG, highest average xG first.'''
+        return self.run(PLAYER_SHOT_XG, competition, season, arrays)
+
+    def shots_by_player(self, competition, season, arrays=False):
+        '''Q_2: (player_name, shot_count), most shots first.'''
+        return self.run(PLAYER_SHOTS, competition, season, arrays)
+
+    def first_time_shots_by_player(self, competition, seasons, arrays=False):
+        '''Q_3: (player_name, first_time_shot_count), most first-time shots first.'''
+        return self.run(PLAYER_FIRST_TIME_SHOTS, competition, seasons, arrays)
+
+    def passes_by_team(self, competition, season, arrays=False):
+        '''Q_4: (team_name, total_passes), most passes first.'''
+        return self.run(TEAM_PASSES, competition, season, arrays)
+
+    def passes_received_by_player(self, competition, season, arrays=False):
+        '''Q_5: (player_name, passes_received), most passes received first.'''
+        return self.run(PLAYER_PASSES_RECEIVED, competition, season, arrays)
+
+    def shots_by_team(self, competition, season, arrays=False):
+        '''Q_6: (team_name, total_shots), most shots first.'''
+        return self.run(TEAM_SHOTS, competition, season, arrays)
+
+    def through_balls_by_player(self, competition, season, arrays=False):
+        '''Q_7: (player_name, passes), most through balls first.'''
+        return self.run(PLAYER_PASS_TYPE, competition, season, arrays, pass_type='Through Ball')
+
+    def through_balls_by_team(self, competition, season, arrays=False):
+        '''Q_8: (team_name, passes), most through balls first.'''
+        return self.run(TEAM_PASS_TYPE, competition, season, arrays, pass_type='Through Ball')
+
+    def successful_dribbles_by_player(self, competition, seasons, arrays=False):
+        '''Q_9: (player_name, dribbles), most successful dribbles first.'''
+        return self.run(PLAYER_DRIBBLES_DESC, competition, seasons, arrays, outcome='Successful')
+
+    def times_dribbled_past_by_player(self, competition, season, arrays=False):
+        '''Q_10: (player_name, dribbles) for dribbles that were lost, fewest first.'''
+        return self.run(PLAYER_DRIBBLES_ASC, competition, season, arrays, outcome='Lost')
+
+# The queries.py questions, answered with the library.
+QUESTIONS = {
+    'Q_1': ('top_players_by_xg', 'La Liga', '2020/2021'),
+    'Q_2': ('shots_by_player', 'La Liga', '2020/2021'),
+    'Q_3': ('first_time_shots_by_player', 'La Liga', ['2020/2021', '2019/2020', '2018/2019']),
+    'Q_4': ('passes_by_team', 'La Liga', '2020/2021'),
+    'Q_5': ('passes_received_by_player', 'Premier League', '2003/2004'),
+    'Q_6': ('shots_by_team', 'Premier League', '2003/2004'),
+    'Q_7': ('through_balls_by_player', 'La Liga', '2020/2021'),
+    'Q_8': ('through_balls_by_team', 'La Liga', '2020/2021'),
+    'Q_9': ('successful_dribbles_by_player', 'La Liga', ['2020/2021', '2019/2020', '2018/2019']),
+    'Q_10': ('times_dribbled_past_by_player', 'La Liga', '2020/2021'),
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default = query_database_name)
+    parser.add_argument('--runs', default = 3, type = int, help = 'Times each question is asked; psycopg prepares a statement the second time it is run')
+    args = parser.parse_args()
+
+    library = QueryLibrary(connect(args.database))
+    for name, (method, competition, seasons) in QUESTIONS.items():
+        for run in range(args.runs):
+            start = time.perf_counter()
+            count = sum(1 for _ in getattr(library, method)(competition, seasons))
+            print(f'{name} {method} run {run + 1}: {count} rows in {(time.perf_counter() - start) * 1000:.1f} ms')
@@ -112,6 +112,27 @@ CREATE TABLE position (
 );
 
 
+-- One row per possession of a match, built by the loader from the events of the possession.
+-- Its events are those of the match with event_index between start_index and end_index.
+CREATE TABLE possession (
+    match_id INT,
+    possession INT,
+    team_id INT,
+    play_pattern_id INT,
+    period INT,
+    start_index INT NOT NULL,
+    end_index INT NOT NULL,
+    start_time TIME,
+    end_time TIME,
+    event_count INT NOT NULL,
+    terminal_event_type_id INT,
+    PRIMARY KEY (match_id, possession),
+    FOREIGN KEY(match_id) REFERENCES match(match_id),
+    FOREIGN KEY(team_id) REFERENCES team(team_id),
+    FOREIGN KEY(play_pattern_id) REFERENCES play_pattern(play_pattern_id),
+    FOREIGN KEY(terminal_event_type_id) REFERENCES event_type(event_type_id)
+);
+
 -- Unfinished
 CREATE TABLE events (
     event_id UUID PRIMARY KEY,
@@ -129,6 +150,7 @@ CREATE TABLE events (
     player_id INT,
     position_id INT,
     location POINT,
+    zone_id INT,
     duration FLOAT,
     off_camera BOOLEAN,
     under_pressure BOOLEAN,
@@ -140,7 +162,8 @@ CREATE TABLE events (
     FOREIGN KEY(play_pattern_id) REFERENCES play_pattern(play_pattern_id),
     FOREIGN KEY(team_id) REFERENCES team(team_id),
     FOREIGN KEY(player_id) REFERENCES player(player_id),
-    FOREIGN KEY(position_id) REFERENCES position(position_id)
+    FOREIGN KEY(position_id) REFERENCES position(position_id),
+    FOREIGN KEY(match_id, possession) REFERENCES possession(match_id, possession)
 );
 -- start_reason and end_reason seems like they should be foreign keys
 CREATE TABLE position_event (
@@ -386,8 +409,30 @@ CREATE TABLE lineup (
     FOREIGN KEY(position_id) REFERENCES position(position_id)
 );
 
+-- One row per spell a player spent in one position, from the `positions` of the lineups files.
+-- Times are seconds of match clock (the second half starts at 45:00, extra time at 90:00), within from_period and
+-- to_period. end_second and to_period are NULL for a spell that lasted until the final whistle.
+CREATE TABLE lineup_interval (
+    match_id INT,
+    player_id INT,
+    team_id INT,
+    position_id INT,
+    from_period INT NOT NULL,
+    start_second INT NOT NULL,
+    to_period INT,
+    end_second INT,
+    start_reason VARCHAR(64),
+    end_reason VARCHAR(64),
+    FOREIGN KEY(match_id) REFERENCES match(match_id),
+    FOREIGN KEY(team_id) REFERENCES team(team_id),
+    FOREIGN KEY(player_id) REFERENCES player(player_id),
+    FOREIGN KEY(position_id) REFERENCES position(position_id)
+);
+
+-- match_id lets a changed three-sixty file be reloaded without the events of that match being present
 CREATE TABLE three_sixty (
     event_uuid UUID PRIMARY KEY,
+    match_id INT,
     visible_area POLYGON
 );
 
@@ -400,3 +445,68 @@ CREATE TABLE freeze_frames (
     location POINT,
     FOREIGN KEY (event_uuid) REFERENCES three_sixty(event_uuid)
 );
+
+-- One row per dataset file that has been loaded, so unchanged files can be skipped on the next run.
+-- file_path is relative to DATASET_PATH.
+CREATE TABLE load_manifest (
+    file_path VARCHAR(256) PRIMARY KEY,
+    dataset_type VARCHAR(16) NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    loaded_at TIMESTAMP NOT NULL
+);
+
+-- Foreign keys dropped by `load_data.py --bulk`, kept until they have been restored after the load.
+CREATE TABLE deferred_constraint (
+    table_name VARCHAR(64),
+    constraint_name VARCHAR(64),
+    definition TEXT NOT NULL,
+    PRIMARY KEY (table_name, constraint_name)
+);
+
+-- Per-player and per-team totals for each competition season, kept up to date by the loader as matches are
+-- (re)loaded. `matches` counts the loaded matches a player or team has events in.
+CREATE TABLE player_season_stats (
+    competition_id INT,
+    season_id INT,
+    player_id INT,
+    matches INT NOT NULL,
+    shots INT NOT NULL,
+    shots_with_xg INT NOT NULL,
+    xg DOUBLE PRECISION NOT NULL,
+    first_time_shots INT NOT NULL,
+    passes INT NOT NULL,
+    passes_received INT NOT NULL,
+    through_balls INT NOT NULL,
+    dribbles INT NOT NULL,
+    dribbles_complete INT NOT NULL,
+    dribbled_past INT NOT NULL,
+    PRIMARY KEY (competition_id, season_id, player_id),
+    FOREIGN KEY (player_id) REFERENCES player(player_id)
+);
+
+CREATE TABLE team_season_stats (
+    competition_id INT,
+    season_id INT,
+    team_id INT,
+    matches INT NOT NULL,
+    shots INT NOT NULL,
+    shots_with_xg INT NOT NULL,
+    xg DOUBLE PRECISION NOT NULL,
+    passes INT NOT NULL,
+    through_balls INT NOT NULL,
+    dribbles INT NOT NULL,
+    dribbles_complete INT NOT NULL,
+    PRIMARY KEY (competition_id, season_id, team_id),
+    FOREIGN KEY (team_id) REFERENCES team(team_id)
+);
+
+-- Shot scores from our own xG models, written in bulk by json_loader/shot_features.py. One row per shot and model.
+CREATE TABLE shot_score (
+    event_id UUID,
+    model VARCHAR(32),
+    xg DOUBLE PRECISION,
+    scored_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (event_id, model)
+);
@@ -0,0 +1,233 @@
+-- Optional partitioned variant of the events table and its per-type tables.
+--
+-- Run this after ddl.sql to replace events, pass, shot, carry, ... with tables partitioned by competition,
+-- and sub-partitioned by season. The loader detects the partitioned schema and creates the partitions of a
+-- competition season (events_c11, events_c11_s90, ...) as its matches are loaded. Queries that filter on
+-- events.competition_id / season_id only read that season's partitions, and a season can be dropped with
+-- `python json_loader/partitions.py --drop <competition_id> <season_id>`.
+--
+-- The partition key has to be part of every primary key, so event ids are only unique within a season,
+-- and the per-type tables reference events by (event_id, competition_id, season_id). Tables left
+-- unpartitioned (position_event, cards, off_camera, ...) lose their foreign key to events.
+
+DROP TABLE IF EXISTS pass, shot, carry, dribble, ball_recovery, clearance, foul_committed, substitution, foul_won,
+    interception, block, tackle, ball_receipt, goalkeeper_action, bad_behaviour, tactics, events CASCADE;
+
+CREATE TABLE events (
+    event_id UUID,
+    match_id INT,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    event_index INT,
+    period INT,
+    timestamp TIME,
+    minute INT,
+    second INT,
+    event_type_id INT,
+    possession INT,
+    possession_team_id INT,
+    play_pattern_id INT,
+    team_id INT,
+    player_id INT,
+    position_id INT,
+    location POINT,
+    zone_id INT,
+    duration FLOAT,
+    off_camera BOOLEAN,
+    under_pressure BOOLEAN,
+    counterpress BOOLEAN,
+    out BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (match_id) REFERENCES match(match_id),
+    FOREIGN KEY (event_type_id) REFERENCES event_type(event_type_id),
+    FOREIGN KEY (possession_team_id) REFERENCES team(team_id),
+    FOREIGN KEY (play_pattern_id) REFERENCES play_pattern(play_pattern_id),
+    FOREIGN KEY (team_id) REFERENCES team(team_id),
+    FOREIGN KEY (player_id) REFERENCES player(player_id),
+    FOREIGN KEY (position_id) REFERENCES position(position_id),
+    FOREIGN KEY (match_id, possession) REFERENCES possession(match_id, possession)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE pass (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    recipient_id INT,
+    length FLOAT,
+    angle FLOAT,
+    height_id INT,
+    end_location POINT,
+    body_part_id INT,
+    type_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (recipient_id) REFERENCES player(player_id),
+    FOREIGN KEY (height_id) REFERENCES height(height_id),
+    FOREIGN KEY (body_part_id) REFERENCES body_part(body_part_id),
+    FOREIGN KEY (type_id) REFERENCES pass_type(pass_type_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE shot (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    end_location POINT,
+    outcome_id INT,
+    technique_id INT,
+    body_part_id INT,
+    type_id INT,
+    statsbomb_xg FLOAT,
+    first_time BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id),
+    FOREIGN KEY (technique_id) REFERENCES technique(technique_id),
+    FOREIGN KEY (body_part_id) REFERENCES body_part(body_part_id),
+    FOREIGN KEY (type_id) REFERENCES shot_type(shot_type_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE carry (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    end_location POINT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE dribble (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    outcome_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE ball_recovery (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    recovery_failure BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE clearance (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    body_part_id INT,
+    right_foot BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (body_part_id) REFERENCES body_part(body_part_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE foul_committed (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    card_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (card_id) REFERENCES cards(card_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE substitution (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    replacement_id INT,
+    outcome_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (replacement_id) REFERENCES player(player_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE foul_won (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    defensive BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE interception (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    outcome_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE block (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    deflection BOOLEAN,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE tackle (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    type_id INT,
+    outcome_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (type_id) REFERENCES tackle_type(tackle_type_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE ball_receipt (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    outcome_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE goalkeeper_action (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    outcome_id INT,
+    technique_id INT,
+    type_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (outcome_id) REFERENCES outcome(outcome_id),
+    FOREIGN KEY (technique_id) REFERENCES technique(technique_id),
+    FOREIGN KEY (type_id) REFERENCES goalkeeper_action_type(goalkeeper_action_type_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE bad_behaviour (
+    event_id UUID,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    card_id INT,
+    PRIMARY KEY (event_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id),
+    FOREIGN KEY (card_id) REFERENCES cards(card_id)
+) PARTITION BY LIST (competition_id);
+
+CREATE TABLE tactics (
+    tactics_id SERIAL,
+    competition_id INT NOT NULL,
+    season_id INT NOT NULL,
+    event_id UUID,
+    formation VARCHAR(32),
+    lineup_type VARCHAR(32),
+    PRIMARY KEY (tactics_id, competition_id, season_id),
+    FOREIGN KEY (event_id, competition_id, season_id) REFERENCES events(event_id, competition_id, season_id)
+) PARTITION BY LIST (competition_id);
@@ -0,0 +1,24 @@
+-- Secondary indexes for the analytic queries and for reloading single matches.
+-- Run this after ddl.sql; `load_data.py` also creates any of these that are missing before a regular load.
+-- `load_data.py --bulk` drops these before a full load and builds them again, in parallel, afterwards.
+-- One statement per line, as the loader reads this file to find the index names.
+
+CREATE INDEX IF NOT EXISTS events_match_id_idx ON events (match_id);
+CREATE INDEX IF NOT EXISTS events_match_event_index_idx ON events (match_id, event_index);
+CREATE INDEX IF NOT EXISTS possession_terminal_event_type_idx ON possession (terminal_event_type_id);
+CREATE INDEX IF NOT EXISTS events_player_id_idx ON events (player_id);
+CREATE INDEX IF NOT EXISTS events_team_id_idx ON events (team_id);
+CREATE INDEX IF NOT EXISTS events_event_type_id_idx ON events (event_type_id);
+CREATE INDEX IF NOT EXISTS events_zone_id_idx ON events (zone_id, event_type_id);
+CREATE INDEX IF NOT EXISTS events_location_idx ON events USING spgist (location);
+CREATE INDEX IF NOT EXISTS match_competition_season_idx ON match (competition_id, season_id);
+CREATE INDEX IF NOT EXISTS match_season_id_idx ON match (season_id);
+CREATE INDEX IF NOT EXISTS pass_recipient_id_idx ON pass (recipient_id);
+CREATE INDEX IF NOT EXISTS pass_type_id_idx ON pass (type_id);
+CREATE INDEX IF NOT EXISTS dribble_outcome_id_idx ON dribble (outcome_id);
+CREATE INDEX IF NOT EXISTS position_event_event_id_idx ON position_event (event_id);
+CREATE INDEX IF NOT EXISTS lineup_interval_match_id_idx ON lineup_interval (match_id);
+CREATE INDEX IF NOT EXISTS lineup_interval_player_id_idx ON lineup_interval (player_id);
+CREATE INDEX IF NOT EXISTS three_sixty_match_id_idx ON three_sixty (match_id);
+CREATE INDEX IF NOT EXISTS freeze_frames_event_uuid_idx ON freeze_frames (event_uuid);
+CREATE INDEX IF NOT EXISTS freeze_frames_location_idx ON freeze_frames USING gist (location);